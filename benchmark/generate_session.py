@@ -0,0 +1,299 @@
+"""
+    Generate a synthetic plancha session to benchmark the workflow offline.
+
+    The session follows the usual tree:
+    SESSION_NAME
+    ├── DCIM : test pattern mp4 (ffmpeg lavfi)
+    ├── GPS
+    │   ├── BASE : empty, no PPK
+    │   └── DEVICE : emlid like zip with LLH and RINEX
+    ├── METADATA
+    ├── PROCESSED_DATA
+    └── SENSORS : ArduPilot DataFlash .BIN (or text .LOG) with FMT, GPS, ATT, RFND, IMU, MSG, CMD, MODE, ARM
+
+    A geoid grid and a plancha config pointing to the session are written next to the session.
+
+    Usage: python -m benchmark.generate_session -o /tmp/bench -d 600
+"""
+
+import json
+import ffmpeg
+import pyproj
+import shutil
+import zipfile
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import datetime as dt
+from argparse import ArgumentParser, Namespace
+
+GPS_EPOCH = dt.datetime(1980, 1, 6)
+LEAP_SECONDS = 18
+BOOT_OFFSET_S = 60.0 # Autopilot boots one minute before the mission starts.
+
+# DataFlash format character => numpy dtype, scale applied before writing.
+DF_FORMAT_TO_DTYPE = {
+    "b": ("i1", 1), "B": ("u1", 1), "h": ("<i2", 1), "H": ("<u2", 1),
+    "i": ("<i4", 1), "I": ("<u4", 1), "f": ("<f4", 1), "d": ("<f8", 1),
+    "n": ("S4", 1), "N": ("S16", 1), "Z": ("S64", 1),
+    "c": ("<i2", 100), "C": ("<u2", 100), "e": ("<i4", 100), "E": ("<u4", 100),
+    "L": ("<i4", 1e7), "M": ("u1", 1), "q": ("<i8", 1), "Q": ("<u8", 1),
+}
+
+# Name => (type id, format, columns). Same definitions as ArduRover 4.x.
+DF_MESSAGES = {
+    "FMT": (128, "BBnNZ", "Type,Length,Name,Format,Columns"),
+    "GPS": (130, "QBBIHBcLLeffffB", "TimeUS,I,Status,GMS,GWk,NSats,HDop,Lat,Lng,Alt,Spd,GCrs,VZ,Yaw,U"),
+    "ATT": (131, "QccccCCCCB", "TimeUS,DesRoll,Roll,DesPitch,Pitch,DesYaw,Yaw,ErrRP,ErrYaw,AEKF"),
+    "RFND": (132, "QBCBB", "TimeUS,Instance,Dist,Stat,Orient"),
+    "IMU": (133, "QBffffffIIfBBHH", "TimeUS,I,GyrX,GyrY,GyrZ,AccX,AccY,AccZ,EG,EA,T,GH,AH,GHz,AHz"),
+    "MSG": (134, "QZ", "TimeUS,Message"),
+    "CMD": (135, "QHHHffffLLfB", "TimeUS,CTot,CNum,CId,Prm1,Prm2,Prm3,Prm4,Lat,Lng,Alt,Frame"),
+    "MODE": (136, "QMBB", "TimeUS,Mode,ModeNum,Rsn"),
+    "ARM": (137, "QBIBH", "TimeUS,ArmState,ArmChecks,Forced,Method"),
+}
+
+HEADER_DTYPE = [("H1", "u1"), ("H2", "u1"), ("MsgType", "u1")]
+
+
+def parse_option() -> Namespace:
+    parser = ArgumentParser(prog="generate-session", description="Generate a synthetic plancha session")
+
+    parser.add_argument("-o", "--output", required=True, help="Root folder where the session is created")
+    parser.add_argument("-d", "--duration", type=float, default=600, help="Mission duration in seconds")
+    parser.add_argument("-sn", "--session_name", default="20250425_REU-ST-LEU_ASV-1_01", help="Name of the session")
+    parser.add_argument("-vd", "--video_duration", type=float, default=None, help="Video duration in seconds, default is mission duration")
+    parser.add_argument("-nv", "--no_video", action="store_true", help="Don't generate video")
+    parser.add_argument("-lf", "--log_format", default="bin", choices=["bin", "log"], help="Autopilot log format")
+    parser.add_argument("-imu", "--imu_rate", type=float, default=50, help="IMU messages rate in Hz, used to get realistic log size")
+
+    return parser.parse_args()
+
+
+def get_df_dtype(name: str) -> np.dtype:
+    """ Numpy dtype of a DataFlash message, header included. """
+    _, fmt, columns = DF_MESSAGES[name]
+    return np.dtype(HEADER_DTYPE + [(col, DF_FORMAT_TO_DTYPE[c][0]) for c, col in zip(fmt, columns.split(","))])
+
+
+def build_df_messages(name: str, data: dict) -> np.ndarray:
+    """ Build a structured array of DataFlash messages from columns. Missing columns are filled with 0. """
+    type_id, fmt, columns = DF_MESSAGES[name]
+    size = len(data["TimeUS"])
+
+    arr = np.zeros(size, dtype=get_df_dtype(name))
+    arr["H1"], arr["H2"], arr["MsgType"] = 0xA3, 0x95, type_id
+    for c, col in zip(fmt, columns.split(",")):
+        if col not in data: continue
+        scale = DF_FORMAT_TO_DTYPE[c][1]
+        arr[col] = np.round(np.asarray(data[col]) * scale) if scale != 1 else data[col]
+    return arr
+
+
+def write_bin(bin_path: Path, messages: dict[str, np.ndarray]) -> None:
+    """ Write FMT messages then all messages sorted by TimeUS. """
+
+    fmt_names = list(DF_MESSAGES)
+    fmt = build_df_messages("FMT", {
+        "TimeUS": np.zeros(len(fmt_names)),
+        "Type": [DF_MESSAGES[n][0] for n in fmt_names],
+        "Length": [get_df_dtype(n).itemsize for n in fmt_names],
+        "Name": [n.encode() for n in fmt_names],
+        "Format": [DF_MESSAGES[n][1].encode() for n in fmt_names],
+        "Columns": [DF_MESSAGES[n][2].encode() for n in fmt_names],
+    })
+
+    # Interleave messages of all types by time in a flat buffer.
+    times = np.concatenate([arr["TimeUS"] for arr in messages.values()])
+    lengths = np.concatenate([np.full(len(arr), arr.dtype.itemsize) for arr in messages.values()])
+    order = np.argsort(times, kind="stable")
+    offsets = np.empty(len(order), dtype=np.int64)
+    offsets[order] = np.concatenate([[0], np.cumsum(lengths[order])[:-1]])
+
+    buffer = np.empty(int(lengths.sum()), dtype=np.uint8)
+    start = 0
+    for arr in messages.values():
+        rows = arr.view(np.uint8).reshape(len(arr), arr.dtype.itemsize)
+        buffer[offsets[start:start+len(arr), None] + np.arange(arr.dtype.itemsize)] = rows
+        start += len(arr)
+
+    with open(bin_path, "wb") as f:
+        f.write(fmt.tobytes())
+        f.write(buffer.tobytes())
+
+
+def write_log(log_path: Path, messages: dict[str, np.ndarray]) -> None:
+    """ Write a Mission Planner text log with the same content as the BIN. """
+
+    lines, times = [], []
+    for name, (type_id, fmt, columns) in DF_MESSAGES.items():
+        lines.append(f"FMT, {type_id}, {get_df_dtype(name).itemsize}, {name}, {fmt}, {columns}")
+        times.append(-1)
+
+    for name, arr in messages.items():
+        _, fmt, columns = DF_MESSAGES[name]
+        df = pd.DataFrame({col: arr[col] for col in columns.split(",")})
+        for c, col in zip(fmt, columns.split(",")):
+            scale = DF_FORMAT_TO_DTYPE[c][1]
+            if scale != 1: df[col] = df[col] / scale
+            if c in "nNZ": df[col] = df[col].str.decode("ascii")
+        text = df.astype(str).apply(lambda row: ", ".join(row), axis=1)
+        lines.extend((name + ", " + text).tolist())
+        times.extend(arr["TimeUS"].tolist())
+
+    order = np.argsort(np.array(times), kind="stable")
+    with open(log_path, "w") as f:
+        f.write("\n".join(np.array(lines, dtype=object)[order]) + "\n")
+
+
+def build_trajectory(t: np.ndarray, transect_length: float = 100.0, spacing: float = 5.0, speed: float = 1.0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Lawnmower pattern in local metric coordinates. Return x (east), y (north) and heading in degrees. """
+    s = t * speed
+    period = transect_length + spacing
+    k, r = s // period, s % period
+    on_transect = r < transect_length
+    forward = (k % 2) == 0
+
+    x = np.where(on_transect, np.where(forward, r, transect_length - r), np.where(forward, transect_length, 0.0))
+    y = np.where(on_transect, k * spacing, k * spacing + (r - transect_length))
+    heading = np.where(on_transect, np.where(forward, 90.0, 270.0), 0.0)
+    return x, y, heading
+
+
+def seafloor_depth(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return 3.0 + 1.5 * np.sin(x / 20.0) + 0.02 * y
+
+
+def generate_session(root: Path, session_name: str, duration_s: float, video_duration_s: float | None = None,
+                     with_video: bool = True, log_format: str = "bin", imu_rate: float = 50) -> Path:
+    """ Create the session tree and return the path of the plancha config file to process it. """
+
+    rng = np.random.default_rng(42)
+    session = Path(root, session_name)
+    if session.exists(): shutil.rmtree(session)
+    for folder in ["DCIM", "GPS/BASE", "GPS/DEVICE", "METADATA", "PROCESSED_DATA/BATHY", "PROCESSED_DATA/FRAMES", "SENSORS"]:
+        Path(session, folder).mkdir(parents=True)
+
+    start_utc = dt.datetime.strptime(session_name[0:8], "%Y%m%d") + dt.timedelta(hours=6)
+    start_gps = start_utc + dt.timedelta(seconds=LEAP_SECONDS)
+    gps_seconds = (start_gps - GPS_EPOCH).total_seconds()
+
+    # UTM zone 40 south, Saint-Leu lagoon.
+    wgs2utm = pyproj.Proj(proj="utm", zone="40", ellps="WGS84", south=True)
+    x0, y0 = wgs2utm(55.28, -21.17)
+
+    def to_lnglat(t: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        x, y, heading = build_trajectory(t)
+        lng, lat = wgs2utm(x0 + x, y0 + y, inverse=True)
+        return lng, lat, heading
+
+    def time_us(t: np.ndarray) -> np.ndarray:
+        return ((BOOT_OFFSET_S + t) * 1e6).astype(np.uint64)
+
+    messages = {}
+
+    # GPS 5Hz.
+    t = np.arange(0, duration_s, 0.2)
+    lng, lat, heading = to_lnglat(t)
+    gms = (gps_seconds + t) % 604800 * 1000
+    messages["GPS"] = build_df_messages("GPS", {
+        "TimeUS": time_us(t), "Status": np.full(len(t), 6), "GMS": np.round(gms),
+        "GWk": np.full(len(t), int((gps_seconds) // 604800)), "NSats": np.full(len(t), 18), "HDop": np.full(len(t), 0.7),
+        "Lat": lat, "Lng": lng, "Alt": 2.5 + 0.05 * np.sin(t / 3.0), "Spd": np.ones(len(t)), "GCrs": heading, "U": np.ones(len(t))
+    })
+
+    # ATT 25Hz.
+    t = np.arange(0, duration_s, 0.04)
+    _, _, heading = to_lnglat(t)
+    messages["ATT"] = build_df_messages("ATT", {
+        "TimeUS": time_us(t), "Roll": 3 * np.sin(t / 1.3), "Pitch": 2 * np.sin(t / 2.1), "Yaw": heading % 360
+    })
+
+    # RFND 10Hz, some invalid values.
+    t = np.arange(0, duration_s, 0.1)
+    x, y, _ = build_trajectory(t)
+    dist = seafloor_depth(x, y) + rng.normal(0, 0.03, len(t))
+    dist[rng.random(len(t)) < 0.02] = 0.0
+    messages["RFND"] = build_df_messages("RFND", {"TimeUS": time_us(t), "Dist": dist, "Stat": np.full(len(t), 4), "Orient": np.full(len(t), 25)})
+
+    # IMU at high rate to get a realistic log size.
+    if imu_rate > 0:
+        t = np.arange(0, duration_s, 1 / imu_rate)
+        messages["IMU"] = build_df_messages("IMU", {
+            "TimeUS": time_us(t), "GyrX": rng.normal(0, 0.01, len(t)), "GyrY": rng.normal(0, 0.01, len(t)), "GyrZ": rng.normal(0, 0.01, len(t)),
+            "AccX": rng.normal(0, 0.1, len(t)), "AccY": rng.normal(0, 0.1, len(t)), "AccZ": rng.normal(-9.81, 0.1, len(t)), "T": np.full(len(t), 45.0)
+        })
+
+    # Mission: a waypoint at each end of transect.
+    t_wp = np.concatenate([[5.0], np.arange(100.0, duration_s - 5, 105.0), [duration_s - 5]])
+    lng_wp, lat_wp, _ = to_lnglat(t_wp)
+    messages["CMD"] = build_df_messages("CMD", {
+        "TimeUS": time_us(np.linspace(-50, -40, len(t_wp) + 1)), "CTot": np.full(len(t_wp) + 1, len(t_wp) + 1), "CNum": np.arange(len(t_wp) + 1),
+        "CId": np.full(len(t_wp) + 1, 16), "Lat": np.concatenate([[lat_wp[0]], lat_wp]), "Lng": np.concatenate([[lng_wp[0]], lng_wp]), "Frame": np.full(len(t_wp) + 1, 3)
+    })
+    messages["MSG"] = build_df_messages("MSG", {
+        "TimeUS": time_us(t_wp), "Message": [f"Reached waypoint #{i+1} dist 0m".encode() for i in range(len(t_wp))]
+    })
+    messages["ARM"] = build_df_messages("ARM", {"TimeUS": time_us(np.array([-30.0])), "ArmState": [1]})
+    messages["MODE"] = build_df_messages("MODE", {"TimeUS": time_us(np.array([-20.0])), "Mode": [10], "ModeNum": [10], "Rsn": [2]})
+
+    sensors_file = Path(session, "SENSORS", f"00000001.{log_format.upper()}")
+    write_bin(sensors_file, messages) if log_format == "bin" else write_log(sensors_file, messages)
+
+    # Device LLH 5Hz, GPST, emlid reach format.
+    t = np.arange(0, duration_s, 0.2)
+    lng, lat, _ = to_lnglat(t)
+    datetimes = pd.to_datetime(start_gps) + pd.to_timedelta(t, unit="s")
+    llh = pd.DataFrame({
+        "date": datetimes.strftime("%Y/%m/%d"), "time": datetimes.strftime("%H:%M:%S.%f").str[:-3],
+        "lat": np.char.mod("%.9f", lat), "lng": np.char.mod("%.9f", lng), "height": np.char.mod("%.4f", 2.5 + 0.05 * np.sin(t / 3.0)),
+        "Q": 1, "ns": 18, "sdn": "0.0040", "sde": "0.0040", "sdu": "0.0100", "sdne": "0.0000", "sdeu": "0.0000", "sdun": "0.0000", "age": "0.00", "ratio": "999.9"
+    })
+    reach_name = f"reach_raw_{start_gps.strftime('%Y%m%d%H%M%S')}"
+    with zipfile.ZipFile(Path(session, "GPS", "DEVICE", f"{reach_name}.zip"), "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.writestr(f"{reach_name}.LLH", llh.to_csv(sep=" ", header=False, index=False))
+        rinex_header = f"     3.03           OBSERVATION DATA    M                   RINEX VERSION / TYPE\n{' ' * 60}END OF HEADER\n"
+        zip_ref.writestr(f"{reach_name}_RINEX/{reach_name}.{start_gps.strftime('%y')}O", rinex_header)
+        zip_ref.writestr(f"{reach_name}_RINEX/{reach_name}.{start_gps.strftime('%y')}P", rinex_header.replace("OBSERVATION DATA", "N: GNSS NAV DATA "))
+
+    # Geoid grid covering the survey.
+    geoid_path = Path(root, "geoid_synthetic.txt")
+    lat_grid, lng_grid = np.meshgrid(np.arange(-21.30, -21.04, 0.01), np.arange(55.15, 55.41, 0.01), indexing="ij")
+    pd.DataFrame({"lat": lat_grid.ravel(), "lng": lng_grid.ravel(), "alt": 2.0 + 0.5 * (lat_grid.ravel() + 21.17)}).to_csv(geoid_path, index=False)
+
+    # Video starts with the mission.
+    if with_video:
+        video_duration_s = duration_s if video_duration_s == None else video_duration_s
+        (
+            ffmpeg.input("testsrc2=size=1280x720:rate=30000/1001", f="lavfi", t=video_duration_s)
+            .output(str(Path(session, "DCIM", "GX010001.MP4")), vcodec="libx264", preset="ultrafast", pix_fmt="yuv420p", loglevel="quiet")
+            .run()
+        )
+
+    # Plancha config, no PPK and no RGP download to stay offline.
+    with open(Path("plancha_config", "plancha_config.json")) as f:
+        cfg = json.load(f)
+    cfg["session_info"]["session_name"] = session_name
+    cfg["session_info"]["root"] = str(root)
+    cfg["dcim"]["time_first_frame_UTC"] = start_utc.strftime("%Y:%m:%d %H:%M:%S.00")
+    cfg["dcim"]["first_frame_to_keep"] = 0
+    cfg["gps"]["use_llh_position"] = False
+    cfg["gps"]["utm_zone"], cfg["gps"]["utm_south"] = "40", True
+    cfg["bathy"]["geoid_path"] = str(geoid_path)
+
+    config_path = Path(root, f"{session_name}_plancha_config.json")
+    with open(config_path, "w") as f:
+        json.dump(cfg, f, indent=3)
+
+    print(f"Session generated in {session}")
+    print(f"Sensors file: {sensors_file.name}, {round(sensors_file.stat().st_size / 1e6, 1)} Mo")
+    return config_path
+
+
+def main(opt: Namespace) -> None:
+    generate_session(Path(opt.output).resolve(), opt.session_name, opt.duration, opt.video_duration, not opt.no_video, opt.log_format, opt.imu_rate)
+
+
+if __name__ == "__main__":
+    opt = parse_option()
+    main(opt)
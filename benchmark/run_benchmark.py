@@ -0,0 +1,200 @@
+"""
+    End-to-end benchmark of the workflow stages on a synthetic session.
+
+    Each stage is run alone with stage skipping disabled, throughputs are computed from the perf records
+    and compared to a baseline file to catch regressions.
+
+    Usage: python -m benchmark.run_benchmark -o /tmp/bench -d 600 [--save_baseline]
+"""
+
+import sys
+import json
+import shutil
+import platform
+from pathlib import Path
+from datetime import datetime
+from argparse import ArgumentParser, Namespace
+
+from src.SessionBase import SessionBase
+from src.ConfigManager import ConfigManager
+from src.lib.lib_perf import reset_perf_records, get_perf_records
+from src.lib.lib_log_cache import LOG_CACHE_FOLDER_NAME
+
+from .generate_session import generate_session
+
+STAGES = ["split", "gps", "bathy", "tags"]
+DEFAULT_BASELINE_PATH = Path(Path(__file__).parent, "baseline.json")
+ENGINE_SECTIONS = {"bin_engine": "parse", "log_engine": "parse", "dpth_engine": "bathy"}
+
+
+def parse_option() -> Namespace:
+    parser = ArgumentParser(prog="run-benchmark", description="Benchmark workflow stages on a synthetic session")
+
+    parser.add_argument("-o", "--output", required=True, help="Root folder where the synthetic session is created")
+    parser.add_argument("-d", "--duration", type=float, default=600, help="Mission duration in seconds")
+    parser.add_argument("-vd", "--video_duration", type=float, default=None, help="Video duration in seconds, default is mission duration")
+    parser.add_argument("-lf", "--log_format", default="bin", choices=["bin", "log"], help="Autopilot log format")
+    parser.add_argument("-imu", "--imu_rate", type=float, default=50, help="IMU messages rate in Hz, used to get realistic log size")
+    parser.add_argument("-be", "--bin_engine", default=None, choices=["mmap", "struct"], help="Override parse.bin_engine of the config")
+    parser.add_argument("-le", "--log_engine", default=None, choices=["split", "csv"], help="Override parse.log_engine of the config")
+    parser.add_argument("-de", "--dpth_engine", default=None, choices=["window", "kdtree"], help="Override bathy.dpth_engine of the config")
+    parser.add_argument("-ng", "--no_generate", action="store_true", help="Reuse the session already generated in output folder")
+    parser.add_argument("-s", "--stages", default=",".join(STAGES), help=f"Stages to benchmark, comma separated in {STAGES}")
+    parser.add_argument("-b", "--baseline", default=str(DEFAULT_BASELINE_PATH), help="Baseline file to compare with")
+    parser.add_argument("-sb", "--save_baseline", action="store_true", help="Save results as the new baseline")
+    parser.add_argument("-t", "--tolerance", type=float, default=0.15, help="Allowed relative slowdown before a metric is flagged as regression")
+
+    return parser.parse_args()
+
+
+def get_records(name: str) -> list[dict]:
+    return [record for record in get_perf_records() if record["name"] == name and not record["failed"]]
+
+
+def get_wall(name: str) -> float | None:
+    records = get_records(name)
+    return sum(record["wall_s"] for record in records) if len(records) else None
+
+
+def get_throughput(name: str, key: str, scale: float = 1) -> float | None:
+    """ Output quantity of a recorded function per second. """
+    records = get_records(name)
+    wall = sum(record["wall_s"] for record in records)
+    quantity = sum(record["output"].get(key, 0) for record in records)
+    return round(quantity * scale / wall, 2) if len(records) and wall > 0 else None
+
+
+def add_metric(metrics: dict, name: str, value: float | None, unit: str, higher_is_better: bool) -> None:
+    if value == None: return
+    metrics[name] = {"value": round(value, 3), "unit": unit, "higher_is_better": higher_is_better}
+
+
+def run_stages(config_path: Path, stages: list[str], engines: dict) -> dict:
+    """ Run each stage alone on the session and return metrics. """
+
+    opt = Namespace(
+        plancha_config_path=str(config_path), csv=None, root_path=None, remove_frames=None, no_clean="",
+        force_use_rgp=False, only_split=False, no_split=False, no_bathy=False, no_tags=False, force_stages=True
+    )
+    cm = ConfigManager(opt)
+    for key, value in engines.items():
+        cm.cfg_prog[ENGINE_SECTIONS[key]][key] = value
+    session_name, filt_exclude_specific_datetimeUTC = next(cm.iterate_over_session())
+
+    session_base = SessionBase(Path(cm.get_root_path(), session_name))
+    session_base.prepare_folder(cm.get_folder_to_clean())
+    session_base.image_manager.setup(cm)
+    session_base.write_session_info(cm)
+
+    metrics = {}
+    if "split" in stages:
+        reset_perf_records()
+        session_base.split_videos_and_remove_first_frames(cm)
+        add_metric(metrics, "split_wall_s", get_wall("stage_split_videos"), "s", False)
+        add_metric(metrics, "split_frames_per_s", get_throughput("split_videos", "files"), "frames/s", True)
+
+    if "gps" in stages:
+        reset_perf_records()
+        session_base.compute_gps(cm)
+        add_metric(metrics, "gps_wall_s", get_wall("stage_compute_gps"), "s", False)
+
+    if "bathy" in stages:
+        # Measure parsing, not the cache of a previous run.
+        shutil.rmtree(Path(session_base.sensors_path, LOG_CACHE_FOLDER_NAME), ignore_errors=True)
+        reset_perf_records()
+        session_base.compute_bathy(cm)
+        add_metric(metrics, "bathy_wall_s", get_wall("stage_compute_bathy"), "s", False)
+
+        sensors_size = sum(file.stat().st_size for file in session_base.get_bathy_raw_files(cm) if file.suffix.lower() in [".bin", ".log"])
+        parse_wall = get_wall("parse_raw_bin") or get_wall("parse_raw_log")
+        if parse_wall: add_metric(metrics, "log_parse_mb_per_s", sensors_size / 1e6 / parse_wall, "Mo/s", True)
+
+        add_metric(metrics, "bathy_points_per_s", get_throughput("run_bathy_analysis", "rows"), "points/s", True)
+        add_metric(metrics, "depth_filter_points_per_s", get_throughput("calc_raw_depth_at_gps_coord", "rows"), "points/s", True)
+        add_metric(metrics, "grid_points_per_s", get_throughput("gen_gridded_depth_data", "rows"), "points/s", True)
+        add_metric(metrics, "bathy_postprocessing_wall_s", get_wall("run_bathy_postprocessing"), "s", False)
+
+    if "tags" in stages:
+        session_base.update_filt_exclude_interval(cm, filt_exclude_specific_datetimeUTC)
+        reset_perf_records()
+        session_base.tags_frames(cm)
+        nb_frames = len(list(session_base.image_manager.frame_path.iterdir())) if session_base.image_manager.frame_path.exists() else 0
+        tags_wall = get_wall("stage_tags_frames")
+        add_metric(metrics, "tags_wall_s", tags_wall, "s", False)
+        if tags_wall and nb_frames: add_metric(metrics, "tags_frames_per_s", nb_frames / tags_wall, "frames/s", True)
+
+    return metrics
+
+
+def compare_to_baseline(metrics: dict, baseline: dict, tolerance: float) -> list[str]:
+    """ Print a table of metrics against baseline and return names of regressed metrics. """
+
+    regressions = []
+    print(f"\n{'metric':<30}{'value':>14}{'baseline':>14}{'ratio':>10}  status")
+    for name, metric in metrics.items():
+        base = baseline.get(name, {}).get("value")
+        if base == None or base == 0:
+            print(f"{name:<30}{metric['value']:>14}{'-':>14}{'-':>10}  new ({metric['unit']})")
+            continue
+
+        # Ratio > 1 means faster than baseline.
+        ratio = metric["value"] / base if metric["higher_is_better"] else base / max(metric["value"], 1e-9)
+        status = "ok"
+        if ratio < 1 - tolerance:
+            status = "REGRESSION"
+            regressions.append(name)
+        elif ratio > 1 + tolerance:
+            status = "improved"
+        print(f"{name:<30}{metric['value']:>14}{base:>14}{round(ratio, 2):>10}  {status} ({metric['unit']})")
+
+    return regressions
+
+
+def main(opt: Namespace) -> None:
+    stages = [stage for stage in opt.stages.split(",") if stage in STAGES]
+    root = Path(opt.output).resolve()
+
+    if opt.no_generate:
+        config_path = next(root.glob("*_plancha_config.json"), None)
+        if config_path == None:
+            raise NameError(f"No synthetic session found in {root}")
+    else:
+        config_path = generate_session(root, "20250425_REU-ST-LEU_ASV-1_01", opt.duration, opt.video_duration, "split" in stages or "tags" in stages, opt.log_format, opt.imu_rate)
+
+    engines = {key: getattr(opt, key) for key in ENGINE_SECTIONS if getattr(opt, key) != None}
+    metrics = run_stages(config_path, stages, engines)
+
+    results = {
+        "creation_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(), "processor": platform.processor()},
+        "duration_s": opt.duration,
+        "log_format": opt.log_format,
+        "engines": engines,
+        "metrics": metrics
+    }
+
+    results_path = Path(root, f"benchmark_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(results_path, "w") as f:
+        json.dump(results, f, indent=3)
+    print(f"\n-- Benchmark results saved in {results_path}")
+
+    baseline_path = Path(opt.baseline)
+    baseline = {}
+    if baseline_path.exists():
+        with open(baseline_path) as f:
+            baseline = json.load(f).get("metrics", {})
+    regressions = compare_to_baseline(metrics, baseline, opt.tolerance)
+
+    if opt.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=3)
+        print(f"\n-- Baseline saved in {baseline_path}")
+
+    if len(regressions):
+        print(f"\n{len(regressions)} metrics regressed more than {int(opt.tolerance * 100)}%: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    opt = parse_option()
+    main(opt)
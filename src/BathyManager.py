@@ -1,26 +1,23 @@
 import folium
 import traceback
-import subprocess
 import numpy as np
 import pandas as pd
-import open3d as o3d
 import geopandas as gpd
 from pathlib import Path
-from shapely import Point
-from functools import partial
 from natsort import natsorted
-from datetime import datetime
-from geocube.api.core import make_geocube
-from geocube.rasterize import rasterize_points_griddata
 
 from .ConfigManager import ConfigManager
 
 from .lib.lib_tools import generate_theoric_waypoints_file, write_real_mission_interval, replace_comma_by_dot
 from .lib.lib_bathy import parse_raw_bin, parse_raw_log, build_dataframe_gps, calc_att_at_gps_coord, \
     calc_raw_depth_at_gps_coord, calc_ign_depth_at_gps_coord, plot_basic_bathy_data_time, plot_basic_bathy_data_2D, \
-    gen_gridded_depth_data
+    gen_gridded_depth_data, estimate_point_spacing
 from .lib.lib_folium_maps import folium_map_gen_sat_layer_EsriSat, folium_map_add_scatterdata, folium_map_add_linepath
-from .lib.lib_open3d_model import build_o3d_pointcloud, build_o3d_trimesh
+from .lib.lib_open3d_model import build_o3d_pointcloud, build_o3d_trimesh, write_o3d_trimesh
+from .lib.lib_raster import write_depth_cog, get_utm_crs
+from .lib.lib_vector import write_vector
+from .lib.lib_contour import build_depth_contours
+from .lib.lib_perf import perf_record
 
 class BathyManager:
     
@@ -39,14 +36,20 @@ class BathyManager:
         for file in natsorted(list(self.sensors_path.iterdir())):
             if file.suffix.lower() == ".log":
                 print('\ninfo: Loadind autopilot data :', file)
-                self.dfdict_dump_mavlink = parse_raw_log(file, cm.get_parse_keys())
+                self.dfdict_dump_mavlink = parse_raw_log(file, cm.get_parse_keys(), cm.get_parse_log_engine())
                 break
             if file.suffix.lower() == ".bin":
                 print('\ninfo: Loadind autopilot data :', file)
-                self.dfdict_dump_mavlink = parse_raw_bin(file, cm.get_parse_keys())
+                self.dfdict_dump_mavlink = parse_raw_bin(file, cm.get_parse_keys(), cm.get_parse_bin_engine())
                 break
         
 
+    def load_bathy_preproc(self, bathy_preproc_path: Path) -> None:
+        """ Reload bathy points computed by a previous run of the analysis. """
+        print('\ninfo: Loading bathy points from :', bathy_preproc_path)
+        self.df_bathy = pd.read_csv(bathy_preproc_path)
+
+
     def dont_have_log_file(self) -> bool:
         return len(self.dfdict_dump_mavlink) == 0
 
@@ -55,6 +58,7 @@ class BathyManager:
         return len(self.df_bathy) == 0
 
 
+    @perf_record(outputs=lambda result, self, *args: self.df_bathy)
     def run_bathy_analysis(self, cm: ConfigManager, session_info_path: Path, navigation_file: Path) -> None:
         
         print('\ninfo: Generate waypoints file from bin')
@@ -76,7 +80,7 @@ class BathyManager:
 
         print('\ninfo: Estimate attitude at GPS positions')
         df_att = self.dfdict_dump_mavlink[cm.get_parse_key_att()]
-        self.df_bathy = calc_att_at_gps_coord(self.df_bathy, df_att, cm.get_bathy_max_angle())
+        self.df_bathy = calc_att_at_gps_coord(self.df_bathy, df_att, cm.get_bathy_max_angle(), cm.get_bathy_att_interp())
         print('info: number of point in main dataframe : ', len(self.df_bathy))
         
         print('\ninfo: Estimate raw depth at GPS positions')
@@ -120,22 +124,19 @@ class BathyManager:
         fmap.save(Path(self.bathy_path, 'webmap_usv_track.html'))
     
 
+    @perf_record(inputs=lambda self, *args: self.df_bathy, outputs=lambda result, self, *args: self.bathy_path)
     def run_bathy_postprocessing(self, cm: ConfigManager) -> None:
 
         ###### section : interpolate bathy to regular grid
-        # time func execution
-        texec = datetime.now()
-        
         print('\nRunning open3D modelization...')
 
         # load initial data to compute average distance before generating gridded data
         print('Computing initial point cloud average distance')
         # get x, y, and z values in a numpy array
         xyz = np.array(self.df_bathy[['X_utm_corr','Y_utm_corr','Depth_corr']])
-        # xyz = np.array(df[['Lng_corr','Lat_corr','Depth_corr']])
-        # build point cloud from xyz matrix
-        pcd, avgdist, stddist = build_o3d_pointcloud(xyz)
-        print('stddist >>>>>>',stddist)
+        # nearest neighbour distance on a sample of points, full point cloud is only built for the final mesh
+        avgdist, stddist, avgdist_ci = estimate_point_spacing(xyz, cm.get_mesh_spacing_sample_size())
+        print(f'--> avg dist = {avgdist:.3f}m +/- {avgdist_ci:.3f}m (95%) and std dev = {stddist:.3f}m')
         # gen gridded data
         print('Generating gridded data')
         cm.set_mesh_spacing_m(np.round((avgdist+3*stddist),3)) 
@@ -144,10 +145,10 @@ class BathyManager:
         # get x, y, and z values in a numpy array
         print('Computing final point cloud and mesh')
         xyz = np.array(df_grid[['X_utm_corr','Y_utm_corr','Depth_corr']])
-        # build point cloud from xyz matrix
-        pcd, avgdist , _ = build_o3d_pointcloud(xyz)
+        # build point cloud from xyz matrix, grid triangulation only needs spacing_m
+        pcd, avgdist , _ = build_o3d_pointcloud(xyz, characterize=cm.get_mesh_3dalgo() != 'grid')
         # build mesh with faces from point cloud
-        mesh = build_o3d_trimesh(pcd,avgdist,method=cm.get_mesh_3dalgo())
+        mesh = build_o3d_trimesh(pcd,avgdist,method=cm.get_mesh_3dalgo(),spacing_m=cm.get_mesh_spacing_m())
         
         print('Done ... open3D mesh computed')
         
@@ -167,80 +168,47 @@ class BathyManager:
         plot_basic_bathy_data_2D(df_grid, self.bathy_path, 'postproc_'+tags)   
         
         # Shapefile with geopandas
-        print('\ninfo: Generating shapefile from gridded data')
+        print(f'\ninfo: Generating {cm.get_mesh_vector_format()} point file from gridded data')
         df_shp = df_grid[['Lng_corr','Lat_corr','Depth_corr']]
         df_shp.columns = ['lng','lat','depth']
-        df_shp_geometry = df_shp.assign(geometry=df_shp.apply(lambda row: Point(row.lng,row.lat,row.depth),axis=1))
 
-        gdf = gpd.GeoDataFrame(df_shp_geometry, geometry=df_shp_geometry.geometry)
-        gdf.set_crs(epsg=4326, inplace=True)
-        gdf.to_file(Path(self.bathy_path, f"{cm.get_session_name()}_bathy_shapefile-pointcloud-{tags}.shp"))
-        print("Shapefile created")
+        gdf = gpd.GeoDataFrame(df_shp, geometry=gpd.points_from_xy(df_shp.lng, df_shp.lat, df_shp.depth), crs="EPSG:4326")
+        write_vector(gdf, Path(self.bathy_path, f"{cm.get_session_name()}_bathy_shapefile-pointcloud-{tags}.shp"), cm.get_mesh_vector_format())
+        print("Point file created")
 
-        # Raster with geocube
+        # Raster written directly from the regular UTM grid, in the UTM CRS of the config to avoid resampling it
         print('\ninfo: Generating raster from gridded data')
-        resol_lng = np.median([np.abs(gdf.iloc[i].lng - gdf.iloc[i+1].lng) for i in range(len(gdf)-1)])
-        resol_lat = np.median([np.abs(gdf.iloc[i].lat - gdf.iloc[i+1].lat) for i in range(len(gdf)-1)])
-        resol = np.min([resol_lng, resol_lat])
-        maxnbpt = 1e6
-        condpt = ((np.max(gdf.lng.values)-np.min(gdf.lng.values))/resol) * ((np.max(gdf.lat.values)-np.min(gdf.lat.values))/resol)
-        reduceTime = 0
-        while condpt >= maxnbpt:
-            resol = resol*1.1
-            condpt = ((np.max(gdf.lng.values)-np.min(gdf.lng.values))/resol) * ((np.max(gdf.lat.values)-np.min(gdf.lat.values))/resol)
-            reduceTime += 1
-        print(f'reducing raster resolution {reduceTime} times, file too big otherwise ...')
-        print('Done adjusting raster resolution ...')
-        print('Building geocube object')
-        geo_grid = make_geocube(
-            vector_data=gdf,
-            measurements=['depth'],
-            resolution=(-resol, resol),
-            rasterize_function=partial(rasterize_points_griddata, filter_nan=True,  method=cm.get_mesh_method()),
-        )
         raster_path = str(Path(self.bathy_path, f"{cm.get_session_name()}_bathy_raster-{tags}.tif"))
         print(f'Rasterize it: {raster_path}')
-        geo_grid["depth"].rio.to_raster(raster_path)
+        utm_crs = get_utm_crs(cm.get_utm_zone(), cm.get_utm_south(), cm.get_utm_ellips())
+        write_depth_cog(df_grid, cm.get_mesh_spacing_m(), utm_crs, raster_path)
         print("Raster created")
 
         # Shapefile with countours
-        print('\ninfo: Generating shapefile with contour lines from raster')
+        print('\ninfo: Generating contour lines and polygons from gridded data')
         try:
-            # shapefile with countour lines polygons from raster
-            nb_line = 10
-            z_var = 'depth' # name of columns with depth in tiff file
-            interval_m = (np.max(gdf[z_var].values)-np.min(gdf[z_var].values))/nb_line
-            interval_m = str(interval_m) # in meter, cast to string
-
-            # shapefile with contour as lines
-            out_file_path = str(Path(self.bathy_path, f"{cm.get_session_name()}_bathy_shapefile-contourline-{tags}.shp"))
-            gdal_cmd = f'gdal_contour -b 1 -a {z_var} -i {interval_m} {raster_path} {out_file_path}'
-            print('COUNTOUR LINE gdal cmd:',gdal_cmd)
-            subprocess.run(gdal_cmd, shell=True)
-
-            # shapefile with contour as filled polygon
-            out_file_path = str(Path(self.bathy_path, f"{cm.get_session_name()}_bathy_shapefile-contourpoly-{tags}.shp"))
-            gdal_cmd = f'gdal_contour -b 1 -p -amax {z_var} -i {interval_m} {raster_path} {out_file_path}'
-            print('CONTOUR_POLY gdal cmd:',gdal_cmd)
-            subprocess.run(gdal_cmd, shell=True)
+            gdf_lines, gdf_polys = build_depth_contours(df_grid, cm.get_mesh_spacing_m(), cm.get_mesh_contour_interval_m(), utm_crs)
+
+            # contour as lines and as filled polygon, in lat/lng as the other vector outputs
+            write_vector(gdf_lines.to_crs("EPSG:4326"), Path(self.bathy_path, f"{cm.get_session_name()}_bathy_shapefile-contourline-{tags}.shp"), cm.get_mesh_vector_format())
+            write_vector(gdf_polys.to_crs("EPSG:4326"), Path(self.bathy_path, f"{cm.get_session_name()}_bathy_shapefile-contourpoly-{tags}.shp"), cm.get_mesh_vector_format())
+            print(f'{len(gdf_lines)} contour lines and {len(gdf_polys)} contour polygons created')
 
         except:
             print(traceback.format_exc(), end="\n\n")
             print('\n--- WARNING ---')
-            print('Problem occurs when generating shapefile with countours with gdal. Done nothing ...')
+            print('Problem occurs when generating contours. Done nothing ...')
         print('Done ...')
         
         # set tags for file names
         tags = '{0}-{1}'.format(cm.get_mesh_method(),
                                 cm.get_mesh_3dalgo())
 
-        # Write 3D object to .ply file
-        print('\ninfo: Writing current shapes to ply file in :', self.bathy_path)
-        ply_file_name = Path(self.bathy_path, f'{cm.get_session_name()}_bathy_3dmodel-{tags}.ply')
-        o3d.io.write_triangle_mesh(str(ply_file_name), mesh, write_ascii=True)
+        # Write 3D object to .ply or .glb file
+        print(f'\ninfo: Writing current shapes to {cm.get_mesh_model_format()} file in :', self.bathy_path)
+        model_file_name = Path(self.bathy_path, f'{cm.get_session_name()}_bathy_3dmodel-{tags}.ply')
+        model_file_name = write_o3d_trimesh(mesh, model_file_name, cm.get_mesh_model_format(), cm.get_mesh_max_triangles())
 
-        # change , in . in .ply file if it exist
-        replace_comma_by_dot(ply_file_name)
-        
-        # time func execution
-        print('func: exec time --> ',datetime.now() - texec)
\ No newline at end of file
+        # change , in . in ascii .ply file if it exist
+        if cm.get_mesh_model_format() == 'ply_ascii':
+            replace_comma_by_dot(model_file_name)
\ No newline at end of file
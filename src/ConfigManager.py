@@ -7,6 +7,18 @@ from argparse import Namespace
 
 from .enum.FolderType import FolderType, get_foldertype_from_value, get_full_folder
 
+MESH_GRID_BUFFER_CELLS = 5 # Buffer of the tiled gridding in cells when grid_buffer_m is auto.
+
+# Default values of the keys older config files don't have.
+CFG_PROG_DEFAULTS = {
+    "parse": {"bin_engine": "mmap", "log_engine": "split"},
+    "bathy": {"att_interp": "linear", "dpth_engine": "window"},
+    "mesh": {
+        "grid_engine": "tiled", "grid_buffer_m": "auto", "model_format": "ply", "max_triangles": 0,
+        "spacing_sample_size": 100000, "vector_format": "shp", "contour_interval_m": 0
+    }
+}
+
 class ConfigManager:
 
     def __init__(self, opt: Namespace) -> None:
@@ -156,6 +168,10 @@ class ConfigManager:
     
 
     # -- Getter part
+    def get_optional(self, section: str, key: str):
+        """ Value of a key older config files don't have, default value of CFG_PROG_DEFAULTS if missing. """
+        return self.cfg_prog[section].get(key, CFG_PROG_DEFAULTS[section][key])
+
     def get_root_path(self) -> str:
         return self.cfg_prog["session_info"]["root"]
     
@@ -233,6 +249,12 @@ class ConfigManager:
     def get_parse_key_depth(self) -> str:
         return self.cfg_prog["parse"]["dpthkey"]
 
+    def get_parse_bin_engine(self) -> str:
+        return self.get_optional("parse", "bin_engine")
+
+    def get_parse_log_engine(self) -> str:
+        return self.get_optional("parse", "log_engine")
+
     def get_filt_exclude_specific_timeUS(self) -> list:
         return self.cfg_prog["gps"]["filt_exclude_specific_timeUS"]
     
@@ -247,6 +269,9 @@ class ConfigManager:
     
     def get_bathy_max_angle(self) -> int:
         return int(self.cfg_prog['bathy']['max_angle'])
+
+    def get_bathy_att_interp(self) -> str:
+        return self.get_optional("bathy", "att_interp")
     
     def get_bathy_depth_min(self) -> float:
         return float(self.cfg_prog['bathy']['dpth_range']['min'])
@@ -260,6 +285,9 @@ class ConfigManager:
     def get_bathy_dpth_valid_prop(self) -> float:
         return float(self.cfg_prog['bathy']['dpth_valid_prop'])
 
+    def get_bathy_dpth_engine(self) -> str:
+        return self.get_optional("bathy", "dpth_engine")
+
     def get_geoid_path(self) -> Path:
         return Path(self.cfg_prog["bathy"]['geoid_path'])
     
@@ -284,6 +312,63 @@ class ConfigManager:
     def get_mesh_3dalgo(self) -> str:
         return self.cfg_prog['mesh']['3Dalgo']
 
+    def get_mesh_grid_engine(self) -> str:
+        return self.get_optional("mesh", "grid_engine")
+
+    def get_mesh_grid_buffer_m(self) -> float:
+        # auto keeps a few cells around the track.
+        grid_buffer_m = self.get_optional("mesh", "grid_buffer_m")
+        if grid_buffer_m == "auto":
+            return MESH_GRID_BUFFER_CELLS * self.get_mesh_spacing_m()
+        return float(grid_buffer_m)
+
+    def get_mesh_model_format(self) -> str:
+        return self.get_optional("mesh", "model_format")
+
+    def get_mesh_max_triangles(self) -> int:
+        return int(self.get_optional("mesh", "max_triangles"))
+
+    def get_mesh_spacing_sample_size(self) -> int:
+        return int(self.get_optional("mesh", "spacing_sample_size"))
+
+    def get_mesh_vector_format(self) -> str:
+        return self.get_optional("mesh", "vector_format")
+
+    def get_mesh_contour_interval_m(self) -> float:
+        return float(self.get_optional("mesh", "contour_interval_m"))
+
+    # -- Stage config part. Subtree of the config a stage depends on, used to know if a stage need to be processed again.
+
+    def get_split_stage_config(self) -> dict:
+        return {
+            "frames_per_second": self.get_frames_per_second(),
+            "only_split": self.is_only_split(),
+            "first_frame_to_keep": self.get_first_frame_to_keep() # Frames before it are deleted after the split.
+        }
+
+    def get_gps_stage_config(self) -> dict:
+        return self.cfg_prog["gps"]
+
+    def get_bathy_analysis_stage_config(self) -> dict:
+        return {
+            "parse": {key: value for key, value in self.cfg_prog["parse"].items() if key not in ["bin_engine", "log_engine"]}, # Engines give the same data.
+            "bathy": {key: value for key, value in self.cfg_prog["bathy"].items() if key != "dpth_engine"}, # Engines give the same data.
+            "gps": {key: self.cfg_prog["gps"][key] for key in ["use_llh_position", "utm_zone", "utm_south", "utm_ellips", "filt_rtkfix", "filt_waypoint", "filt_exclude_specific_timeUS"]},
+            "leap_sec": self.get_leap_second()
+        }
+
+    def get_bathy_postprocessing_stage_config(self) -> dict:
+        return {
+            "mesh": {key: value for key, value in self.cfg_prog["mesh"].items() if key != "spacing_m"}, # spacing_m is autofilled.
+            "gps": {key: self.cfg_prog["gps"][key] for key in ["utm_zone", "utm_south", "utm_ellips"]}
+        }
+
+    def get_tags_stage_config(self) -> dict:
+        return {
+            "dcim": self.cfg_prog["dcim"],
+            "only_split": self.is_only_split()
+        }
+
     # -- Setter part
 
     def set_frames_per_second(self, frames_per_second: str) -> None:
@@ -300,6 +385,9 @@ class ConfigManager:
     
     # -- Boolean method
 
+    def force_all_stages(self) -> bool:
+        return bool(self.opt.force_stages)
+
     def can_split(self) -> bool:
         return not bool(self.opt.no_split)
 
@@ -15,6 +15,7 @@ from .enum.StandardDeviationType import StandardDeviationType
 
 from .lib.lib_tools import llh_to_txt, get_hours_from_bin_sensors, replace_line, pos_to_llh, gpx_to_llh
 from .lib.lib_plot import plot_gps_quality, plot_standard_deviation
+from .lib.lib_perf import perf_record
 
 class GPSManager:
 
@@ -140,6 +141,7 @@ class GPSManager:
             plot_standard_deviation(self.device_path, csv_llh, 'sde_fix=1_ppk.png', StandardDeviationType.EAST)
     
 
+    @perf_record(outputs=lambda result, self, *args: self.base_RGP_filepath)
     def download_rgp(self, cm: ConfigManager, session_name: str, frames_path: Path, sensors_path: Path) -> None:
 
         alphabet = "abcdefghijklmnopqrstuvwx"
@@ -165,7 +167,7 @@ class GPSManager:
 
         # If no frames, get hours from sensor file
         if nb_frames == 0:
-            hour_start, hour_end = get_hours_from_bin_sensors(session_name, sensors_path)
+            hour_start, hour_end = get_hours_from_bin_sensors(session_name, sensors_path, cm.get_leap_second())
         
         rgp_station = cm.get_rgp_station()
         
@@ -199,6 +201,7 @@ class GPSManager:
                         merged_rinex.write(file_rinex.read())
         
 
+    @perf_record(inputs=lambda self, *args: [self.device_RINEX_filepath, self.base_RINEX_filepath, self.base_RGP_filepath], outputs=lambda result, self, *args: self.ppk_solution)
     def ppk(self, cm: ConfigManager, session_name: str) -> None:
 
         ppk_config_file = cm.get_ppk_config_path()
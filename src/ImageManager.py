@@ -4,10 +4,11 @@ import traceback
 import pandas as pd
 from pathlib import Path
 from natsort import natsorted
-from datetime import datetime
 
 from .enum.DCIMType import DCIMType
 from .ConfigManager import ConfigManager
+from .lib.lib_perf import perf_record
+from .lib.lib_timebase import datetime_to_ns
 
 VIDEO_EXTENSION = [".mp4"]
 IMAGE_EXTENSION = [".jpg", ".jpeg"]
@@ -86,6 +87,11 @@ class ImageManager:
         return self.dcim_type == DCIMType.VIDEO
     
 
+    def get_videos(self) -> list[Path]:
+        return [file for file in natsorted(list(self.dcim_path.iterdir())) if file.suffix.lower() in VIDEO_EXTENSION]
+    
+
+    @perf_record(inputs=lambda self, *args: self.get_videos(), outputs=lambda result, self, *args: self.frame_path)
     def split_videos(self, split_only_first_video: bool, fps: str) -> None:
 
         count_video = 0
@@ -95,7 +101,6 @@ class ImageManager:
             print("Videos already split in frames")
             return        
 
-        texec = datetime.now()
         # for each file in the videos folder
         for file in natsorted(list(self.dcim_path.iterdir())):
             if file.suffix.lower() not in VIDEO_EXTENSION: continue
@@ -117,7 +122,6 @@ class ImageManager:
 
             if split_only_first_video: break
 
-        print(f"\nfunc: exec time --> {datetime.now() - texec} sec")
         print("End of splitting videos\n")
     
     
@@ -139,25 +143,24 @@ class ImageManager:
     def remove_outside_frames(self, csv_exiftool_frames: pd.DataFrame, session_info: pd.DataFrame) -> pd.DataFrame:
         print("\n-- Remove frames before first waypoint and after last waypoint\n")
 
-        if "Mission_START" not in list(session_info) or "Mission_END" not in list(session_info) or "SubSecDateTimeOriginal_np" not in csv_exiftool_frames:
+        if "Mission_START" not in list(session_info) or "Mission_END" not in list(session_info) or "datetime_unix" not in csv_exiftool_frames:
             print("[WARNING] Mission interval wasn't found, no filtering.")
             return csv_exiftool_frames
 
         # Get unix_timestamp.
-        start_wp = pd.to_datetime(session_info["Mission_START"].iloc[0])
-        end_wp = pd.to_datetime(session_info["Mission_END"].iloc[0])
+        start_wp, end_wp = datetime_to_ns([session_info["Mission_START"].iloc[0], session_info["Mission_END"].iloc[0]])
+        frames_datetime_unix = csv_exiftool_frames["datetime_unix"]
 
         # To avoid remove all frames on disfunction, we check if last frame is not before mission start or first frame after mission end.
-        isAllFramesBeforeMissionStart = pd.to_datetime(csv_exiftool_frames["SubSecDateTimeOriginal_np"].iloc[-1]) < start_wp
-        isAllFramesAfterMissionEnd = pd.to_datetime(csv_exiftool_frames["SubSecDateTimeOriginal_np"].iloc[0]) > end_wp
+        isAllFramesBeforeMissionStart = frames_datetime_unix.iloc[-1] < start_wp
+        isAllFramesAfterMissionEnd = frames_datetime_unix.iloc[0] > end_wp
 
         if isAllFramesBeforeMissionStart or isAllFramesAfterMissionEnd: 
             print("func: Frames are not in mission interval, to avoid remove all frames, done nothing")
             return csv_exiftool_frames
 
         # Filter.
-        csv_exiftool_frames = csv_exiftool_frames[pd.to_datetime(csv_exiftool_frames["SubSecDateTimeOriginal_np"]) >= start_wp]
-        csv_exiftool_frames = csv_exiftool_frames[pd.to_datetime(csv_exiftool_frames["SubSecDateTimeOriginal_np"]) <= end_wp]
+        csv_exiftool_frames = csv_exiftool_frames[(frames_datetime_unix >= start_wp) & (frames_datetime_unix <= end_wp)]
 
         list_frames, cpt_frames = list(csv_exiftool_frames["FileName"]), 0
         # Remove outside frames.
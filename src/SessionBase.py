@@ -1,11 +1,12 @@
 import json
 import shutil
 import exiftool
+import threading
 import traceback
 import numpy as np
 import pandas as pd
 from pathlib import Path
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from .GPSManager import GPSManager
 from .BathyManager import BathyManager
@@ -16,7 +17,10 @@ from .enum.DCIMType import DCIMType
 from .enum.FolderType import FolderType
 
 from .lib.lib_bathy import bathy_preproc_to_txt
-from .lib.lib_tools import convert_datetime_to_datetime_unix, convert_datetime_unix_to_datetime
+from .lib.lib_perf import perf_record, PerfBlock, write_perf_report
+from .lib.lib_manifest import load_stage_manifest, is_stage_up_to_date, write_stage_manifest, get_file_key
+from .lib.lib_tools import convert_datetime_to_datetime_unix, convert_datetime_unix_to_datetime, read_llh_txt
+from .lib.lib_timebase import datetime_to_ns, ns_to_exif_datetime, TimeInterpolator
 
 class SessionBase:
 
@@ -32,23 +36,33 @@ class SessionBase:
         self.gps_device_path = Path(self.session, "GPS", "DEVICE") 
         self.pd_bathy_path = Path(self.session, "PROCESSED_DATA", "BATHY")
         self.pd_frames_path = Path(self.session, "PROCESSED_DATA", "FRAMES") 
+        self.manifest_path = Path(self.metadata_path, "manifest")
 
         # Important files.
         self.prog_config_path = Path(self.metadata_path, "prog_config.json")
         self.session_info_path = Path(self.metadata_path, "session_info.csv")
         self.metadata_csv_path = Path(self.metadata_path, "metadata.csv")
+        self.bathy_preproc_path = Path(self.pd_bathy_path, "bathy_preproc.csv")
 
         # Manager.
         self.image_manager = ImageManager(self.session.name, self.dcim_path, self.pd_frames_path)
         self.gps_manager = GPSManager(self.gps_device_path, self.gps_base_path)
         self.bathy_manager = BathyManager(self.sensors_path, self.pd_bathy_path)
 
+        # Set when frames are extracted. Cleared while videos are split in background.
+        self.frames_ready = threading.Event()
+        self.frames_ready.set()
 
-    def prepare_folder(self, folder_to_clean: list[FolderType]) -> None:
+
+    def prepare_folder(self, folder_to_clean: list[FolderType], folder_to_keep: list[FolderType] = []) -> None:
 
         print("-- We are deleting already processed session: ")
 
         for ft in folder_to_clean:
+            if ft in folder_to_keep:
+                print("\t* Keeping " + ft.name + ", its stages are up to date")
+                continue
+
             print("\t* Deleting " + ft.name)
             if ft == FolderType.GPS:
                 # Clean this type of architecture for GPS folders
@@ -73,7 +87,16 @@ class SessionBase:
 
                         if file.is_dir(): shutil.rmtree(file)
                         elif file.is_file(): file.unlink()
-  
+
+            elif ft == FolderType.METADATA:
+                # Keep stage manifests. A stage is only skipped if its outputs still exist.
+                if self.metadata_path.exists():
+                    for file in self.metadata_path.iterdir():
+                        if file == self.manifest_path: continue
+
+                        if file.is_dir(): shutil.rmtree(file)
+                        elif file.is_file(): file.unlink()
+
             else:
                 folder_to_remove = self.get_path_based_on_folder_type(ft)
                 if folder_to_remove.exists():
@@ -85,12 +108,141 @@ class SessionBase:
             folder_to_create.mkdir(exist_ok=True, parents=True)
 
 
+    def get_folder_to_keep(self, cm: ConfigManager, folder_to_clean: list[FolderType]) -> list[FolderType]:
+        """
+            Folders whose stages have a valid manifest, cleaning them would only force these stages to be processed again.
+            A folder is kept only if the folders holding the inputs of its stages are kept too.
+        """
+
+        if cm.force_all_stages(): return []
+
+        def is_valid(stage: str, files: list[Path], config: dict, outputs: list[Path], with_hash: bool = True) -> bool:
+            return is_stage_up_to_date(load_stage_manifest(self.get_stage_manifest_path(stage)), files, self.session, config, outputs, with_hash)
+
+        folder_to_keep = []
+        def is_kept(ft: FolderType) -> bool:
+            return ft in folder_to_keep or ft not in folder_to_clean
+
+        # Frames path and frame rate of image sessions are needed by split and tags configs.
+        if self.dcim_path.exists(): self.image_manager.setup(cm)
+
+        videos = self.image_manager.get_videos() if self.dcim_path.exists() else []
+        if is_valid("split_videos", videos, cm.get_split_stage_config(), [self.pd_frames_path]):
+            folder_to_keep.append(FolderType.FRAMES)
+
+        gps_state = self.get_stage_state("compute_gps")
+        ppk_solution = Path(self.session, gps_state["ppk_solution"]) if "ppk_solution" in gps_state else None
+        if ppk_solution != None and is_valid("compute_gps", self.get_gps_raw_files(cm), cm.get_gps_stage_config(), [ppk_solution]):
+            folder_to_keep.append(FolderType.GPS)
+        if not is_kept(FolderType.GPS): ppk_solution = None
+
+        if is_kept(FolderType.GPS) and is_valid("bathy_analysis", self.get_bathy_raw_files(cm, ppk_solution), cm.get_bathy_analysis_stage_config(), [self.bathy_preproc_path]):
+            folder_to_keep.append(FolderType.BATHY)
+
+        # Tags inputs are frames, navigation and bathy.
+        if all(is_kept(ft) for ft in [FolderType.FRAMES, FolderType.GPS, FolderType.BATHY]) and \
+            is_valid("tags_frames", self.get_tags_files(ppk_solution), cm.get_tags_stage_config(), [self.metadata_csv_path], with_hash=False):
+            folder_to_keep.append(FolderType.METADATA)
+
+        return folder_to_keep
+
+
     def get_path_based_on_folder_type(self, folder_type: FolderType) -> Path:
         if folder_type == FolderType.METADATA: return self.metadata_path
         if folder_type == FolderType.FRAMES: return self.pd_frames_path
         if folder_type == FolderType.BATHY: return self.pd_bathy_path
     
 
+    def get_stage_manifest_path(self, stage: str) -> Path:
+        return Path(self.manifest_path, f"{stage}.json")
+
+
+    def get_stage_state(self, stage: str) -> dict:
+        return load_stage_manifest(self.get_stage_manifest_path(stage)).get("state", {})
+
+
+    def is_stage_up_to_date(self, cm: ConfigManager, stage: str, files: list[Path], config: dict, outputs: list[Path], with_hash: bool = True) -> bool:
+        """ Return True if the stage was already processed with the same inputs and config. """
+
+        if cm.force_all_stages(): return False
+
+        manifest = load_stage_manifest(self.get_stage_manifest_path(stage))
+        if not is_stage_up_to_date(manifest, files, self.session, config, outputs, with_hash): return False
+
+        print(f"\n-- Stage {stage} already processed with the same inputs and config, skipping")
+        return True
+
+
+    def save_stage_manifest(self, stage: str, files: list[Path], config: dict, state: dict, with_hash: bool = True) -> None:
+        manifest_path = self.get_stage_manifest_path(stage)
+        write_stage_manifest(manifest_path, files, self.session, config, state, load_stage_manifest(manifest_path), with_hash)
+
+
+    def write_perf_report(self) -> dict:
+        return write_perf_report(Path(self.metadata_path, "perf_report.json"), self.session.name)
+
+
+    def get_session_info_values(self) -> dict:
+        if not self.session_info_path.exists(): return {}
+        session_info = pd.read_csv(self.session_info_path)
+        return json.loads(session_info.iloc[[0]].to_json(orient="records"))[0] if len(session_info) else {}
+
+
+    def get_new_session_info_values(self, session_info_before: dict) -> dict:
+        """ Return session_info values added or changed by a stage. """
+        return {key: value for key, value in self.get_session_info_values().items() if key not in session_info_before or session_info_before[key] != value}
+
+
+    def restore_session_info_values(self, values: dict) -> None:
+        """ Write back session_info values of a skipped stage. """
+        if len(values) == 0 or not self.session_info_path.exists(): return
+
+        session_info = pd.read_csv(self.session_info_path)
+        for key, value in values.items():
+            session_info[key] = [value]
+        session_info.to_csv(self.session_info_path, sep = ',', index=False)
+
+
+    def get_ppk_config_files(self, cm: ConfigManager) -> list[Path]:
+        """ RTKLIB config used for PPK, if there is one. """
+        try:
+            return [cm.get_ppk_config_path()]
+        except NameError:
+            return []
+
+
+    def get_gps_raw_files(self, cm: ConfigManager) -> list[Path]:
+        """ Zip and gpx files provided by the user and PPK config, everything else in GPS folder is generated. """
+        gps_files = []
+        for folder in [self.gps_device_path, self.gps_base_path]:
+            if not folder.exists(): continue
+            gps_files += [file for file in folder.iterdir() if file.is_file() and file.suffix.lower() in [".zip", ".gpx"]]
+        return sorted(gps_files) + self.get_ppk_config_files(cm)
+
+
+    def get_bathy_raw_files(self, cm: ConfigManager, ppk_solution: Path | None = None) -> list[Path]:
+        """ ppk_solution defaults to the one of the GPS manager. """
+        ppk_solution = self.gps_manager.ppk_solution if ppk_solution == None else ppk_solution
+        bathy_files = sorted([file for file in self.sensors_path.iterdir() if file.suffix.lower() in [".log", ".bin"]]) if self.sensors_path.exists() else []
+        if ppk_solution != None:
+            bathy_files.append(ppk_solution)
+        bathy_files += self.get_ppk_config_files(cm)
+        if cm.use_geoid() and cm.get_geoid_path().exists():
+            bathy_files.append(cm.get_geoid_path())
+        return bathy_files
+
+
+    def get_tags_files(self, ppk_solution: Path | None = None) -> list[Path]:
+        """ ppk_solution defaults to the one of the GPS manager. """
+        ppk_solution = self.gps_manager.ppk_solution if ppk_solution == None else ppk_solution
+        tags_files = sorted(self.image_manager.frame_path.iterdir()) if self.image_manager.frame_path.exists() else []
+        if ppk_solution != None:
+            tags_files.append(ppk_solution)
+        if self.bathy_preproc_path.exists():
+            tags_files.append(self.bathy_preproc_path)
+        return tags_files
+
+
     def write_session_info(self, cm: ConfigManager) -> None:
         print("\n-- Writing session info in csv file\n")
 
@@ -103,10 +255,23 @@ class SessionBase:
         session_info.to_csv(self.session_info_path, index=False)
      
 
+    @perf_record("stage_split_videos")
     def split_videos(self, cm: ConfigManager) -> None:
         
         if not cm.can_split() or not self.image_manager.dcim_folder_is_video_folder() : return 
+
+        videos = self.image_manager.get_videos()
+        split_config = cm.get_split_stage_config()
+        if self.is_stage_up_to_date(cm, "split_videos", videos, split_config, [self.pd_frames_path]): return
+
+        # Frames come from other videos, another framerate or first frames were deleted, extract them again.
+        if self.get_stage_manifest_path("split_videos").exists() and self.pd_frames_path.exists():
+            print("-- Videos, framerate or first frame to keep changed since last split, deleting frames")
+            shutil.rmtree(self.pd_frames_path)
+            self.pd_frames_path.mkdir(parents=True)
+
         self.image_manager.split_videos(cm.is_only_split(), cm.get_frames_per_second())
+        self.save_stage_manifest("split_videos", videos, split_config, {})
     
 
     def remove_first_frames(self, cm: ConfigManager) -> None:
@@ -115,12 +280,50 @@ class SessionBase:
         self.image_manager.remove_first_frames(max_frame)
 
 
+    def split_videos_and_remove_first_frames(self, cm: ConfigManager) -> None:
+        try:
+            self.split_videos(cm)
+
+            if not cm.is_only_split():
+                self.remove_first_frames(cm)
+        finally:
+            self.frames_ready.set()
+
+
+    def run_split_gps_bathy(self, cm: ConfigManager) -> None:
+        """ 
+            Split videos in background while GPS and bathy are computed.
+            Bathy needs the navigation file of GPS but none of them need the frames, only tags need all of them.
+        """
+
+        self.frames_ready.clear()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="split_videos") as executor:
+            split_future = executor.submit(self.split_videos_and_remove_first_frames, cm)
+            try:
+                self.compute_gps(cm)
+                self.compute_bathy(cm)
+            finally:
+                # Join before tagging, raise split error if any.
+                split_future.result()
+
+
+    @perf_record("stage_compute_gps", inputs=lambda self, cm: self.get_gps_raw_files(cm), outputs=lambda result, self, cm: self.gps_manager.ppk_solution)
     def compute_gps(self, cm: ConfigManager) -> None:
 
         print("\n-- GPS Computing \n")
 
+        gps_files = self.get_gps_raw_files(cm)
+        gps_config = json.loads(json.dumps(cm.get_gps_stage_config())) # Copy, force_use_rgp can be updated during the stage.
+        state = self.get_stage_state("compute_gps")
+        if "ppk_solution" in state and self.is_stage_up_to_date(cm, "compute_gps", gps_files, gps_config, [Path(self.session, state["ppk_solution"])]):
+            self.gps_manager.ppk_solution = Path(self.session, state["ppk_solution"])
+            cm.set_force_rgp(state["force_use_rgp"])
+            self.restore_session_info_values(state["session_info"])
+            return
+
         if not self.gps_manager.need_compute_gps(): return
 
+        session_info_before = self.get_session_info_values()
         self.gps_manager.setup(cm, self.session_info_path)
 
         try:
@@ -133,6 +336,8 @@ class SessionBase:
             # If user want to perform PPK with RGP station or if rinex files are not here we need to download rgp data.
             elif cm.force_rgp() or self.gps_manager.base_RINEX_filepath == None:
                 print(f"Downloading RGP data from {cm.get_rgp_station()} station :")
+                # Number of frames is used to know which hours to download.
+                self.frames_ready.wait()
                 self.gps_manager.download_rgp(cm, self.session.name, self.pd_frames_path, self.sensors_path)
                 cm.set_force_rgp(True)
 
@@ -152,12 +357,19 @@ class SessionBase:
             else:
                 raise NameError("No Navigation where found.")
 
+            self.save_stage_manifest("compute_gps", gps_files, gps_config, {
+                "ppk_solution": get_file_key(self.gps_manager.ppk_solution, self.session),
+                "force_use_rgp": cm.force_rgp(),
+                "session_info": self.get_new_session_info_values(session_info_before)
+            })
+
         except:
             print(traceback.format_exc(), end="\n\n")
             print('\n--- WARNING ---')
             print('Problem occurs when trying to process GPS ...')
         print('Done ...')
     
+    @perf_record("stage_compute_bathy", inputs=lambda self, cm: self.get_bathy_raw_files(cm), outputs=lambda result, self, cm: self.pd_bathy_path)
     def compute_bathy(self, cm: ConfigManager) -> None:
 
         if not cm.compute_bathy(): return
@@ -165,17 +377,39 @@ class SessionBase:
         print("\n-- BATHY Computing \n")
 
         try:
-            self.bathy_manager.load_data(cm)
+            analysis_config = cm.get_bathy_analysis_stage_config()
+            if self.is_stage_up_to_date(cm, "bathy_analysis", self.get_bathy_raw_files(cm), analysis_config, [self.bathy_preproc_path]):
+                state = self.get_stage_state("bathy_analysis")
+                self.bathy_manager.filt_exclude_specific_datetimeUnix = state["filt_exclude_specific_datetimeUnix"]
+                self.restore_session_info_values(state["session_info"])
+                self.bathy_manager.load_bathy_preproc(self.bathy_preproc_path)
+            else:
+                session_info_before = self.get_session_info_values()
+                self.bathy_manager.load_data(cm)
 
-            if self.bathy_manager.dont_have_log_file():
-                print("\ninfo: We do not have a log file or bin file. Abort bathy processing")
-                return
+                if self.bathy_manager.dont_have_log_file():
+                    print("\ninfo: We do not have a log file or bin file. Abort bathy processing")
+                    return
+
+                self.bathy_manager.run_bathy_analysis(cm, self.session_info_path, self.gps_manager.get_navigation_file_in_text())
+
+                if not self.bathy_manager.cannot_perform_bathy_post_processing():
+                    # Files are listed after the analysis because log file can be cleaned of null bytes.
+                    self.save_stage_manifest("bathy_analysis", self.get_bathy_raw_files(cm), analysis_config, {
+                        "filt_exclude_specific_datetimeUnix": self.bathy_manager.filt_exclude_specific_datetimeUnix,
+                        "session_info": self.get_new_session_info_values(session_info_before)
+                    })
 
-            self.bathy_manager.run_bathy_analysis(cm, self.session_info_path, self.gps_manager.get_navigation_file_in_text())
-            
             if self.bathy_manager.cannot_perform_bathy_post_processing(): return
-            
+
+            postprocessing_config = cm.get_bathy_postprocessing_stage_config()
+            postprocessing_outputs = [Path(self.pd_bathy_path, f"bathy_postproc_{cm.get_mesh_method()}.csv")]
+            if self.is_stage_up_to_date(cm, "bathy_postprocessing", [self.bathy_preproc_path], postprocessing_config, postprocessing_outputs):
+                cm.set_mesh_spacing_m(self.get_stage_state("bathy_postprocessing")["spacing_m"])
+                return
+
             self.bathy_manager.run_bathy_postprocessing(cm)
+            self.save_stage_manifest("bathy_postprocessing", [self.bathy_preproc_path], postprocessing_config, {"spacing_m": cm.get_mesh_spacing_m()})
 
         except Exception:
             print(traceback.format_exc(), end="\n\n")
@@ -193,12 +427,21 @@ class SessionBase:
         cm.set_filt_exclude_specific_datetimeUTC(filt_exclude_specific_datetimeUTC_list)
         
     
+    @perf_record("stage_tags_frames", inputs=lambda self, cm: self.image_manager.frame_path, outputs=lambda result, self, cm: self.metadata_csv_path)
     def tags_frames(self, cm: ConfigManager) -> None:
 
         if cm.dont_tags_frames(): return
 
+        tags_config = cm.get_tags_stage_config()
+        # Frames are big and numerous, only size and modification time are checked.
+        if self.is_stage_up_to_date(cm, "tags_frames", self.get_tags_files(), tags_config, [self.metadata_csv_path], with_hash=False):
+            self.restore_session_info_values(self.get_stage_state("tags_frames")["session_info"])
+            return
+
+        session_info_before = self.get_session_info_values()
+
         # Get metadata of frames
-        with exiftool.ExifTool(common_args=["-n"]) as et:
+        with PerfBlock("exiftool_read_frames_metadata", self.image_manager.frame_path), exiftool.ExifTool(common_args=["-n"]) as et:
             json_frames_metadata = et.execute(*[f"-j", "-fileorder", "filename", str(self.image_manager.frame_path)])
 
         if json_frames_metadata == "":
@@ -224,7 +467,7 @@ class SessionBase:
             if file_path == None:
                 print(f"No video file found for extracting metadata")
             
-            with exiftool.ExifToolHelper(common_args=[]) as et:
+            with PerfBlock("exiftool_read_video_metadata", file_path), exiftool.ExifToolHelper(common_args=[]) as et:
                 metadata = et.get_metadata(file_path)
 
             csv_exiftool_video = pd.DataFrame(metadata)
@@ -263,47 +506,35 @@ class SessionBase:
         nb_of_frames = csv_exiftool_frames.shape[0] 
         # create vector of dates and times
         datetime_vec_np = np.arange(0,nb_of_frames)*step+start
-        datetime_vec = []
-        # convert "datetime_vec_np" to "datetime_vec" in order to create vector of DateTime in Exiftool format
-        for curr_datetime in datetime_vec_np :
-            curr_datetime = str(curr_datetime)
-            curr_datetime = curr_datetime.replace("T", " ")
-            curr_datetime = curr_datetime.replace("-", ":", 2)
-            datetime_vec.append(curr_datetime)
-        csv_exiftool_frames["SubSecDateTimeOriginal"] = datetime_vec
+        # Frame times are kept as unix time in ns, strings in Exiftool format are only built for export.
+        # please see : https://www.unixtimestamp.com/
+        csv_exiftool_frames["SubSecDateTimeOriginal"] = ns_to_exif_datetime(datetime_vec_np.astype('int64'))
         csv_exiftool_frames["SubSecDateTimeOriginal_np"] = datetime_vec_np
+        csv_exiftool_frames['datetime_unix'] = datetime_vec_np.astype('int64')
 
         # 1.GPS
         if self.gps_manager.ppk_solution != None :
             print("\n-- ADD POSITION, ROLL, PITCH, YAW, DEPTH TO CSV METADATA\n")
-            # convert "SubSecDateTimeOriginal_np" to unix time in order to do interpolation
-            # please see : https://www.unixtimestamp.com/
-            csv_exiftool_frames['datetime_unix'] = csv_exiftool_frames['SubSecDateTimeOriginal_np'].astype('int64')
             #############################
             # import lat and lon from LLH
             #############################
-            csv_llh = pd.read_csv(self.gps_manager.get_navigation_file_in_text())
-            # create datetime col
-            csv_llh['SubSecDateTimeOriginal_np'] = csv_llh['GPSDateStamp'] + ' ' + csv_llh['GPSTimeStamp']
-            # adapt format to the exiftool one
-            csv_llh['SubSecDateTimeOriginal_np'] = csv_llh['SubSecDateTimeOriginal_np'].str.replace("/", "-")
-            # convert column to date type (and express in "ms" to corresponds to csv_exiftool_frames["SubSecDateTimeOriginal_np"])
-            csv_llh['SubSecDateTimeOriginal_np'] = pd.to_datetime(csv_llh['SubSecDateTimeOriginal_np'])
-            csv_llh['datetime_unix'] = (csv_llh['SubSecDateTimeOriginal_np'] - pd.Timestamp("1970-01-01")) // pd.Timedelta("1ns")
-            csv_llh['datetime_unix'] =  csv_llh['datetime_unix'].values.astype('int64')
+            csv_llh = read_llh_txt(self.gps_manager.get_navigation_file_in_text())
+            llh_values = TimeInterpolator(csv_exiftool_frames['datetime_unix'], csv_llh['datetime_unix']).interp_columns(csv_llh, {
+                'GPSLatitude': 'linear', 'GPSLongitude': 'linear', 'fix': 'linear', 'sdn': 'linear', 'sde': 'linear'
+            })
             # linear interpolation, if different interpolation needed :
             # please see :
             # https://docs.scipy.org/doc/scipy/tutorial/interpolate/1D.html
-            csv_exiftool_frames['GPSLatitude'] = np.interp(csv_exiftool_frames['datetime_unix'], csv_llh['datetime_unix'], csv_llh['GPSLatitude'])
-            csv_exiftool_frames['GPSLongitude'] = np.interp(csv_exiftool_frames['datetime_unix'], csv_llh['datetime_unix'], csv_llh['GPSLongitude'])
+            csv_exiftool_frames['GPSLatitude'] = llh_values['GPSLatitude']
+            csv_exiftool_frames['GPSLongitude'] = llh_values['GPSLongitude']
             # A) we want to write lat and lon in "Composite" family tags, because in "Exif" family tags we cannot assign "-" sign to lat and lon
             #csv_exiftool_frames.rename(columns={"GPSLatitude": "Composite:GPSLatitude", "GPSLongitude": "Composite:GPSLongitude"}, inplace=True)
             # or B) Use fields Position and GPSxxxRef to specify coordinates
-            csv_exiftool_frames['GPSPosition'] = [str(csv_exiftool_frames['GPSLatitude'][i])+', '+str(csv_exiftool_frames['GPSLongitude'][i]) for i in range(len(csv_exiftool_frames['GPSLatitude'] ))]
+            csv_exiftool_frames['GPSPosition'] = csv_exiftool_frames['GPSLatitude'].astype(str) + ', ' + csv_exiftool_frames['GPSLongitude'].astype(str)
             # add STATUS (fix column, quality signal) and standars deviations to metadata.csv
             # please refer to pg.104:
             # https://www.rtklib.com/prog/manual_2.4.2.pdf
-            csv_exiftool_frames['GPSfix'] = np.interp(csv_exiftool_frames['datetime_unix'], csv_llh['datetime_unix'], csv_llh['fix'])
+            csv_exiftool_frames['GPSfix'] = llh_values['fix']
             # since we interpolate, we will have some decimal status values that does not have any sense
             # we assign to decimal values the worst case value following this rule :
             csv_exiftool_frames.loc[(csv_exiftool_frames['GPSfix']  > 1) & (csv_exiftool_frames['GPSfix']  < 2), 'GPSfix'] = 2
@@ -313,17 +544,16 @@ class SessionBase:
             # The sdn, sde or sdu means N (north), E (east) or U (up) component of the standard deviations in m.
             # The absolute value of sdne, sdeu or sdun means square root of the absolute value of NE,
             # EU or UN component of the estimated covariance matrix.
-            csv_exiftool_frames['GPSsdn'] = np.interp(csv_exiftool_frames['datetime_unix'], csv_llh['datetime_unix'], csv_llh['sdn'])
-            csv_exiftool_frames['GPSsde'] = np.interp(csv_exiftool_frames['datetime_unix'], csv_llh['datetime_unix'], csv_llh['sde'])
+            csv_exiftool_frames['GPSsdn'] = llh_values['sdn']
+            csv_exiftool_frames['GPSsde'] = llh_values['sde']
 
         # 2.BATHY
         flag_bathy = 0
         # check if we have bathymetry data in order to add them to frames EXIF metadata
 
-        for file in self.pd_bathy_path.iterdir():
-            if "bathy_preproc.csv" == file.name:
-                flag_bathy = 1
-                csv_bathy_preproc_path = bathy_preproc_to_txt(file)
+        if self.bathy_preproc_path.exists():
+            flag_bathy = 1
+            csv_bathy_preproc_path = bathy_preproc_to_txt(self.bathy_preproc_path)
 
         if flag_bathy == 1 :
             ######################################################
@@ -331,12 +561,9 @@ class SessionBase:
             ######################################################
 
             csv_bathy_preproc = pd.read_csv(csv_bathy_preproc_path)
-            # delete 3 last digit of "GPS_time"
-            csv_bathy_preproc['GPS_time'] = csv_bathy_preproc['GPS_time'].str[:-3]
-            # adapt format to the exiftool one
-            csv_bathy_preproc['GPS_time'] = pd.to_datetime(csv_bathy_preproc['GPS_time'])
-            csv_bathy_preproc['datetime_unix'] = (csv_bathy_preproc['GPS_time'] - pd.Timestamp("1970-01-01")) // pd.Timedelta("1ns")
-            csv_bathy_preproc['datetime_unix'] = csv_bathy_preproc['datetime_unix'].values.astype('int64')
+            # Older bathy_preproc files only have GPS_time string.
+            if 'datetime_unix' not in csv_bathy_preproc:
+                csv_bathy_preproc['datetime_unix'] = datetime_to_ns(csv_bathy_preproc['GPS_time'])
 
             # Before interpolate, we need to transform roll pitch yaw value if video was rotate. Ironically, video is rotate when autorotation value is Up
             if "AutoRotation" in csv_exiftool_video and csv_exiftool_video["AutoRotation"].iloc[0] == "Up":
@@ -344,10 +571,14 @@ class SessionBase:
                 csv_bathy_preproc['GPSPitch'] *= -1
                 csv_bathy_preproc['GPSTrack'] = (csv_bathy_preproc['GPSTrack'] + 180) % 360
 
-            csv_exiftool_frames['XMP:GPSRoll'] = np.interp(csv_exiftool_frames['datetime_unix'], csv_bathy_preproc['datetime_unix'], csv_bathy_preproc['GPSRoll'])
-            csv_exiftool_frames['XMP:GPSPitch'] = np.interp(csv_exiftool_frames['datetime_unix'], csv_bathy_preproc['datetime_unix'], csv_bathy_preproc['GPSPitch'])
-            csv_exiftool_frames['XMP:GPSTrack'] = np.interp(csv_exiftool_frames['datetime_unix'], csv_bathy_preproc['datetime_unix'], csv_bathy_preproc['GPSTrack'])
-            csv_exiftool_frames['GPSAltitude'] = np.interp(csv_exiftool_frames['datetime_unix'], csv_bathy_preproc['datetime_unix'], csv_bathy_preproc['GPSAltitude'])
+            # GPSTrack is a heading, interpolated along the shortest arc to not cross 180 between 359 and 1.
+            bathy_values = TimeInterpolator(csv_exiftool_frames['datetime_unix'], csv_bathy_preproc['datetime_unix']).interp_columns(csv_bathy_preproc, {
+                'GPSRoll': 'linear', 'GPSPitch': 'linear', 'GPSTrack': 'circular', 'GPSAltitude': 'linear'
+            })
+            csv_exiftool_frames['XMP:GPSRoll'] = bathy_values['GPSRoll']
+            csv_exiftool_frames['XMP:GPSPitch'] = bathy_values['GPSPitch']
+            csv_exiftool_frames['XMP:GPSTrack'] = bathy_values['GPSTrack']
+            csv_exiftool_frames['GPSAltitude'] = bathy_values['GPSAltitude']
             
             # set altitude below sea level
             csv_exiftool_frames['GPSAltitudeRef'] = "Below Sea Level"
@@ -372,10 +603,9 @@ class SessionBase:
 
         # Only write metadata for frames split by the code else conserve the exif of original images.
         if self.image_manager.dcim_type == DCIMType.VIDEO:
-            texec = datetime.now()
-            with exiftool.ExifTool(common_args=[], config_file=str(cm.get_exiftool_metadata_path())) as et:
+            with PerfBlock("exiftool_write_frames_metadata", self.metadata_csv_path) as block, exiftool.ExifTool(common_args=[], config_file=str(cm.get_exiftool_metadata_path())) as et:
                 et.execute("-csv="+str(self.metadata_csv_path)," -fileorder filename", str(self.image_manager.frame_path), "-overwrite_original")
-            print("Writing metadata execution time: ", datetime.now() - texec)
+                block.set_output(self.image_manager.frame_path)
 
         # once we have imported all metadata, remove useless columns from metadata csv and rename GPS columns
         col_names = csv_exiftool_frames.columns
@@ -419,4 +649,9 @@ class SessionBase:
         # sort metadata columns by name
         csv_exiftool_frames = csv_exiftool_frames.sort_index(axis=1)
         # save filtered frame csv, after import metadata
-        csv_exiftool_frames.to_csv(self.metadata_csv_path, index=False)
\ No newline at end of file
+        csv_exiftool_frames.to_csv(self.metadata_csv_path, index=False)
+
+        # Frames are listed after the stage, they have been renamed, filtered and tagged.
+        self.save_stage_manifest("tags_frames", self.get_tags_files(), tags_config, {
+            "session_info": self.get_new_session_info_values(session_info_before)
+        }, with_hash=False)
\ No newline at end of file
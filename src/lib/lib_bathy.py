@@ -1,74 +1,75 @@
+import os
 import csv
-import time
 import pyproj
-import shutil
-import subprocess
 import numpy as np
 import pandas as pd
 from pathlib import Path
-import transforms3d as t3d
-from datetime import datetime
 import matplotlib.pyplot as plt
 
-from scipy.spatial import KDTree
-from scipy.interpolate import interp1d, LinearNDInterpolator, griddata
+from scipy.ndimage import binary_dilation, distance_transform_edt
+from scipy.spatial import KDTree, cKDTree, Delaunay
+from concurrent.futures import ThreadPoolExecutor
+from scipy.interpolate import interp1d, griddata, LinearNDInterpolator, NearestNDInterpolator, CloughTocher2DInterpolator
+from scipy.spatial.transform import Rotation, Slerp
 
-from .lib_tools import convert_GMS_GWk_to_UTC_time
+from .lib_tools import read_llh_txt
+from .lib_timebase import gps_week_ms_to_ns, TimeInterpolator
+from .lib_perf import perf_record
+from .lib_manifest import load_stage_manifest, write_stage_manifest, is_stage_up_to_date
+from .lib_log_cache import load_dataflash_bin, load_log_cache, save_log_cache, get_log_cache_path
+from .lib_dataflash import parse_dataflash_log
+from .lib_geoid import get_geoid_interpolator
 
 from ..ConfigManager import ConfigManager
 
-def count_null_values_in_file(log_path: Path) -> int:
-    with open(log_path, 'rb') as f:
-        data = f.read()
-        nullcnt = data.count( b'\x00' )
-        print('... found', nullcnt, ' NULL bytes')
-    return nullcnt
+NULL_BYTE_CHUNK_SIZE = 16 * 1024 * 1024 # 16 Mo
+GRID_TILE_SIZE = 512 # Cells on each side of a gridding tile.
 
 
 def clean_nullbyte_raw_log(log_path: Path) -> None:
+    """
+        Remove NULL bytes of the log in a single streaming pass.
+        Original log is kept as .bkp only if it had NULL bytes. Clean logs are recorded to not be scanned again.
+    """
+
+    record_path = Path(get_log_cache_path(log_path), "clean.json")
+    record = load_stage_manifest(record_path)
+    if is_stage_up_to_date(record, [log_path], log_path.parent, {}, [], with_hash=False):
+        print('... already clean')
+        return
 
-    shutil.copy(log_path, Path(log_path.parent, f"{log_path.name}.bkp"))
     tmp_log_path = Path(log_path.parent, f"{log_path.name}.tmp")
+    nullcnt, of = 0, None
+    with open(log_path, 'rb') as f:
+        while chunk := f.read(NULL_BYTE_CHUNK_SIZE):
+            chunk_nullcnt = chunk.count(b'\x00')
 
+            # First NULL byte found, copy what was already read in the clean file.
+            if chunk_nullcnt and of is None:
+                of = open(tmp_log_path, 'wb')
+                with open(log_path, 'rb') as f_prefix:
+                    remaining = f.tell() - len(chunk)
+                    while remaining:
+                        remaining -= of.write(f_prefix.read(min(remaining, NULL_BYTE_CHUNK_SIZE)))
 
-    nullcnt = count_null_values_in_file(log_path)
-    if not nullcnt: return
-    
-    with open(log_path, 'rb') as f:
-        print('... parsing')
-        data = f.readlines()
-        
-        with open(tmp_log_path, 'w') as of:
-            print('... cleaning')
-            for line in data:
-                strline = line.decode("utf-8")[:-1]
-                of.write(strline.replace('\x00', ''))
-        
-    nullcnt = count_null_values_in_file(tmp_log_path)
-        
-    shutil.move(tmp_log_path, log_path)
+            if of is not None:
+                of.write(chunk.replace(b'\x00', b'') if chunk_nullcnt else chunk)
+            nullcnt += chunk_nullcnt
 
+    print('... found', nullcnt, ' NULL bytes')
+    if of is not None:
+        of.close()
+        log_path.replace(Path(log_path.parent, f"{log_path.name}.bkp"))
+        tmp_log_path.replace(log_path)
 
-def parse_raw_log(log_path: Path, cfg_parse: dict) -> dict:
-    # time func execution
-    texec = datetime.now()
-    
-    print('Cleaning raw log ...')
-    clean_nullbyte_raw_log(log_path)
-    
-    # Status list (fixed)
-    # DEBUG !!! (MJULIEN --> Suppres MSG from parsed lines, causes bug on some log files)
-    # status_list=['MODE','ARM']
-    status_list=['MODE', 'ARM', 'MSG', 'CMD']
-    
-    # Read mandatory params from config dict
-    param_list=[
-        cfg_parse['gpskey'] , # mandatory
-        cfg_parse['attkey'] , # mandatory
-        cfg_parse['dpthkey'], # mandatory
-    ]
-    # Read optional params from config dict. Strip and split string in case of multiple params
-    param_list.extend(cfg_parse['optkey'].strip().split(','))
+    try:
+        write_stage_manifest(record_path, [log_path], log_path.parent, {}, {"null_bytes_removed": nullcnt}, record, with_hash=False)
+    except OSError as e:
+        print(f"[WARNING] Cannot record clean log {record_path}: {e}")
+
+
+def parse_raw_log_with_csv_reader(log_path: Path, param_list: list, status_list: list) -> dict:
+    """ Line by line parser, kept as reference for the split engine. """
     
     # init buffers
     datadict, headdict, dfdict = {}, {}, {}
@@ -78,8 +79,6 @@ def parse_raw_log(log_path: Path, cfg_parse: dict) -> dict:
         headdict[param] = []
         dfdict[param]   = []
     
-    #Parsing the log file
-    print('func: parsing log for keys:')
     with open(log_path) as file:
         parsed=csv.reader(file,delimiter=',')
         for line in parsed:
@@ -107,15 +106,45 @@ def parse_raw_log(log_path: Path, cfg_parse: dict) -> dict:
     for param in status_list:
         dfdict[param] = pd.DataFrame(datadict[param],columns=headdict[param][0])
 
-    # time func execution
-    print('func: exec time --> ',datetime.now() - texec)
-    
     return dfdict
 
-def parse_raw_bin(log_path: Path, cfg_parse: dict) -> dict:
-    # time func execution
-    texec = datetime.now()
+
+@perf_record(inputs=lambda log_path, *args, **kwargs: log_path)
+def parse_raw_log(log_path: Path, cfg_parse: dict, engine: str = "split") -> dict:
+    # Status list (fixed)
+    # DEBUG !!! (MJULIEN --> Suppres MSG from parsed lines, causes bug on some log files)
+    # status_list=['MODE','ARM']
+    status_list=['MODE', 'ARM', 'MSG', 'CMD']
+    
+    # Read mandatory params from config dict
+    param_list=[
+        cfg_parse['gpskey'] , # mandatory
+        cfg_parse['attkey'] , # mandatory
+        cfg_parse['dpthkey'], # mandatory
+    ]
+    # Read optional params from config dict. Strip and split string in case of multiple params
+    param_list.extend(cfg_parse['optkey'].strip().split(','))
+
+    # Cache is saved after cleaning, a cleaned log is not cleaned again.
+    dfdict = load_log_cache(log_path, [*param_list, *status_list])
+    if dfdict != None: return dfdict
+
+    print('Cleaning raw log ...')
+    clean_nullbyte_raw_log(log_path)
     
+    #Parsing the log file
+    print('func: parsing log for keys:')
+    # split engine reads the file once and parses each message type at once with pandas. csv engine parses line by line.
+    if engine == "split":
+        dfdict = parse_dataflash_log(log_path, param_list, status_list)
+    else:
+        dfdict = parse_raw_log_with_csv_reader(log_path, param_list, status_list)
+
+    save_log_cache(log_path, dfdict)
+    return dfdict
+
+@perf_record(inputs=lambda log_path, *args, **kwargs: log_path)
+def parse_raw_bin(log_path: Path, cfg_parse: dict, engine: str = "mmap") -> dict:
     # Status list (fixed)
     status_list=['MODE', 'ARM', 'MSG', 'CMD']
     
@@ -131,69 +160,43 @@ def parse_raw_bin(log_path: Path, cfg_parse: dict) -> dict:
     if len(opt) > 0 and opt[0] != '':
         param_list.extend(opt)
     
-    dfdict = {}
-    
-    #Parsing the bin file
+    #Parsing the bin file, all keys are decoded in a single pass.
     print('func: parsing log for keys:')
     print(param_list,status_list)
     
+    dfdict = load_dataflash_bin(log_path, [*param_list, *status_list], engine)
     for p in [*param_list, *status_list]:
         print('Reading data for entry:',p)
-
-        filepath = Path("/tmp", f'tmp_{int(time.time())}.csv')
-        filebuf = open(filepath, "w")
-        
-        tmp_cmd = ["python", "./src/lib/mavlogdump.py", "--planner", "--format", "csv", "--type", p, log_path]
-        with subprocess.Popen(tmp_cmd, stdout=filebuf, universal_newlines=True) as popen:
-            popen.wait() # Wait because sometimes Python is too fast.
-
-        filebuf.close()
-
-        dfdict[p] = pd.read_csv(filepath, sep=";")
-        filepath.unlink()
-        
         print('found',len(dfdict[p]),'points')
         
-    # time func execution
-    print('func: exec time --> ', datetime.now() - texec)
-
     return dfdict
 
+@perf_record()
 def build_dataframe_gps(dfdict_dump_mavlog: dict, cm: ConfigManager, navigation_filepath: Path) -> tuple[pd.DataFrame, list]:
-    # time func execution
-    texec = datetime.now()
-    
     df = dfdict_dump_mavlog[cm.get_parse_key_gps()].copy()
     print('func: initial dataframe has',len(df),'points')
 
+    # convert GMS time to unix time in ns. It is the time of GPS, bathy points and frames until export.
+    df['datetime_unix'] = gps_week_ms_to_ns(df.GWk, df.GMS)
+
     # use LLH position instead of the LOG/BIN one
     if cm.use_llh_position():
-        # convert GMS time to UTC time in order to have a friendly date and time
-        gpstime = [convert_GMS_GWk_to_UTC_time(df.GWk.values[i],df.GMS.values[i]) for i in range(len(df))]
-        df['GPS_time'] = gpstime
-        # convert GPS_time to new unix column in order to do interpolation on LLH date and time
-        df['GPS_time'] = pd.to_datetime(df['GPS_time'])
-        df['datetime_unix'] = df['GPS_time'].values.astype('int64')
-
-        # import LLH
-        csv_llh = pd.read_csv(navigation_filepath)
-        # import LLH file and match different date and time from LLH and BIN/LOG
-        csv_llh["GPS_time"] = csv_llh['GPSDateStamp'] +" "+ csv_llh["GPSTimeStamp"]
-        csv_llh["GPS_time"] = csv_llh["GPS_time"].str.replace("/", "-")
-        # convert GPS_time to new unix column in order to do interpolation
-        csv_llh['GPS_time'] = pd.to_datetime(csv_llh['GPS_time'])
-        csv_llh['datetime_unix'] = csv_llh['GPS_time'].values.astype('int64')
+        # import LLH file with unix time in ns to match date and time from LLH and BIN/LOG
+        csv_llh = read_llh_txt(navigation_filepath)
 
 
         # interpolate BIN/LOG positions on LLH more precise positions
-        df['Lat'] = np.interp(df['datetime_unix'], csv_llh['datetime_unix'], csv_llh['GPSLatitude'])
+        llh_values = TimeInterpolator(df['datetime_unix'], csv_llh['datetime_unix']).interp_columns(csv_llh, {
+            'GPSLatitude': 'linear', 'GPSLongitude': 'linear', 'elevation': 'linear', 'fix': 'linear'
+        })
+        df['Lat'] = llh_values['GPSLatitude']
         # DEBUG !!! (MJULIEN --> Error here, columns names for longitude is not 'Lon' but 'Lng')
         #df['Lon'] = np.interp(df['datetime_unix'], csv_llh['datetime_unix'], csv_llh['GPSLongitude'])
-        df['Lng'] = np.interp(df['datetime_unix'], csv_llh['datetime_unix'], csv_llh['GPSLongitude'])
+        df['Lng'] = llh_values['GPSLongitude']
         # DEBUG !!! (MJULIEN --> Add of PPK corrected values for altitude too !)
-        df['Alt'] = np.interp(df['datetime_unix'], csv_llh['datetime_unix'], csv_llh['elevation'])
+        df['Alt'] = llh_values['elevation']
         # change Status in BIN/LOG dataframe according to LLH "fix" column
-        df['Status'] = np.interp(df['datetime_unix'], csv_llh['datetime_unix'], csv_llh['fix'])
+        df['Status'] = llh_values['fix']
         df['Status'] = df['Status'].astype(int)
 
 
@@ -239,8 +242,6 @@ def build_dataframe_gps(dfdict_dump_mavlog: dict, cm: ConfigManager, navigation_
     # Filter data according to filter_after_waypoints
     filt_exclude_specific_datetimeUnix = []
     if len(cm.get_filt_exclude_specific_timeUS()) != 0:
-        timestamp_key = "datetime_unix" if "datetime_unix" in df else "timestamp"
-        factor_to_nanosaconds = 1.0 if "datetime_unix" in df else 1e9
         for t_start, t_stop in cm.get_filt_exclude_specific_timeUS():
             if t_start > t_stop:
                 print(f"/!\\ t_start ({t_start}) > t_stop ({t_stop}) : Aborting filter on this interval/!\\")
@@ -249,8 +250,8 @@ def build_dataframe_gps(dfdict_dump_mavlog: dict, cm: ConfigManager, navigation_
             dfa = df[df.TimeUS < t_start]
             dfb = df[df.TimeUS > t_stop]
 
-            v1 = int((dfa[timestamp_key].iloc[-1] if len(dfa[timestamp_key]) else df[timestamp_key].iloc[0]) * factor_to_nanosaconds)
-            v2 = int((dfb[timestamp_key].iloc[0] if len(dfb[timestamp_key]) else df[timestamp_key].iloc[-1]) * factor_to_nanosaconds)
+            v1 = int(dfa['datetime_unix'].iloc[-1] if len(dfa) else df['datetime_unix'].iloc[0])
+            v2 = int(dfb['datetime_unix'].iloc[0] if len(dfb) else df['datetime_unix'].iloc[-1])
 
             df = pd.concat([dfa, dfb])
 
@@ -270,33 +271,38 @@ def build_dataframe_gps(dfdict_dump_mavlog: dict, cm: ConfigManager, navigation_
     df['Y_utm'] = utm_y
     
 
-    gpstime = [convert_GMS_GWk_to_UTC_time(df.GWk.values[i],df.GMS.values[i]) for i in range(len(df))]
-    df['GPS_time'] = gpstime
+    df['GPS_time'] = pd.to_datetime(df['datetime_unix'])
 
-    # time func execution
-    print('func: exec time --> ', datetime.now() - texec)
-    
     return df, filt_exclude_specific_datetimeUnix
 
-def calc_att_at_gps_coord(df_bathy: pd.DataFrame, df_att: pd.DataFrame, att_max_angle: int) -> pd.DataFrame:
-    # time func execution
-    texec = datetime.now()
-    
-    print('func: bathy > build interpolator with ATT data')
-    # Building linear interpolator for altitude (from IDOcean sources)
-    # arr_att is a np aray with TimeUS, Roll, Pitch, Yaw as columns
-    arr_att = df_att[['TimeUS','Roll','Pitch','Yaw']].to_numpy(dtype='float32')
-    attitude_itp = interp1d(arr_att[:,0],np.rad2deg(np.unwrap(np.deg2rad(arr_att[:,1::]),axis=0)),axis=0,fill_value='extrapolate')
-    
+def interp_att_slerp(arr_att: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """ Interpolate roll, pitch, yaw with quaternion slerp. Yaw is in [0, 360[ without unwrap. """
+    # Slerp needs strictly increasing times. Attitude is held outside the log instead of extrapolated.
+    att_times, att_indices = np.unique(arr_att[:, 0], return_index=True)
+    rotations = Rotation.from_euler('ZYX', arr_att[att_indices][:, [3, 2, 1]], degrees=True) # ArduPilot attitude is yaw, pitch, roll.
+    if len(att_times) == 1:
+        return np.repeat(rotations.as_euler('ZYX', degrees=True)[:, ::-1], len(times), axis=0)
+
+    attitude_slerp = Slerp(att_times, rotations)
+    yaw_pitch_roll = attitude_slerp(np.clip(times, att_times[0], att_times[-1])).as_euler('ZYX', degrees=True)
+    return np.column_stack((yaw_pitch_roll[:, 2], yaw_pitch_roll[:, 1], np.mod(yaw_pitch_roll[:, 0], 360)))
+
+@perf_record()
+def calc_att_at_gps_coord(df_bathy: pd.DataFrame, df_att: pd.DataFrame, att_max_angle: int, att_interp: str = "linear") -> pd.DataFrame:
+    print(f'func: bathy > build {att_interp} interpolator with ATT data')
+    times = df_bathy.TimeUS.to_numpy(dtype=np.float64)
+    if att_interp == "slerp":
+        attestim = interp_att_slerp(df_att[['TimeUS','Roll','Pitch','Yaw']].to_numpy(dtype=np.float64), times)
+    else:
+        # Building linear interpolator for altitude (from IDOcean sources)
+        # arr_att is a np aray with TimeUS, Roll, Pitch, Yaw as columns
+        arr_att = df_att[['TimeUS','Roll','Pitch','Yaw']].to_numpy(dtype='float32')
+        attitude_itp = interp1d(arr_att[:,0],np.rad2deg(np.unwrap(np.deg2rad(arr_att[:,1::]),axis=0)),axis=0,fill_value='extrapolate')
+        attestim = attitude_itp(times)
+
     print('func: bathy > Estimate attitude at gps position')
-    
-    nbpt = len(df_bathy.TimeUS)
-    attestim = np.ones((nbpt,3))
-    attestim_center = np.ones((nbpt,3))
-    for i in range(0,nbpt):
-        t = df_bathy.TimeUS.values[i]
-        attestim[i] = attitude_itp(t)
-        attestim_center[i] = np.mod(attestim[i] + np.array([180, 180, 0]), 360) - np.array([180, 180, 0])  # Putting roll/pitch in [-180,180] and yaw in [0,360]
+
+    attestim_center = np.mod(attestim + np.array([180, 180, 0]), 360) - np.array([180, 180, 0])  # Putting roll/pitch in [-180,180] and yaw in [0,360]
     
     df_bathy['Roll']  = attestim[:,0]
     df_bathy['Pitch'] = attestim[:,1]
@@ -312,23 +318,12 @@ def calc_att_at_gps_coord(df_bathy: pd.DataFrame, df_att: pd.DataFrame, att_max_
     print('func: bathy > att max angle (deg) :')
     print(att_max_angle , ' --> att index = max(picth,roll)/att_max_angle ')
     
-    nbpt = len(df_bathy.TimeUS)
-    attind = np.ones((nbpt, 1))
-    for i in range(0, nbpt):
-        curr_angle = np.max([np.abs(df_bathy.Roll_center.values[i]),
-                             np.abs(df_bathy.Pitch_center.values[i])])
-    
-        attind[i] = curr_angle / att_max_angle
-    
-    df_bathy['Att_index'] = attind[:, 0]
+    df_bathy['Att_index'] = np.maximum(np.abs(attestim_center[:,0]), np.abs(attestim_center[:,1])) / att_max_angle
     
     print('func: bathy > Remove points with attitude index > 1')
     
     df_bathy = df_bathy[df_bathy.Att_index < 1]
     
-    # time func execution
-    print('func: exec time --> ', datetime.now() - texec)
-    
     return df_bathy
 
 # Building median filter for depth (from IDOcean)
@@ -341,15 +336,54 @@ def depth_med(depth_array, time_tree, time, radius, valid_prop, depth_range):
     else:  # Otherwise compute median of valid depths
         return (np.median(values[inliers]))
 
+DEPTH_MEDIAN_CHUNK_SIZE = 4_000_000 # Max number of window values sorted at once.
+
+def depth_med_window(depth_array: np.ndarray, times: np.ndarray, radius: float, valid_prop: float, depth_range: list) -> np.ndarray:
+    """ Same filter as depth_med for all times at once. Windows bounds come from searchsorted on sorted depth times. """
+    order = np.argsort(depth_array[:, 0], kind="stable")
+    dpth_time = depth_array[order, 0].astype(np.float64)
+    dpth_value = depth_array[order, 1]
+    times = np.asarray(times, dtype=np.float64)
+
+    # query_ball_point keeps values at distance <= radius.
+    start = np.searchsorted(dpth_time, times - radius, side="left")
+    end = np.searchsorted(dpth_time, times + radius, side="right")
+    nb_values = end - start
+
+    inliers = np.logical_and(dpth_value > depth_range[0], dpth_value < depth_range[1])  # Valid depth values
+    inliers_cumsum = np.concatenate(([0], np.cumsum(inliers)))
+    nb_inliers = inliers_cumsum[end] - inliers_cumsum[start]
+
+    # Removing point (value -1) if not enough depth values are valid
+    dpthestim = np.full(len(times), -1, dtype=np.float64)
+    valid = np.flatnonzero(nb_inliers > valid_prop * nb_values)
+    if len(valid) == 0: return dpthestim
+
+    # Otherwise compute median of valid depths. Windows are padded to the largest one, outliers and padding are sorted at the end.
+    width = int(nb_values[valid].max())
+    offsets = np.arange(width)
+    padded_value = np.where(inliers, dpth_value, np.inf).astype(dpth_value.dtype)
+    chunk_size = max(1, DEPTH_MEDIAN_CHUNK_SIZE // width)
+    for i in range(0, len(valid), chunk_size):
+        rows = valid[i:i+chunk_size]
+        indices = start[rows, None] + offsets
+        window = np.where(offsets < nb_values[rows, None], padded_value[np.minimum(indices, len(dpth_value) - 1)], np.inf)
+        window.sort(axis=1)
+
+        k = nb_inliers[rows]
+        r = np.arange(len(rows))
+        dpthestim[rows] = (window[r, (k - 1) // 2] + window[r, k // 2]) / 2
+
+    return dpthestim
+
+@perf_record()
 def calc_raw_depth_at_gps_coord(df_bathy: pd.DataFrame, df_dpth: pd.DataFrame, cm: ConfigManager) -> pd.DataFrame:
-    # time func execution
-    texec = datetime.now()
-
     dpth_med_time_win_us = cm.get_bathy_dpth_win_s() * 1e6
     dpth_med_lim_m = [cm.get_bathy_depth_min(), cm.get_bathy_depth_max()]
     dpth_med_valid_prop = cm.get_bathy_dpth_valid_prop()
+    dpth_engine = cm.get_bathy_dpth_engine()
 
-    print('func: bathy > Build kd-tree filter for depth computation')
+    print(f'func: bathy > Build {dpth_engine} filter for depth computation')
     # arr_att is a np aray with TimeUS, Roll, Pitch, Yaw as columns
     
     # WARNING : old plancha log depth as DPTH key and column is Depth
@@ -364,20 +398,27 @@ def calc_raw_depth_at_gps_coord(df_bathy: pd.DataFrame, df_dpth: pd.DataFrame, c
     if sum(arr_dpth[:, 1]) == 0:
         raise NameError("/!\\ ECHO sonder doesn't launch /!\\")
 
-    # build time tree for kd median filter    
-    time_tree=KDTree(arr_dpth[:,0,None])
-    
     print('func: bathy > Median filter param : time win (s) , dpth range (m), valid prop')
     print(dpth_med_time_win_us*1e-6, dpth_med_lim_m, dpth_med_valid_prop )
 
-    nbpt = len(df_bathy.TimeUS)
-    dpthestim = np.ones((nbpt,1))
-    for i in range(0,nbpt):
-        t = df_bathy.TimeUS.values[i]
-        dpthestim[i]=depth_med(arr_dpth,time_tree,t,
-                               dpth_med_time_win_us,
-                               dpth_med_valid_prop,
-                               dpth_med_lim_m)
+    # window engine computes all windows at once, kdtree engine queries a time tree point by point.
+    if dpth_engine == "window":
+        dpthestim = depth_med_window(arr_dpth, df_bathy.TimeUS.values,
+                                     dpth_med_time_win_us,
+                                     dpth_med_valid_prop,
+                                     dpth_med_lim_m)[:,None]
+    else:
+        # build time tree for kd median filter    
+        time_tree=KDTree(arr_dpth[:,0,None])
+
+        nbpt = len(df_bathy.TimeUS)
+        dpthestim = np.ones((nbpt,1))
+        for i in range(0,nbpt):
+            t = df_bathy.TimeUS.values[i]
+            dpthestim[i]=depth_med(arr_dpth,time_tree,t,
+                                   dpth_med_time_win_us,
+                                   dpth_med_valid_prop,
+                                   dpth_med_lim_m)
         
     df_bathy['Depth']  = -dpthestim[:,0]
     
@@ -385,86 +426,66 @@ def calc_raw_depth_at_gps_coord(df_bathy: pd.DataFrame, df_dpth: pd.DataFrame, c
 
     df_bathy = df_bathy[df_bathy.Depth != 1]
     
-    # time func execution
-    print('func: exec time --> ', datetime.now() - texec)
-    
     return df_bathy
 
-def build_geoid_interpolator_from_csv(cm: ConfigManager):
-    dfgeoid = pd.read_csv(cm.get_geoid_path())
-    # clean geoid file
-    dfgeoid = dfgeoid[dfgeoid.alt < 1000.0]
-    dfgeoid = dfgeoid[dfgeoid.alt > -1000.0]
-    # Convert lat to utm
-    wgs2utm = pyproj.Proj(proj='utm', zone=cm.get_utm_zone(), ellps=cm.get_utm_ellips(),south=cm.get_utm_south())
-    x, y = wgs2utm(np.array(dfgeoid.lng),np.array(dfgeoid.lat),inverse=False)
-    # compute scipy ND interpolator
-    xy = np.array((x,y)).T
-    z = np.array(dfgeoid['alt'])
-    geoid_itp = LinearNDInterpolator(xy,z)
-    return geoid_itp
+def euler2mat_sxyz(ai: np.ndarray, aj: np.ndarray, ak: np.ndarray) -> np.ndarray:
+    """ Batched t3d.euler.euler2mat(ai, aj, ak, axes='sxyz'). Return an (N, 3, 3) array of rotation matrices. """
+    si, sj, sk = np.sin(ai), np.sin(aj), np.sin(ak)
+    ci, cj, ck = np.cos(ai), np.cos(aj), np.cos(ak)
+    cc, cs = ci*ck, ci*sk
+    sc, ss = si*ck, si*sk
 
+    return np.stack([
+        np.stack([cj*ck, sj*sc-cs, sj*cc+ss], axis=-1),
+        np.stack([cj*sk, sj*ss+cc, sj*cs-sc], axis=-1),
+        np.stack([-sj,   cj*si,    cj*ci],    axis=-1),
+    ], axis=-2)
+
+@perf_record()
 def calc_ign_depth_at_gps_coord(df_bathy: pd.DataFrame, cm: ConfigManager) -> pd.DataFrame:
-    # time func execution
-    texec = datetime.now()
-    
-    utm_x_corr_list, utm_y_corr_list = [], []
-    depth_ign_list, geoid_alt_list = [], []
     
     print('func: bathy > Computing pos and depth correction')
     
     if cm.use_geoid():
         print('func: bathy > Will compensate depth with gps alt and geoid grid')
-        geoid_itp = build_geoid_interpolator_from_csv(cm)
+        geoid_itp = get_geoid_interpolator(cm.get_geoid_path(), cm.get_utm_zone(), cm.get_utm_south(), cm.get_utm_ellips())
     else:
         print('func: bathy > [warning] Depth not compensated with geoid and gps alt')
     
-    for ind, row in df_bathy.iterrows():
+    depthcorr = cm.get_dpth_coeff() * df_bathy.Depth.to_numpy(dtype=np.float64)
+    
+    # Vectors that go from the gps to the detected points on the ground
+    vect_gps2pt = np.zeros((len(df_bathy), 3))
+    vect_gps2pt[:, 0] = cm.get_off_ant_beam_x()
+    vect_gps2pt[:, 1] = cm.get_off_ant_beam_y()
+    vect_gps2pt[:, 2] = cm.get_off_ant_beam_z() + depthcorr
+    
+    # Rotating the vectors according to attitude to get their coordinates in a global coordinate sytem
+    # with X facing North and Y facing West
+    rollrad  = np.deg2rad(df_bathy.Roll.to_numpy(dtype=np.float64))
+    pitchrad = np.deg2rad(df_bathy.Pitch.to_numpy(dtype=np.float64))
+    yawrad   = np.deg2rad(df_bathy.Yaw.to_numpy(dtype=np.float64))
+    rot_vect_gps2pt = np.einsum('nij,nj->ni', euler2mat_sxyz(-rollrad, -pitchrad, -yawrad), vect_gps2pt)
+    
+    # Correcting the positions using rotated vectors
+    utm_x_corr = df_bathy.X_utm.to_numpy(dtype=np.float64) - rot_vect_gps2pt[:, 1]
+    utm_y_corr = df_bathy.Y_utm.to_numpy(dtype=np.float64) + rot_vect_gps2pt[:, 0]
+    
+    #! FIXME rot_vect_gps2pt est l'altitude de la planche. Si on est pas en ppk ni en rtk, il ne faut pas utiliser cette valeur car elle est abérante
+    if cm.use_geoid() and len(df_bathy):
+        # Computing geoid altitude at all corrected positions at once
+        geoid_alt = geoid_itp(np.column_stack((utm_x_corr, utm_y_corr)))
+    else:
+        # setting geoid altitude to zero, still including GPS altitude (var "hauteur")
+        geoid_alt = np.zeros(len(df_bathy), dtype=np.int64)
     
-        depthcorr = cm.get_dpth_coeff() * row.Depth
-        
-        # Vector that goes from the gps to the detected point on the ground
-        vect_gps2pt=[cm.get_off_ant_beam_x(),
-                     cm.get_off_ant_beam_y(),
-                     cm.get_off_ant_beam_z()+depthcorr]
-        
-        # Rotating the vector according to attitude to get its coordinates in a global coordinate sytem
-        # with X facing North and Y facing West
-        rollrad  = np.deg2rad(row.Roll)
-        pitchrad = np.deg2rad(row.Pitch)
-        yawrad   = np.deg2rad(row.Yaw)
-        rot_vect_gps2pt = np.dot(t3d.euler.euler2mat(-rollrad,-pitchrad,-yawrad,axes='sxyz'),vect_gps2pt)
-        
-        hauteur = row.Alt
-        utm_x   = row.X_utm
-        utm_y   = row.Y_utm
-        
-        # Correcting the position using rotated vector
-        utm_x_corr = utm_x - rot_vect_gps2pt[1]
-        utm_y_corr = utm_y + rot_vect_gps2pt[0]
-        
-        #! FIXME rot_vect_gps2pt est l'altitude de la planche. Si on est pas en ppk ni en rtk, il ne faut pas utiliser cette valeur car elle est abérante
-        if cm.use_geoid():
-            # Computing geoid altitude at corrected position
-            geoid_alt = geoid_itp([utm_x_corr,utm_y_corr])[0]
-            #print([utm_x_corr,utm_y_corr],geoid_alt)
-            #Calcutating ign depth using rotated vector and geoid altitude
-            depth_ign = hauteur+rot_vect_gps2pt[2]-geoid_alt
-        else:
-            # setting geoid altitude to zero, still including GPS altitude (var "hauteur")
-            geoid_alt = 0 
-            #Calcutating ign depth using rotated vector and geoid altitude
-            depth_ign = hauteur+rot_vect_gps2pt[2]-geoid_alt
-        
-        utm_x_corr_list.append(utm_x_corr)
-        utm_y_corr_list.append(utm_y_corr)
-        depth_ign_list.append(depth_ign)
-        geoid_alt_list.append(geoid_alt)
+    #Calcutating ign depth using rotated vector and geoid altitude
+    depth_ign = df_bathy.Alt.to_numpy(dtype=np.float64) + rot_vect_gps2pt[:, 2] - geoid_alt
     
-    df_bathy['X_utm_corr'] = utm_x_corr_list
-    df_bathy['Y_utm_corr'] = utm_y_corr_list
-    df_bathy['Depth_corr'] = depth_ign_list
-    df_bathy['Geoid_alt']  = geoid_alt_list
+    df_bathy['X_utm_corr'] = utm_x_corr
+    df_bathy['Y_utm_corr'] = utm_y_corr
+    df_bathy['Depth_corr'] = depth_ign
+    df_bathy['Geoid_alt']  = geoid_alt
     
     projzone = cm.get_utm_zone()
     projellps = cm.get_utm_ellips()
@@ -477,15 +498,157 @@ def calc_ign_depth_at_gps_coord(df_bathy: pd.DataFrame, cm: ConfigManager) -> pd
     df_bathy['Lat_corr'] = lat
     df_bathy['Lng_corr'] = lon
     
-    # time func execution
-    print('func: exec time --> ', datetime.now() - texec)
-    
     return df_bathy
 
-def gen_gridded_depth_data(df_bathy: pd.DataFrame, cm: ConfigManager) -> pd.DataFrame:
-    # time func execution
-    texec = datetime.now()
+@perf_record()
+def estimate_point_spacing(xyz: np.ndarray, sample_size: int, seed: int = 0) -> tuple[float, float, float]:
+    """
+        Mean and std of the nearest neighbour distance of bathy points, measured on a stratified sample along the track.
+        Return mean, std and half width of the 95% confidence interval of the mean. sample_size = 0 uses all points.
+    """
 
+    tree = cKDTree(xyz)
+    if sample_size <= 0 or sample_size >= len(xyz):
+        sample = np.arange(len(xyz))
+    else:
+        # One random point in each of sample_size consecutive slices of the track.
+        edges = np.linspace(0, len(xyz), sample_size + 1).astype(np.int64)
+        sample = edges[:-1] + np.random.default_rng(seed).integers(0, np.diff(edges))
+
+    # Nearest point is the point itself.
+    distance, _ = tree.query(xyz[sample], k=2)
+    distance = distance[:, 1]
+
+    avgdist, stddist = float(np.mean(distance)), float(np.std(distance))
+    return avgdist, stddist, float(1.96 * stddist / np.sqrt(len(sample)))
+
+def build_griddata_interpolator(points: np.ndarray, values: np.ndarray, method: str):
+    """ Interpolator used by scipy griddata, built once to be evaluated tile by tile. """
+    if method == "nearest":
+        return NearestNDInterpolator(points, values)
+
+    triangulation = Delaunay(points)
+    if method == "linear":
+        return LinearNDInterpolator(triangulation, values)
+    if method == "cubic":
+        return CloughTocher2DInterpolator(triangulation, values)
+    raise ValueError(f"Unknown mesh method {method}")
+
+def grid_depth_tiled(x: np.ndarray, y: np.ndarray, z: np.ndarray, xi: np.ndarray, yi: np.ndarray, spacing_m: float, method: str, 
+                     buffer_m: float, max_workers: int | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+        Interpolate depth on the cells of xi, yi axes which are closer than buffer_m to a cell holding a bathy point, tile by tile in parallel.
+        With buffer_m = 0, all cells are interpolated as griddata does.
+        Return x, y, depth of valid cells in the row-major order of np.meshgrid(xi, yi).
+    """
+
+    interpolator = build_griddata_interpolator(np.column_stack((x, y)), z, method)
+
+    # Cell of each bathy point.
+    point_rows = np.clip(np.rint((y - yi[0]) / spacing_m).astype(np.int64), 0, len(yi) - 1)
+    point_cols = np.clip(np.rint((x - xi[0]) / spacing_m).astype(np.int64), 0, len(xi) - 1)
+    margin = int(np.ceil(buffer_m / spacing_m))
+
+    # Tiles with a bathy point, grown by the buffer. Other tiles have no cell to interpolate.
+    nb_tiles_y, nb_tiles_x = int(np.ceil(len(yi) / GRID_TILE_SIZE)), int(np.ceil(len(xi) / GRID_TILE_SIZE))
+    margin_tiles = int(np.ceil(margin / GRID_TILE_SIZE))
+    tiles = np.ones((nb_tiles_y, nb_tiles_x), dtype=bool)
+    if buffer_m > 0:
+        tiles[:] = False
+        tiles[point_rows // GRID_TILE_SIZE, point_cols // GRID_TILE_SIZE] = True
+        tiles = binary_dilation(tiles, structure=np.ones((3, 3), dtype=bool), iterations=margin_tiles)
+
+    # Points bucketed by tile once, points of a tile are point_order[tile_start[tile]:tile_start[tile + 1]].
+    point_tiles = (point_rows // GRID_TILE_SIZE) * nb_tiles_x + point_cols // GRID_TILE_SIZE
+    point_order = np.argsort(point_tiles, kind="stable")
+    tile_start = np.searchsorted(point_tiles[point_order], np.arange(nb_tiles_y * nb_tiles_x + 1))
+
+    def get_window_points(tile_y: int, tile_x: int) -> np.ndarray:
+        """ Points of the tile and of the tiles of its margin. In a row of tiles, buckets of consecutive tiles are contiguous. """
+        tile_x0, tile_x1 = max(tile_x - margin_tiles, 0), min(tile_x + margin_tiles, nb_tiles_x - 1)
+        return np.concatenate([
+            point_order[tile_start[ty * nb_tiles_x + tile_x0]:tile_start[ty * nb_tiles_x + tile_x1 + 1]]
+            for ty in range(max(tile_y - margin_tiles, 0), min(tile_y + margin_tiles, nb_tiles_y - 1) + 1)
+        ])
+
+    def grid_tile(tile_y: int, tile_x: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        row0, row1 = tile_y * GRID_TILE_SIZE, min((tile_y + 1) * GRID_TILE_SIZE, len(yi))
+        col0, col1 = tile_x * GRID_TILE_SIZE, min((tile_x + 1) * GRID_TILE_SIZE, len(xi))
+        rows, cols = np.mgrid[row0:row1, col0:col1]
+
+        if buffer_m > 0:
+            # Distance to the nearest cell holding a bathy point, computed on the tile and its margin.
+            win_row0, win_col0 = max(row0 - margin, 0), max(col0 - margin, 0)
+            win_row1, win_col1 = min(row1 + margin, len(yi)), min(col1 + margin, len(xi))
+            window = get_window_points(tile_y, tile_x)
+            window_rows, window_cols = point_rows[window], point_cols[window]
+            inside = (window_rows >= win_row0) & (window_rows < win_row1) & (window_cols >= win_col0) & (window_cols < win_col1)
+            if not inside.any():
+                return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0), np.empty(0)
+
+            empty = np.ones((win_row1 - win_row0, win_col1 - win_col0), dtype=bool)
+            empty[window_rows[inside] - win_row0, window_cols[inside] - win_col0] = False
+            distance = distance_transform_edt(empty, sampling=spacing_m)[row0 - win_row0:row1 - win_row0, col0 - win_col0:col1 - win_col0]
+            near = distance <= buffer_m
+            rows, cols = rows[near], cols[near]
+
+        rows, cols = rows.ravel(), cols.ravel()
+        gx, gy = xi[cols], yi[rows]
+        gz = interpolator(gx, gy) if len(rows) else np.empty(0)
+        valid = np.logical_not(np.isnan(gz))
+        return rows[valid] * len(xi) + cols[valid], gx[valid], gy[valid], gz[valid]
+
+    tiles_y, tiles_x = np.nonzero(tiles)
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count(), thread_name_prefix="grid_tile") as executor:
+        results = list(executor.map(grid_tile, tiles_y, tiles_x))
+
+    if len(results) == 0:
+        return np.empty(0), np.empty(0), np.empty(0)
+
+    # Tiles are done in row-major order of tiles, a row of tiles is a contiguous band of grid rows.
+    # Cells are put back in row-major order of the grid band by band, each tile result is freed once sorted.
+    bands = []
+    for tile_y in np.unique(tiles_y):
+        band = np.flatnonzero(tiles_y == tile_y)
+        index, gx, gy, gz = [np.concatenate(values) for values in zip(*[results[i] for i in band])]
+        for i in band:
+            results[i] = None
+        order = np.argsort(index, kind="stable")
+        bands.append((gx[order], gy[order], gz[order]))
+    return tuple(np.concatenate(values) for values in zip(*bands))
+
+def grid_depth_binned(x: np.ndarray, y: np.ndarray, z: np.ndarray, x0: float, y0: float, spacing_m: float) -> dict:
+    """
+        Grid depth by binning: each point goes in the cell of its nearest node, then depth statistics of each cell.
+        Return x, y of nodes and Depth_mean, Depth_median, Depth_std, Depth_min, Depth_max, Count of non empty cells in row-major order.
+    """
+
+    cols = np.rint((x - x0) / spacing_m).astype(np.int64)
+    rows = np.rint((y - y0) / spacing_m).astype(np.int64)
+    index = rows * (cols.max() + 1) + cols
+
+    # Sort by cell then depth, each cell is a contiguous sorted group.
+    order = np.lexsort((z, index))
+    index, z = index[order], z[order]
+    starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    count = np.diff(np.r_[starts, len(index)])
+
+    mean = np.add.reduceat(z, starts) / count
+    variance = np.add.reduceat((z - np.repeat(mean, count)) ** 2, starts) / count
+
+    return {
+        "x": x0 + cols[order][starts] * spacing_m,
+        "y": y0 + rows[order][starts] * spacing_m,
+        "Depth_mean": mean,
+        "Depth_median": (z[starts + (count - 1) // 2] + z[starts + count // 2]) / 2,
+        "Depth_std": np.sqrt(variance),
+        "Depth_min": z[starts],
+        "Depth_max": z[starts + count - 1],
+        "Count": count
+    }
+
+@perf_record()
+def gen_gridded_depth_data(df_bathy: pd.DataFrame, cm: ConfigManager) -> pd.DataFrame:
     spacing_m = cm.get_mesh_spacing_m()
     
     utm_mesh_bounds = [np.min(df_bathy.X_utm_corr),np.max(df_bathy.X_utm_corr),
@@ -496,16 +659,27 @@ def gen_gridded_depth_data(df_bathy: pd.DataFrame, cm: ConfigManager) -> pd.Data
     
     xi = np.arange(utm_mesh_bounds[0],utm_mesh_bounds[1],spacing_m)
     yi = np.arange(utm_mesh_bounds[2],utm_mesh_bounds[3],spacing_m)
-    xi, yi = np.meshgrid(xi,yi)
     
     print('func: bathy > generate meshgrid (rw x col, lat/lon bounds) :')
-    print(len(xi),'x',len(xi.T),latlon_mesh_bounds)
+    print(len(yi),'x',len(xi),latlon_mesh_bounds)
     
     # interpolate
     x = np.array(df_bathy.X_utm_corr)
     y = np.array(df_bathy.Y_utm_corr)
     z = np.array(df_bathy.Depth_corr)
-    zi = griddata((x,y),z,(xi,yi),method = cm.get_mesh_method())
+
+    # binned method computes depth statistics of points in each cell, other methods interpolate the cells.
+    # tiled engine only interpolates cells near the track, full engine interpolates the whole bounding box.
+    stats = {}
+    if cm.get_mesh_method() == "binned":
+        stats = grid_depth_binned(x, y, z, utm_mesh_bounds[0], utm_mesh_bounds[2], spacing_m)
+        xi, yi, zi = stats.pop("x"), stats.pop("y"), stats["Depth_median"]
+    elif cm.get_mesh_grid_engine() == "tiled":
+        print(f'func: bathy > tiled gridding, cells closer than {cm.get_mesh_grid_buffer_m()} m to the track')
+        xi, yi, zi = grid_depth_tiled(x, y, z, xi, yi, spacing_m, cm.get_mesh_method(), cm.get_mesh_grid_buffer_m())
+    else:
+        xi, yi = np.meshgrid(xi,yi)
+        zi = griddata((x,y),z,(xi,yi),method = cm.get_mesh_method())
     
     # shape gridded data to vectors
     xi = xi.reshape(xi.size,1)
@@ -524,14 +698,13 @@ def gen_gridded_depth_data(df_bathy: pd.DataFrame, cm: ConfigManager) -> pd.Data
     df_gridded = pd.DataFrame(np.hstack((xi,yi,zi,lati,loni)),
                               columns=['X_utm_corr','Y_utm_corr','Depth_corr',
                                        'Lat_corr','Lng_corr'])
+    for key, values in stats.items():
+        df_gridded[key] = values
     
     # suppress values that are 'nan' and reset index
     df_gridded = df_gridded[np.logical_not(np.isnan(df_gridded.Depth_corr))]
     df_gridded = df_gridded.reset_index(drop=True)
     
-    # time func execution
-    print('func: exec time --> ',datetime.now() - texec)
-    
     return df_gridded
 
 def plot_basic_bathy_data_time(df_bathy: pd.DataFrame, bathy_path: Path, fname: str = '0') -> None:
@@ -583,7 +756,8 @@ def bathy_preproc_to_txt(bathy_preproc_path: Path) -> Path:
     # open bathy_preproc file 
     bathy_preproc_df = pd.read_csv(bathy_preproc_path)
     # Note exiftool : GPSPitch and GPSRoll are not standard tags, and must be user-defined.
-    bathy_preproc_df = bathy_preproc_df[['GPS_time', 'Lat', 'Lng', 'Depth', 'Roll', 'Pitch', 'Yaw']]
+    # datetime_unix is kept to not parse GPS_time back. Older bathy_preproc files don't have it.
+    bathy_preproc_df = bathy_preproc_df[[c for c in ['GPS_time', 'datetime_unix', 'Lat', 'Lng', 'Depth', 'Roll', 'Pitch', 'Yaw'] if c in bathy_preproc_df]]
     # rename columns
     # N.B. Yaw is stored in the XMP-exif:GPSTrack tag
     bathy_preproc_df.rename(columns={'Lat': 'GPSLatitude', 'Lng': 'GPSLongitude', 'Depth': 'GPSAltitude', 'Roll': 'GPSRoll', 'Pitch': 'GPSPitch', 'Yaw': 'GPSTrack'}, inplace=True)
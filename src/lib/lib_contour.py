@@ -0,0 +1,82 @@
+import pyproj
+import shapely
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from contourpy import contour_generator, LineType, FillType
+
+from .lib_perf import perf_record
+from .lib_raster import depth_grid_to_array
+
+CONTOUR_DEFAULT_NB_LINES = 10 # Used when no interval is given, as gdal_contour was called before.
+CONTOUR_MAX_NB_LINES = 1000 # Each level is a pass on the whole grid, a too small interval would never end.
+
+
+def get_contour_levels(zmin: float, zmax: float, interval_m: float) -> np.ndarray:
+    """ Multiples of interval_m inside [zmin, zmax], like gdal_contour -i. interval_m <= 0 gives CONTOUR_DEFAULT_NB_LINES lines. """
+    if interval_m <= 0:
+        interval_m = (zmax - zmin) / CONTOUR_DEFAULT_NB_LINES
+    if interval_m <= 0:
+        return np.empty(0)
+
+    nb_levels = int(np.floor(zmax / interval_m) - np.ceil(zmin / interval_m)) + 1
+    if nb_levels > CONTOUR_MAX_NB_LINES:
+        raise NameError(f"contour_interval_m {interval_m} m gives {nb_levels} levels from {zmin:.2f} to {zmax:.2f} m, more than {CONTOUR_MAX_NB_LINES}. Use a larger interval.")
+    return np.arange(np.ceil(zmin / interval_m), np.floor(zmax / interval_m) + 1) * interval_m
+
+
+def chunk_lines_to_geometries(lines: tuple) -> np.ndarray:
+    """ LineStrings from contourpy ChunkCombinedOffset lines. """
+    geometries = []
+    for points, offsets in zip(*lines):
+        if points is None: continue
+        geometries.append(shapely.linestrings(points, indices=np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))))
+    return np.concatenate(geometries) if len(geometries) else np.empty(0, dtype=object)
+
+
+def chunk_filled_to_geometry(filled: tuple) -> shapely.MultiPolygon:
+    """ One MultiPolygon from contourpy ChunkCombinedOffsetOffset polygons, first ring of each polygon is its exterior. """
+    polygons = []
+    for points, offsets, outer_offsets in zip(*filled):
+        if points is None: continue
+        rings = shapely.linearrings(points, indices=np.repeat(np.arange(len(offsets) - 1), np.diff(offsets)))
+        polygons.append(shapely.polygons(rings, indices=np.repeat(np.arange(len(outer_offsets) - 1), np.diff(outer_offsets))))
+    return shapely.multipolygons(np.concatenate(polygons)) if len(polygons) else shapely.MultiPolygon()
+
+
+@perf_record()
+def build_depth_contours(df_grid: pd.DataFrame, spacing_m: float, interval_m: float, crs: pyproj.CRS) -> tuple[gpd.GeoDataFrame, gpd.GeoDataFrame]:
+    """
+        Contour lines and filled contour polygons of gridded depth, in one pass on the in-memory grid.
+        Lines have the depth of their level. Polygons are the bands between levels and have the depth of their upper level.
+    """
+
+    array, _, _ = depth_grid_to_array(df_grid, spacing_m)
+    x = df_grid.X_utm_corr.min() + np.arange(array.shape[1]) * spacing_m
+    y = df_grid.Y_utm_corr.max() - np.arange(array.shape[0]) * spacing_m
+    z = np.ma.masked_invalid(array.astype(np.float64))
+
+    zmin, zmax = float(z.min()), float(z.max())
+    levels = get_contour_levels(zmin, zmax, interval_m)
+    print(f'func: contours > {len(levels)} levels from {zmin:.2f} to {zmax:.2f}')
+
+    generator = contour_generator(x, y, z, line_type=LineType.ChunkCombinedOffset, fill_type=FillType.ChunkCombinedOffsetOffset)
+
+    lines_geometry, lines_depth = [], []
+    for level in levels:
+        geometries = chunk_lines_to_geometries(generator.lines(level))
+        lines_geometry.append(geometries)
+        lines_depth.append(np.full(len(geometries), level))
+
+    # Bands are closed by min and max depth, as gdal_contour -p.
+    edges = np.unique(np.r_[zmin, levels, zmax])
+    polys_geometry = [chunk_filled_to_geometry(generator.filled(lower, upper)) for lower, upper in zip(edges[:-1], edges[1:])]
+
+    gdf_lines = gpd.GeoDataFrame(
+        {"depth": np.concatenate(lines_depth) if len(lines_depth) else np.empty(0)},
+        geometry=np.concatenate(lines_geometry) if len(lines_geometry) else np.empty(0, dtype=object), crs=crs
+    )
+    gdf_polys = gpd.GeoDataFrame({"depth": edges[1:]}, geometry=polys_geometry, crs=crs)
+    gdf_polys = gdf_polys[np.logical_not(gdf_polys.geometry.is_empty)].reset_index(drop=True)
+
+    return gdf_lines, gdf_polys
@@ -0,0 +1,330 @@
+import io
+import struct
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+# ArduPilot DataFlash binary log, each message is: 0xA3 0x95 <msg type> <payload>.
+# Payload layouts are given by FMT messages (type 128) written at the beginning of the log.
+DF_HEAD = b"\xa3\x95"
+FMT_TYPE = 128
+FMT_LENGTH = 89
+
+# Format character => struct code. Strings are fixed size and null padded.
+DF_FORMAT_TO_STRUCT = {
+    "a": "64s", "b": "b", "B": "B", "h": "h", "H": "H", "i": "i", "I": "I", "f": "f", "d": "d",
+    "n": "4s", "N": "16s", "Z": "64s", "c": "h", "C": "H", "e": "i", "E": "I", "L": "i", "M": "B", "q": "q", "Q": "Q",
+}
+
+# Format character => numpy dtype, used by the memory mapped reader.
+DF_FORMAT_TO_DTYPE = {
+    "a": ("<i2", (32,)), "b": ("i1",), "B": ("u1",), "h": ("<i2",), "H": ("<u2",), "i": ("<i4",), "I": ("<u4",), "f": ("<f4",), "d": ("<f8",),
+    "n": ("S4",), "N": ("S16",), "Z": ("S64",), "c": ("<i2",), "C": ("<u2",), "e": ("<i4",), "E": ("<u4",), "L": ("<i4",), "M": ("u1",), "q": ("<i8",), "Q": ("<u8",),
+}
+
+# Same multipliers as pymavlink: centi units and 1e-7 degrees for lat/lng.
+DF_FORMAT_MULTIPLIERS = {"c": 0.01, "C": 0.01, "e": 0.01, "E": 0.01, "L": 1e-7}
+
+# Seconds between unix epoch and GPS epoch (1980-01-06) minus leap seconds, as pymavlink does.
+GPS_EPOCH_UNIX = 315964800
+GPS_LEAP_SECONDS = 18
+
+
+def parse_fmt_payload(data: bytes, offset: int) -> tuple[int, int, str, str, list[str]]:
+    """ Return type, length, name, format and columns of a FMT message. """
+    msg_type, length, name, fmt, columns = struct.unpack_from("<BB4s16s64s", data, offset + 3)
+    decode = lambda v: v.split(b"\0")[0].decode("ascii", "ignore")
+    return msg_type, length, decode(name), decode(fmt), decode(columns).split(",")
+
+
+def decode_string_column(values: pd.Series) -> pd.Series:
+    return values.map(lambda v: v.split(b"\0")[0].decode("utf-8", "backslashreplace"))
+
+
+def build_message_dataframe(rows: list[tuple], fmt: str, columns: list[str]) -> pd.DataFrame:
+    """ Typed dataframe of one message type with multipliers applied and strings decoded. """
+
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    for c, column in zip(fmt, columns):
+        if c in DF_FORMAT_MULTIPLIERS:
+            df[column] = df[column] * DF_FORMAT_MULTIPLIERS[c]
+        elif c in "nNZ":
+            df[column] = decode_string_column(df[column])
+        elif c == "a":
+            df[column] = df[column].map(lambda v: np.frombuffer(v, dtype="<i2"))
+        elif c == "Q":
+            df[column] = df[column].astype(np.uint64).astype(np.int64)
+    return df
+
+
+def get_timebase(df_gps: pd.DataFrame | None) -> float:
+    """ Unix time of TimeUS = 0, from the first GPS message with a week number. 0 if there is no GPS time. """
+
+    if df_gps is None or len(df_gps) == 0 or not {"GWk", "GMS", "TimeUS"}.issubset(df_gps.columns): return 0.0
+
+    df_gps = df_gps[(df_gps.GWk > 0) & (df_gps.TimeUS > 0)]
+    if len(df_gps) == 0: return 0.0
+
+    first = df_gps.iloc[0]
+    gps_time = GPS_EPOCH_UNIX + first.GWk * 7 * 86400 + first.GMS * 0.001 - GPS_LEAP_SECONDS
+    return gps_time - first.TimeUS * 1e-6
+
+
+def parse_dataflash_bin(log_path: Path, types: list[str]) -> dict[str, pd.DataFrame]:
+    """
+        Decode a DataFlash BIN in a single pass and return a dataframe per requested message type.
+
+        Columns are the same as mavlogdump csv output: a timestamp in unix seconds followed by the FMT columns.
+        As in mavlogdump csv, consecutive messages with the same timestamp are merged, the last one is kept.
+    """
+
+    with open(log_path, "rb") as f:
+        data = f.read()
+
+    types = [t for t in types if t != ""]
+    wanted = set(types) | {"GPS"} # GPS is needed to compute timestamps.
+
+    # msg type => (name, length, struct, format, columns)
+    formats = {FMT_TYPE: ("FMT", FMT_LENGTH, None, "BBnNZ", ["Type", "Length", "Name", "Format", "Columns"])}
+    rows = {name: [] for name in wanted}
+    offset, size, nb_bad_bytes = 0, len(data), 0
+
+    while offset + 3 <= size:
+        msg_type = data[offset + 2]
+        msg_format = formats.get(msg_type)
+
+        # Corrupted or unknown message, search next header.
+        if data[offset] != 0xA3 or data[offset + 1] != 0x95 or msg_format is None:
+            next_offset = data.find(DF_HEAD, offset + 1)
+            if next_offset == -1:
+                nb_bad_bytes += size - offset
+                break
+            nb_bad_bytes += next_offset - offset
+            offset = next_offset
+            continue
+
+        name, length, msg_struct = msg_format[0], msg_format[1], msg_format[2]
+        if offset + length > size: break # Truncated last message.
+
+        if msg_type == FMT_TYPE:
+            fmt_type, fmt_length, fmt_name, fmt, columns = parse_fmt_payload(data, offset)
+            try:
+                fmt_struct = struct.Struct("<" + "".join(DF_FORMAT_TO_STRUCT[c] for c in fmt))
+                formats[fmt_type] = (fmt_name, fmt_length, fmt_struct, fmt, columns)
+            except KeyError:
+                print(f"[WARNING] Unknown format {fmt} for {fmt_name} message, skipping it")
+        elif name in wanted:
+            rows[name].append(msg_struct.unpack_from(data, offset + 3))
+
+        offset += length
+
+    if nb_bad_bytes:
+        print(f"[WARNING] {nb_bad_bytes} bytes skipped in {log_path.name}")
+
+    formats_by_name = {f[0]: f for f in formats.values()}
+    dfdict = {}
+    for name in wanted:
+        if name not in formats_by_name:
+            dfdict[name] = pd.DataFrame(columns=["timestamp"])
+            continue
+        _, _, _, fmt, columns = formats_by_name[name]
+        dfdict[name] = build_message_dataframe(rows[name], fmt, columns)
+
+    return add_timestamps(dfdict, types)
+
+
+def add_timestamps(dfdict: dict[str, pd.DataFrame], types: list[str]) -> dict[str, pd.DataFrame]:
+    """ Add unix timestamp column and merge messages with the same timestamp as mavlogdump csv does. """
+
+    timebase = get_timebase(dfdict.get("GPS"))
+    for name, df in dfdict.items():
+        if "TimeUS" not in df: continue
+
+        df.insert(0, "timestamp", timebase + df["TimeUS"] * 1e-6)
+        dfdict[name] = df[df["timestamp"] != df["timestamp"].shift(-1)].reset_index(drop=True)
+
+    return {name: dfdict[name] for name in types}
+
+
+def get_dataflash_dtype(fmt: str, columns: list[str]) -> np.dtype:
+    """ Packed numpy dtype of a message payload. """
+    return np.dtype([(column, *DF_FORMAT_TO_DTYPE[c]) for c, column in zip(fmt, columns)])
+
+
+def find_header_candidates(buffer: np.ndarray, chunk_size: int = 64 * 1024 * 1024) -> np.ndarray:
+    """ Offsets of all 0xA3 0x95 sequences. Some of them can be inside a payload. Chunked to bound memory. """
+
+    candidates, size = [], len(buffer)
+    for start in range(0, size - 2, chunk_size):
+        chunk = buffer[start:min(start + chunk_size + 1, size)]
+        candidates.append(np.flatnonzero((chunk[:-1] == 0xA3) & (chunk[1:] == 0x95)) + start)
+    return np.concatenate(candidates) if len(candidates) else np.array([], dtype=np.int64)
+
+
+def read_dataflash_formats(buffer: np.ndarray, candidates: np.ndarray) -> dict[int, tuple]:
+    """ Decode all FMT messages. Candidates inside a payload are dismissed if the declared length doesn't match the format. """
+
+    formats = {}
+    fmt_offsets = candidates[buffer[candidates + 2] == FMT_TYPE]
+    for offset in fmt_offsets[fmt_offsets + FMT_LENGTH <= len(buffer)]:
+        msg_type, length, name, fmt, columns = parse_fmt_payload(buffer, int(offset))
+        try:
+            dtype = get_dataflash_dtype(fmt, columns)
+        except (KeyError, ValueError, TypeError):
+            continue
+        if dtype.itemsize + 3 != length: continue
+        formats[msg_type] = (name, length, dtype, fmt, columns)
+
+    return formats
+
+
+def follow_message_chain(candidates: np.ndarray, lengths: np.ndarray, size: int) -> np.ndarray:
+    """
+        Return a mask of candidates which are real message headers.
+
+        Starting from the first header, next message is at offset + length, or at the next header if the message is corrupted or unknown.
+        The chain is followed with pointer doubling: after k iterations all messages at less than 2^k steps from the first one are marked.
+    """
+
+    nb_candidates = len(candidates)
+    next_idx = np.searchsorted(candidates, candidates + np.maximum(lengths, 1))
+    jump = np.append(next_idx, nb_candidates) # Last index is the end of the file and points to itself.
+
+    on_chain = np.zeros(nb_candidates + 1, dtype=bool)
+    on_chain[0] = True
+    while True:
+        reached = jump[np.flatnonzero(on_chain)]
+        if on_chain[reached].all(): break
+        on_chain[reached] = True
+        jump = jump[jump]
+
+    return on_chain[:nb_candidates] & (lengths > 0) & (candidates + lengths <= size)
+
+
+def build_message_dataframe_from_array(array: np.ndarray, fmt: str, columns: list[str]) -> pd.DataFrame:
+    """ Same dataframe as build_message_dataframe from a structured array. """
+
+    df = pd.DataFrame({column: list(array[column]) if c == "a" else array[column] for c, column in zip(fmt, columns)})
+    for c, column in zip(fmt, columns):
+        if c in DF_FORMAT_MULTIPLIERS:
+            df[column] = df[column] * DF_FORMAT_MULTIPLIERS[c]
+        elif c in "nNZ":
+            df[column] = decode_string_column(df[column])
+        elif c in "fd":
+            df[column] = df[column].astype(np.float64)
+        elif c != "a":
+            df[column] = df[column].astype(np.int64)
+    return df
+
+
+def parse_dataflash_bin_mmap(log_path: Path, types: list[str]) -> dict[str, pd.DataFrame]:
+    """
+        Same output as parse_dataflash_bin, decoded with numpy on a memory mapped file.
+
+        Headers are located for the whole file at once, then each message type is copied
+        with a single fancy index and viewed with a dtype built from its FMT message.
+    """
+
+    types = [t for t in types if t != ""]
+    wanted = set(types) | {"GPS"} # GPS is needed to compute timestamps.
+
+    buffer = np.memmap(log_path, dtype=np.uint8, mode="r")
+    size = len(buffer)
+
+    candidates = find_header_candidates(buffer)
+    candidates = candidates[candidates + 3 <= size]
+    formats = read_dataflash_formats(buffer, candidates)
+    formats[FMT_TYPE] = ("FMT", FMT_LENGTH, None, "BBnNZ", ["Type", "Length", "Name", "Format", "Columns"])
+
+    msg_types = np.asarray(buffer[candidates + 2])
+    type_lengths = np.zeros(256, dtype=np.int64)
+    for msg_type, msg_format in formats.items():
+        type_lengths[msg_type] = msg_format[1]
+    lengths = type_lengths[msg_types]
+
+    is_message = follow_message_chain(candidates, lengths, size) if len(candidates) else np.array([], dtype=bool)
+    nb_bad_bytes = size - int(lengths[is_message].sum())
+    if nb_bad_bytes:
+        print(f"[WARNING] {nb_bad_bytes} bytes skipped in {log_path.name}")
+
+    formats_by_name = {f[0]: (msg_type, *f) for msg_type, f in formats.items()}
+    dfdict = {}
+    for name in wanted:
+        if name not in formats_by_name or name == "FMT":
+            dfdict[name] = pd.DataFrame(columns=["timestamp"])
+            continue
+
+        msg_type, _, length, dtype, fmt, columns = formats_by_name[name]
+        offsets = candidates[is_message & (msg_types == msg_type)]
+        payloads = np.ascontiguousarray(buffer[offsets[:, None] + np.arange(3, length)])
+        dfdict[name] = build_message_dataframe_from_array(payloads.view(dtype).reshape(-1), fmt, columns)
+
+    del buffer
+    return add_timestamps(dfdict, types)
+
+
+def split_dataflash_log(log_path: Path, types: list[str]) -> tuple[dict[str, list[str]], dict[str, list[bytes]]]:
+    """ Single streaming pass over a text log. Return FMT columns and raw lines of each requested type. """
+
+    wanted = {t.encode(): t for t in types if t != ""}
+    columns, lines = {}, {t: [] for t in wanted.values()}
+
+    with open(log_path, "rb") as f:
+        for line in f:
+            comma = line.find(b",")
+            if comma == -1: continue
+
+            name = line[:comma]
+            if name in wanted:
+                lines[wanted[name]].append(line)
+            elif name == b"FMT":
+                fields = line.decode("utf-8", "replace").split(",")
+                if len(fields) > 5 and fields[3].strip() in lines and fields[3].strip() not in columns:
+                    columns[fields[3].strip()] = [x.strip() for x in fields[5:]]
+
+    return columns, lines
+
+
+def read_dataflash_log_block(lines: list[bytes], columns: list[str], as_str: bool) -> pd.DataFrame:
+    """
+        Parse lines of one message type at once. Values are float, or raw strings for status messages.
+        Lines with a value which is not a number are dismissed.
+    """
+
+    names = ["_type", *columns]
+    read_block = lambda **kwargs: pd.read_csv(io.BytesIO(b"".join(lines)), header=None, names=names, usecols=columns, encoding_errors="replace", **kwargs)
+
+    if as_str:
+        return read_block(dtype=str, keep_default_na=False)
+
+    try:
+        return read_block(dtype=np.float64)
+    except ValueError:
+        df = read_block(dtype=str, keep_default_na=False)
+        df_float = df.apply(lambda column: pd.to_numeric(column, errors="coerce")).astype(np.float64)
+        is_valid = ~(df_float.isna() & (df != "") & (df.apply(lambda column: column.str.strip().str.lower()) != "nan")).any(axis=1)
+        print(f"warning: Wrong formatting found, skipping {(~is_valid).sum()} lines ...")
+        return df_float[is_valid].reset_index(drop=True)
+
+
+def parse_dataflash_log(log_path: Path, param_list: list[str], status_list: list[str]) -> dict[str, pd.DataFrame]:
+    """
+        Parse a Mission Planner text log. Params are converted to float, status are kept as raw strings.
+        Same dataframes as reading the log line by line with csv.reader.
+    """
+
+    columns, lines = split_dataflash_log(log_path, [*param_list, *status_list])
+
+    dfdict = {}
+    for name in [*param_list, *status_list]:
+        if name == "": continue
+        if name not in columns:
+            print(f"warning: No FMT found for {name}")
+            dfdict[name] = pd.DataFrame()
+            continue
+        if len(lines[name]) == 0:
+            dfdict[name] = pd.DataFrame(columns=columns[name])
+            continue
+        dfdict[name] = read_dataflash_log_block(lines[name], columns[name], name in status_list)
+
+    return dfdict
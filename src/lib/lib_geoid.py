@@ -0,0 +1,145 @@
+import pyproj
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from functools import lru_cache
+from scipy.interpolate import LinearNDInterpolator
+
+from .lib_manifest import load_stage_manifest, write_stage_manifest, is_stage_up_to_date
+
+# Geoid text files are compiled once next to them: <geoid file>.grid.npz with its manifest <geoid file>.grid.json
+GEOID_GRID_SUFFIX = ".grid"
+GEOID_GRID_VERSION = 1 # Increase to recompile all geoids if the compiled format changes.
+GEOID_LRU_SIZE = 8
+
+
+def get_geoid_grid_path(geoid_path: Path) -> Path:
+    return Path(geoid_path.parent, f"{geoid_path.name}{GEOID_GRID_SUFFIX}.npz")
+
+
+def read_geoid_csv(geoid_path: Path) -> pd.DataFrame:
+    dfgeoid = pd.read_csv(geoid_path)
+    # clean geoid file
+    dfgeoid = dfgeoid[dfgeoid.alt < 1000.0]
+    dfgeoid = dfgeoid[dfgeoid.alt > -1000.0]
+    return dfgeoid
+
+
+def get_regular_axis(values: np.ndarray) -> tuple[float, float, np.ndarray] | None:
+    """ Return origin, step and index of each value if values lie on a regular axis, else None. """
+    axis = np.unique(values)
+    if len(axis) < 2: return None
+
+    step = float(np.median(np.diff(axis)))
+    indices = np.rint((values - axis[0]) / step).astype(np.int64)
+    if np.abs(axis[0] + indices * step - values).max() > step * 1e-6: return None
+
+    return float(axis[0]), step, indices
+
+
+def compile_geoid(geoid_path: Path) -> dict:
+    """ Regular lat/lng grid if the geoid file is one, else cleaned points to triangulate. Missing grid nodes are NaN. """
+
+    dfgeoid = read_geoid_csv(geoid_path)
+    lat, lng, alt = dfgeoid.lat.to_numpy(np.float64), dfgeoid.lng.to_numpy(np.float64), dfgeoid.alt.to_numpy(np.float64)
+
+    lat_axis, lng_axis = get_regular_axis(lat), get_regular_axis(lng)
+    if lat_axis == None or lng_axis == None:
+        return {"kind": "points", "lat": lat, "lng": lng, "alt": alt}
+
+    (lat0, dlat, i), (lng0, dlng, j) = lat_axis, lng_axis
+    grid = np.full((i.max() + 1, j.max() + 1), np.nan)
+    grid[i, j] = alt
+
+    return {"kind": "grid", "origin": np.array([lat0, lng0]), "step": np.array([dlat, dlng]), "grid": grid}
+
+
+def load_compiled_geoid(geoid_path: Path) -> dict:
+    """ Load the compiled geoid next to the text file, compile it first if missing or outdated. """
+
+    grid_path = get_geoid_grid_path(geoid_path)
+    info_path = grid_path.with_suffix(".json")
+    info = load_stage_manifest(info_path)
+    config = {"version": GEOID_GRID_VERSION}
+
+    if is_stage_up_to_date(info, [geoid_path], geoid_path.parent, config, [grid_path]):
+        with np.load(grid_path) as data:
+            return {"kind": info["state"]["kind"], **{key: data[key] for key in data.files}}
+
+    print(f"info: Compiling geoid {geoid_path}")
+    compiled = compile_geoid(geoid_path)
+    try:
+        np.savez(grid_path, **{key: value for key, value in compiled.items() if key != "kind"})
+        write_stage_manifest(info_path, [geoid_path], geoid_path.parent, config, {"kind": compiled["kind"]}, info)
+    except OSError as e:
+        # Compiled geoid is only an optimization. Geoid folder can be read only.
+        print(f"[WARNING] Cannot write compiled geoid {grid_path}: {e}")
+
+    return compiled
+
+
+def interp_bilinear(compiled: dict, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+    """ Bilinear interpolation on the regular grid. NaN outside of the grid or if a node of the cell is missing. """
+
+    grid = compiled["grid"]
+    fi = (lat - compiled["origin"][0]) / compiled["step"][0]
+    fj = (lng - compiled["origin"][1]) / compiled["step"][1]
+
+    i = np.clip(np.floor(fi).astype(np.int64), 0, grid.shape[0] - 2)
+    j = np.clip(np.floor(fj).astype(np.int64), 0, grid.shape[1] - 2)
+    ti, tj = fi - i, fj - j
+
+    alt = grid[i, j] * (1 - ti) * (1 - tj) + grid[i + 1, j] * ti * (1 - tj) \
+        + grid[i, j + 1] * (1 - ti) * tj + grid[i + 1, j + 1] * ti * tj
+
+    outside = (fi < 0) | (fi > grid.shape[0] - 1) | (fj < 0) | (fj > grid.shape[1] - 1)
+    alt[outside] = np.nan
+    return alt
+
+
+def build_triangulation_interpolator(lat: np.ndarray, lng: np.ndarray, alt: np.ndarray, wgs2utm: pyproj.Proj) -> LinearNDInterpolator:
+    x, y = wgs2utm(lng, lat, inverse=False)
+    return LinearNDInterpolator(np.column_stack((x, y)), alt)
+
+
+@lru_cache(maxsize=GEOID_LRU_SIZE)
+def load_geoid_interpolator(geoid_path: Path, mtime_ns: int, utm_zone: str, utm_south: bool, utm_ellips: str):
+    """ Cached by file modification time and projection, geoids are shared by all sessions of the process. """
+
+    compiled = load_compiled_geoid(geoid_path)
+    wgs2utm = pyproj.Proj(proj='utm', zone=utm_zone, ellps=utm_ellips, south=utm_south)
+
+    if compiled["kind"] != "grid" or min(compiled["grid"].shape) < 2:
+        # Irregular geoid, linear interpolation on the triangulation of UTM points.
+        return build_triangulation_interpolator(compiled["lat"], compiled["lng"], compiled["alt"], wgs2utm)
+
+    # Cells with a missing node (removed outlier, land) use the triangulation of grid nodes.
+    # Built here, once per cached geoid, the returned function can then be shared by threads.
+    # A full grid doesn't need it, points outside of the grid are NaN.
+    grid = compiled["grid"]
+    triangulation = None
+    if np.isnan(grid).any():
+        nodes_i, nodes_j = np.nonzero(~np.isnan(grid))
+        triangulation = build_triangulation_interpolator(
+            compiled["origin"][0] + nodes_i * compiled["step"][0],
+            compiled["origin"][1] + nodes_j * compiled["step"][1],
+            grid[nodes_i, nodes_j], wgs2utm
+        )
+
+    def geoid_itp(xy: np.ndarray) -> np.ndarray:
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        lng, lat = wgs2utm(xy[:, 0], xy[:, 1], inverse=True)
+        alt = interp_bilinear(compiled, np.asarray(lat), np.asarray(lng))
+
+        missing = np.isnan(alt)
+        if triangulation != None and missing.any():
+            alt[missing] = triangulation(xy[missing])
+        return alt
+
+    return geoid_itp
+
+
+def get_geoid_interpolator(geoid_path: Path, utm_zone: str, utm_south: bool, utm_ellips: str):
+    """ Return a function giving geoid altitude at (N, 2) UTM coordinates. """
+    geoid_path = Path(geoid_path).resolve()
+    return load_geoid_interpolator(geoid_path, geoid_path.stat().st_mtime_ns, str(utm_zone), bool(utm_south), utm_ellips)
@@ -0,0 +1,80 @@
+import pandas as pd
+from pathlib import Path
+
+from .lib_manifest import load_stage_manifest, write_stage_manifest, hash_file
+from .lib_dataflash import parse_dataflash_bin, parse_dataflash_bin_mmap
+
+# Parsed autopilot logs are stored next to them, one parquet file per message type:
+# SENSORS/.log_cache/<log file name>/<message type>.parquet
+LOG_CACHE_FOLDER_NAME = ".log_cache"
+
+
+def get_log_cache_path(log_path: Path) -> Path:
+    return Path(log_path.parent, LOG_CACHE_FOLDER_NAME, log_path.name)
+
+
+def is_log_cache_valid(info: dict, log_path: Path) -> bool:
+    """ Same size and modification time, or same content if the file was touched. """
+
+    previous = info.get("inputs", {}).get(log_path.name)
+    if previous == None: return False
+
+    stat = log_path.stat()
+    if previous["size"] != stat.st_size: return False
+    if previous["mtime_ns"] == stat.st_mtime_ns: return True
+    return previous.get("sha1") == hash_file(log_path)
+
+
+def load_log_cache(log_path: Path, types: list[str]) -> dict[str, pd.DataFrame] | None:
+    """ Return cached dataframes if all types are cached for this version of the log, else None. """
+
+    types = [t for t in types if t != ""]
+    cache_path = get_log_cache_path(log_path)
+    info = load_stage_manifest(Path(cache_path, "cache.json"))
+    if len(info) == 0 or not is_log_cache_valid(info, log_path): return None
+    if not set(types).issubset(info.get("state", {}).get("types", [])): return None
+
+    try:
+        dfdict = {t: pd.read_parquet(Path(cache_path, f"{t}.parquet")) for t in types}
+    except Exception as e:
+        print(f"[WARNING] Cannot read log cache {cache_path}: {e}")
+        return None
+
+    print(f"info: Autopilot data loaded from cache {cache_path}")
+    return dfdict
+
+
+def save_log_cache(log_path: Path, dfdict: dict[str, pd.DataFrame]) -> None:
+    """ Write dataframes in cache. Types cached for the same version of the log are kept. """
+
+    cache_path = get_log_cache_path(log_path)
+    info_path = Path(cache_path, "cache.json")
+    info = load_stage_manifest(info_path)
+    cached_types = info.get("state", {}).get("types", []) if len(info) and is_log_cache_valid(info, log_path) else []
+
+    try:
+        cache_path.mkdir(exist_ok=True, parents=True)
+        for t, df in dfdict.items():
+            if t == "": continue
+            df.to_parquet(Path(cache_path, f"{t}.parquet"), index=False)
+    except Exception as e:
+        # Cache is only an optimization. Sensors folder can be read only or pyarrow missing.
+        print(f"[WARNING] Cannot write log cache {cache_path}: {e}")
+        return
+
+    types = sorted(set(cached_types) | {t for t in dfdict if t != ""})
+    write_stage_manifest(info_path, [log_path], log_path.parent, {}, {"types": types}, info)
+
+
+def load_dataflash_bin(log_path: Path, types: list[str], engine: str = "mmap") -> dict[str, pd.DataFrame]:
+    """ Decode a BIN log or load it from cache. """
+
+    dfdict = load_log_cache(log_path, types)
+    if dfdict != None: return dfdict
+
+    # mmap engine decodes with numpy on a memory mapped file, struct engine message by message. Both give the same dataframes.
+    parse_bin = parse_dataflash_bin_mmap if engine == "mmap" else parse_dataflash_bin
+    dfdict = parse_bin(log_path, types)
+    save_log_cache(log_path, dfdict)
+
+    return dfdict
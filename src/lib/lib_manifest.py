@@ -0,0 +1,93 @@
+import json
+import hashlib
+from pathlib import Path
+
+HASH_CHUNK_SIZE = 8 * 1024 * 1024 # 8 Mo
+
+def hash_file(file: Path) -> str:
+    """ Return sha1 of file content. """
+    sha = hashlib.sha1()
+    with open(file, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def get_file_key(file: Path, root: Path) -> str:
+    """ Path relative to the session if possible to be able to move the session. """
+    file = Path(file).resolve()
+    return str(file.relative_to(root.resolve())) if file.is_relative_to(root.resolve()) else str(file)
+
+
+def get_files_signature(files: list[Path], root: Path, previous_inputs: dict, with_hash: bool = True) -> dict:
+    """ Build size, mtime and hash of each file. Hash is reused from previous manifest if size and mtime didn't change. """
+
+    signature = {}
+    for file in files:
+        stat = Path(file).stat()
+        key = get_file_key(file, root)
+        previous = previous_inputs.get(key, {})
+
+        file_sig = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        if with_hash:
+            is_same_stat = previous.get("size") == stat.st_size and previous.get("mtime_ns") == stat.st_mtime_ns
+            file_sig["sha1"] = previous["sha1"] if is_same_stat and "sha1" in previous else hash_file(file)
+
+        signature[key] = file_sig
+
+    return signature
+
+
+def load_stage_manifest(manifest_path: Path) -> dict:
+    """ Return manifest content or an empty dict. """
+    if not manifest_path.exists(): return {}
+
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        print(f"[WARNING] Manifest {manifest_path} is corrupted, stage will be processed")
+        return {}
+
+
+def is_stage_up_to_date(manifest: dict, files: list[Path], root: Path, config: dict, outputs: list[Path], with_hash: bool = True) -> bool:
+    """ Check if files, config and outputs of a stage are the same as recorded in the manifest. """
+
+    if len(manifest) == 0: return False
+
+    # Config is compared after a json round trip to have the same types as the stored one.
+    if manifest.get("config") != json.loads(json.dumps(config)): return False
+
+    # All outputs need to exist. Folders need to have content.
+    for output in outputs:
+        if not output.exists(): return False
+        if output.is_dir() and not any(output.iterdir()): return False
+
+    previous_inputs = manifest.get("inputs", {})
+    if sorted(previous_inputs) != sorted(get_file_key(file, root) for file in files): return False
+
+    for file in files:
+        stat = Path(file).stat()
+        previous = previous_inputs[get_file_key(file, root)]
+
+        if previous["size"] != stat.st_size: return False
+        if previous["mtime_ns"] == stat.st_mtime_ns: continue
+
+        # File was touched, check if content really changed.
+        if not with_hash or previous.get("sha1") != hash_file(file): return False
+
+    return True
+
+
+def write_stage_manifest(manifest_path: Path, files: list[Path], root: Path, config: dict, state: dict, previous_manifest: dict, with_hash: bool = True) -> None:
+    """ Save inputs signature, config and state needed by the next stages. """
+
+    manifest = {
+        "inputs": get_files_signature(files, root, previous_manifest.get("inputs", {}), with_hash),
+        "config": config,
+        "state": state
+    }
+
+    manifest_path.parent.mkdir(exist_ok=True, parents=True)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=3)
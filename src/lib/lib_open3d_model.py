@@ -1,10 +1,13 @@
 import numpy as np
 import open3d as o3d
+from pathlib import Path
 
 import matplotlib as mpl
 from matplotlib import cm
 import matplotlib.pyplot as plt
 
+from .lib_perf import perf_record
+
 class MplColorHelper:
 
   def __init__(self, cmap_name, start_val, stop_val):
@@ -17,7 +20,12 @@ class MplColorHelper:
     rgbval = self.scalarMap.to_rgba(val)
     return rgbval
 
-def build_o3d_pointcloud(xyz,center=True):
+@perf_record()
+def build_o3d_pointcloud(xyz,center=True,characterize=True):
+    """
+        Point cloud of xyz. With characterize, estimate normals and nearest neighbour distances needed by ball pivoting
+        and alpha shape, else return None for both distances (grid triangulation needs neither).
+    """
     # recenter shapes to (0,0,0) by substracting min values
     if center == True:
         xyz[:,0] = xyz[:,0] - np.min(xyz[:,0])
@@ -27,12 +35,15 @@ def build_o3d_pointcloud(xyz,center=True):
     pcd = o3d.geometry.PointCloud()
     pcd.points = o3d.utility.Vector3dVector(xyz)
     print(pcd)
+    if not characterize:
+        return pcd, None, None
     # calc some data set characteristics
     print('Estimating point cloud normals')
     pcd.estimate_normals()
     print('Computing point to point distance')
-    avgdist     = np.mean(pcd.compute_nearest_neighbor_distance())
-    stddist     = np.std(pcd.compute_nearest_neighbor_distance())
+    nndist      = np.asarray(pcd.compute_nearest_neighbor_distance())
+    avgdist     = np.mean(nndist)
+    stddist     = np.std(nndist)
     stddist_rel = 100.0*stddist/avgdist
     print('--> avg dist = {0:.3f}m  and  rel std dev = {1:.3f}%'.format(avgdist,stddist_rel))
     # warning message to tell that that are not enough uniformly distributed 
@@ -40,9 +51,41 @@ def build_o3d_pointcloud(xyz,center=True):
         print('--> warning : rel std dev > 10%, consider uniform resampling before surface reconstruction'.format(avgdist,stddist_rel))
     return pcd, avgdist , stddist
 
-def build_o3d_trimesh(pcd,avgdist,method='ballpivot'):
+def build_grid_triangles(xyz,spacing_m):
+    """
+        Triangles between neighbouring nodes of a regular grid, missing nodes are skipped.
+        Full cells give two triangles, cells with three nodes give one. All triangles face up.
+    """
+    cols = np.rint((xyz[:,0] - np.min(xyz[:,0]))/spacing_m).astype(np.int64)
+    rows = np.rint((np.max(xyz[:,1]) - xyz[:,1])/spacing_m).astype(np.int64)
+    
+    # vertex index of each grid node, -1 if missing. One more row and column to get neighbours of border cells.
+    index = np.full((rows.max()+2, cols.max()+2), -1, dtype=np.int64)
+    index[rows,cols] = np.arange(len(xyz))
+    v00, v01 = index[:-1,:-1], index[:-1,1:]
+    v10, v11 = index[1:,:-1], index[1:,1:]
+    h00, h01, h10, h11 = v00 >= 0, v01 >= 0, v10 >= 0, v11 >= 0
+    
+    # cell split along v01-v10 when full, else the triangle of its three nodes
+    m0, m1 = h00 & h10 & h01, h01 & h10 & h11
+    m2, m3 = h00 & h10 & h11 & ~h01, h00 & h11 & h01 & ~h10
+    triangles = np.concatenate((
+        np.column_stack((v00[m0], v10[m0], v01[m0])),
+        np.column_stack((v01[m1], v10[m1], v11[m1])),
+        np.column_stack((v00[m2], v10[m2], v11[m2])),
+        np.column_stack((v00[m3], v11[m3], v01[m3]))
+    ))
+    return triangles
+
+@perf_record()
+def build_o3d_trimesh(pcd,avgdist,method='ballpivot',spacing_m=None):
     
-    if method == 'alphashape':
+    if method == 'grid':
+        print('Starting reconstruction algo : regular grid triangulation')
+        triangles = build_grid_triangles(np.asarray(pcd.points), spacing_m if spacing_m else avgdist)
+        print('triangles =',len(triangles))
+        mesh = o3d.geometry.TriangleMesh(pcd.points, o3d.utility.Vector3iVector(triangles))
+    elif method == 'alphashape':
         alpha = avgdist*5
         print('Starting reconstruction algo : alpha shape')
         print('alpha =',alpha)
@@ -73,4 +116,19 @@ def build_o3d_trimesh(pcd,avgdist,method='ballpivot'):
     meshcol = colhelper.get_rgb(xyz[:,2])[:,[0,1,2]]
     mesh.vertex_colors = o3d.utility.Vector3dVector(meshcol)
 
-    return mesh
\ No newline at end of file
+    return mesh
+
+@perf_record()
+def write_o3d_trimesh(mesh,file_path,model_format='ply',max_triangles=0):
+    """
+        Write mesh as binary ply, glb or ascii ply, optionally decimated to max_triangles. Return written file path.
+        Binary formats are locale independent, ascii ply needs comma replaced by dot afterwards.
+    """
+    if max_triangles > 0 and len(mesh.triangles) > max_triangles:
+        print('Decimating mesh from',len(mesh.triangles),'to',max_triangles,'triangles')
+        mesh = mesh.simplify_quadric_decimation(target_number_of_triangles=max_triangles)
+        mesh.compute_vertex_normals()
+    
+    file_path = Path(file_path).with_suffix('.glb' if model_format == 'glb' else '.ply')
+    o3d.io.write_triangle_mesh(str(file_path), mesh, write_ascii=(model_format == 'ply_ascii'))
+    return file_path
@@ -0,0 +1,256 @@
+import os
+import json
+import time
+import resource
+import threading
+import functools
+from pathlib import Path
+from datetime import timedelta, datetime
+
+# Records of the session currently processed. Shared between threads of a session.
+_perf_lock = threading.Lock()
+_perf_records = []
+_perf_start = time.perf_counter()
+
+RSS_SAMPLE_PERIOD_S = 0.05
+_rss_lock = threading.Lock()
+_rss_blocks = set() # Blocks currently running, their peak RSS is updated by the sampler thread.
+_rss_wakeup = threading.Event()
+_rss_sampler = None
+
+
+def reset_perf_records() -> None:
+    """ Start a new report, called at the beginning of each session. """
+    global _perf_start
+    with _perf_lock:
+        _perf_records.clear()
+        _perf_start = time.perf_counter()
+
+
+def get_perf_records() -> list[dict]:
+    """ Copy of the records of the current report. """
+    with _perf_lock:
+        return list(_perf_records)
+
+
+def get_path_size(path: Path) -> dict:
+    """ Size in bytes of a file or all files of a folder. """
+    path = Path(path)
+    if path.is_file():
+        return {"bytes": path.stat().st_size, "files": 1}
+    if path.is_dir():
+        files = [file for file in path.rglob("*") if file.is_file()]
+        return {"bytes": sum(file.stat().st_size for file in files), "files": len(files)}
+    return {}
+
+
+def get_size(obj) -> dict:
+    """ Describe the size of an input or output: bytes for files, rows for tables, points/triangles for 3D objects. """
+
+    size = {}
+    def merge(other: dict) -> None:
+        for key, value in other.items():
+            size[key] = size.get(key, 0) + value
+
+    if isinstance(obj, Path):
+        merge(get_path_size(obj))
+    elif hasattr(obj, "shape") and len(obj.shape) > 0: # DataFrame, numpy array
+        merge({"rows": int(obj.shape[0])})
+    elif hasattr(obj, "triangles"): # open3d triangle mesh
+        merge({"points": len(obj.vertices), "triangles": len(obj.triangles)})
+    elif hasattr(obj, "points"): # open3d point cloud
+        merge({"points": len(obj.points)})
+    elif isinstance(obj, dict):
+        for value in obj.values(): merge(get_size(value))
+    elif isinstance(obj, (list, tuple)):
+        for value in obj: merge(get_size(value))
+
+    return size
+
+
+def get_current_rss_mb() -> float | None:
+    """ Resident memory of the process now, None if /proc is not available. """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def sample_rss() -> None:
+    """ Update the peak RSS of all running blocks. """
+    rss = get_current_rss_mb()
+    if rss == None: return
+    with _rss_lock:
+        for block in _rss_blocks:
+            block.peak_rss_mb = max(block.peak_rss_mb, rss)
+
+
+def run_rss_sampler() -> None:
+    """ Sample RSS while blocks are running, sleep otherwise. """
+    while True:
+        _rss_wakeup.wait()
+        sample_rss()
+        time.sleep(RSS_SAMPLE_PERIOD_S)
+        with _rss_lock:
+            if len(_rss_blocks) == 0: _rss_wakeup.clear()
+
+
+def start_rss_sampling(block) -> None:
+    global _rss_sampler
+    with _rss_lock:
+        _rss_blocks.add(block)
+        if _rss_sampler == None:
+            _rss_sampler = threading.Thread(target=run_rss_sampler, name="perf_rss_sampler", daemon=True)
+            _rss_sampler.start()
+        _rss_wakeup.set()
+    sample_rss()
+
+
+def stop_rss_sampling(block) -> None:
+    sample_rss()
+    with _rss_lock:
+        _rss_blocks.discard(block)
+
+
+class PerfBlock:
+    """
+        Context manager to record wall time, cpu time, peak memory and inputs/outputs size of a block.
+        Output can be provided after the block has run with set_output.
+
+        cpu_s is the CPU time of the whole process during the block, worker threads included. When blocks run
+        at the same time (split videos in background), each of them also counts the CPU of the others.
+        peak_rss_mb is the peak resident memory of the process during the block, sampled every RSS_SAMPLE_PERIOD_S.
+        children_rss_high_water_mb is the largest RSS of a finished subprocess since the process started, not only in this block.
+    """
+
+    def __init__(self, name: str, inputs = None) -> None:
+        self.name = name
+        self.inputs = inputs
+        self.outputs = None
+
+    def set_output(self, outputs) -> None:
+        self.outputs = outputs
+
+    def __enter__(self):
+        self.input_size = get_size(self.inputs)
+        self.start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.thread_cpu_start = time.thread_time()
+        self.children_cpu_start = self.get_children_cpu()
+        self.maxrss_start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.peak_rss_mb = 0.0
+        start_rss_sampling(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb) -> bool:
+        wall_s = time.perf_counter() - self.start
+        stop_rss_sampling(self)
+
+        # ru_maxrss is in kilobytes on Linux. It is the high-water mark of the process lifetime,
+        # so it is the peak of the block only if it increased during the block. Used if /proc can't be sampled.
+        usage_self = resource.getrusage(resource.RUSAGE_SELF)
+        usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        if usage_self.ru_maxrss > self.maxrss_start or self.peak_rss_mb == 0:
+            self.peak_rss_mb = max(self.peak_rss_mb, usage_self.ru_maxrss / 1024)
+
+        record = {
+            "name": self.name,
+            "thread": threading.current_thread().name,
+            "start_s": round(self.start - _perf_start, 3),
+            "wall_s": round(wall_s, 3),
+            "cpu_s": round(time.process_time() - self.cpu_start, 3),
+            "thread_cpu_s": round(time.thread_time() - self.thread_cpu_start, 3),
+            "children_cpu_s": round(self.get_children_cpu() - self.children_cpu_start, 3), # ffmpeg, rnx2rtkp, mavlogdump, exiftool...
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "children_rss_high_water_mb": round(usage_children.ru_maxrss / 1024, 1),
+            "input": self.input_size,
+            "output": get_size(self.outputs),
+            "failed": exc_type is not None
+        }
+
+        with _perf_lock:
+            _perf_records.append(record)
+
+        print(f'func: {self.name} exec time --> {timedelta(seconds=wall_s)}')
+        return False
+
+    @staticmethod
+    def get_children_cpu() -> float:
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return usage.ru_utime + usage.ru_stime
+
+
+def perf_record(name: str = None, inputs = None, outputs = None):
+    """
+        Decorator to record a function in the perf report.
+        By default, DataFrame, array and open3d arguments are used as inputs and the returned value as output.
+        Path arguments are not sized by default, a folder would be walked on each call: inputs(*args, **kwargs) opts in
+        for the files to size. outputs(result, *args, **kwargs) can be given to describe outputs differently.
+    """
+
+    def decorator(func):
+        record_name = name if name else func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            func_inputs = inputs(*args, **kwargs) if inputs else [arg for arg in [*args, *kwargs.values()] if not isinstance(arg, Path)]
+            with PerfBlock(record_name, func_inputs) as block:
+                result = func(*args, **kwargs)
+                block.set_output(outputs(result, *args, **kwargs) if outputs else result)
+            return result
+
+        return wrapper
+    return decorator
+
+
+def get_perf_summary(records: list) -> dict:
+    """ Aggregate records by name. """
+
+    summary = {}
+    for record in records:
+        s = summary.setdefault(record["name"], {"count": 0, "wall_s": 0.0, "cpu_s": 0.0, "children_cpu_s": 0.0, "peak_rss_mb": 0.0})
+        s["count"] += 1
+        s["wall_s"] = round(s["wall_s"] + record["wall_s"], 3)
+        s["cpu_s"] = round(s["cpu_s"] + record["cpu_s"], 3)
+        s["children_cpu_s"] = round(s["children_cpu_s"] + record["children_cpu_s"], 3)
+        s["peak_rss_mb"] = max(s["peak_rss_mb"], record["peak_rss_mb"])
+
+    return summary
+
+
+def write_perf_report(report_path: Path, session_name: str) -> dict:
+    """ Write the records of the session in a json file and return the report. """
+
+    records = get_perf_records()
+
+    report = {
+        "session_name": session_name,
+        "creation_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "total_wall_s": round(time.perf_counter() - _perf_start, 3),
+        "summary": get_perf_summary(records),
+        "records": records
+    }
+
+    report_path.parent.mkdir(exist_ok=True, parents=True)
+    with open(report_path, "w") as f:
+        json.dump(report, f, indent=3)
+
+    return report
+
+
+def write_perf_rollup(rollup_path: Path, reports: list[dict]) -> None:
+    """ Write a report across all sessions of a run. """
+
+    all_records = [record for report in reports for record in report["records"]]
+    rollup = {
+        "creation_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "nb_sessions": len(reports),
+        "summary": get_perf_summary(all_records),
+        "sessions": {report["session_name"]: {"total_wall_s": report["total_wall_s"], "summary": report["summary"]} for report in reports}
+    }
+
+    rollup_path.parent.mkdir(exist_ok=True, parents=True)
+    with open(rollup_path, "w") as f:
+        json.dump(rollup, f, indent=3)
+    print(f"\n-- Performance report of the run saved in {rollup_path}")
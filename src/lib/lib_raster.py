@@ -0,0 +1,59 @@
+import pyproj
+import rasterio
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from rasterio.io import MemoryFile
+from rasterio.shutil import copy as rio_copy
+from rasterio.transform import from_origin
+
+from .lib_perf import perf_record
+
+COG_BLOCK_SIZE = 512
+COG_COMPRESS = "DEFLATE"
+COG_NODATA = np.nan
+
+
+def depth_grid_to_array(df_grid: pd.DataFrame, spacing_m: float) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+        Put gridded depth back on its regular UTM grid, north up. Cells without depth are NaN.
+        Return the array with row and column of each row of df_grid.
+    """
+
+    x, y = df_grid.X_utm_corr.to_numpy(), df_grid.Y_utm_corr.to_numpy()
+    cols = np.rint((x - x.min()) / spacing_m).astype(np.int64)
+    rows = np.rint((y.max() - y) / spacing_m).astype(np.int64)
+
+    array = np.full((rows.max() + 1, cols.max() + 1), np.nan, dtype=np.float32)
+    array[rows, cols] = df_grid.Depth_corr.to_numpy()
+
+    return array, rows, cols
+
+
+def get_utm_crs(utm_zone: str, utm_south: bool, utm_ellips: str) -> pyproj.CRS:
+    """ Same projection as the one used to compute UTM coordinates of bathy points. """
+    return pyproj.Proj(proj='utm', zone=utm_zone, ellps=utm_ellips, south=utm_south).crs
+
+
+@perf_record()
+def write_depth_cog(df_grid: pd.DataFrame, spacing_m: float, crs: pyproj.CRS, raster_path: Path) -> Path:
+    """ Write gridded depth as a tiled, compressed Cloud-Optimized GeoTIFF with overviews, without interpolating again. """
+
+    array, _, _ = depth_grid_to_array(df_grid, spacing_m)
+
+    # Cell centers are the grid nodes.
+    transform = from_origin(df_grid.X_utm_corr.min() - spacing_m / 2, df_grid.Y_utm_corr.max() + spacing_m / 2, spacing_m, spacing_m)
+    profile = {
+        "driver": "GTiff", "width": array.shape[1], "height": array.shape[0], "count": 1, "dtype": "float32",
+        "crs": rasterio.crs.CRS.from_wkt(crs.to_wkt()), "transform": transform, "nodata": COG_NODATA
+    }
+
+    # COG driver can only copy an existing dataset, the grid is built in memory first.
+    with MemoryFile() as memfile:
+        with memfile.open(**profile) as dataset:
+            dataset.write(array, 1)
+            dataset.set_band_description(1, "depth")
+            rio_copy(dataset, str(raster_path), driver="COG", compress=COG_COMPRESS, predictor=3,
+                     blocksize=COG_BLOCK_SIZE, overviews="AUTO", overview_resampling="average", bigtiff="IF_SAFER")
+
+    return raster_path
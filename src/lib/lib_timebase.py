@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+from .lib_dataflash import GPS_EPOCH_UNIX
+
+NS_PER_SECOND = 1_000_000_000
+NS_PER_WEEK = 7 * 86400 * NS_PER_SECOND
+GPS_EPOCH_UNIX_NS = GPS_EPOCH_UNIX * NS_PER_SECOND
+
+
+def gps_week_ms_to_ns(gpsweek, gpsmilliseconds, leapseconds: int = 0) -> np.ndarray:
+    """
+        Unix time in nanoseconds of GPS week and milliseconds arrays.
+        leapseconds are removed to get UTC time. With 0, time stays in GPS time base as the rest of the workflow.
+    """
+
+    gpsweek = np.asarray(gpsweek, dtype=np.int64)
+    gpsnanoseconds = np.rint(np.asarray(gpsmilliseconds, dtype=np.float64) * 1e6).astype(np.int64)
+    return GPS_EPOCH_UNIX_NS + gpsweek * NS_PER_WEEK + gpsnanoseconds - int(leapseconds) * NS_PER_SECOND
+
+
+def datetime_to_ns(values) -> np.ndarray:
+    """ Unix time in nanoseconds of datetime strings (YYYY/MM/DD or YYYY-MM-DD dates) or datetime values. """
+
+    values = pd.Series(values)
+    if values.dtype == object:
+        values = values.str.replace("/", "-", regex=False)
+    return pd.to_datetime(values, format="ISO8601").to_numpy(dtype="datetime64[ns]").astype(np.int64)
+
+
+def ns_to_exif_datetime(datetime_unix) -> np.ndarray:
+    """ Exiftool date strings YYYY:MM:DD HH:MM:SS.fffffffff, only built when exporting. """
+
+    iso = pd.Series(np.datetime_as_string(np.asarray(datetime_unix, dtype=np.int64).astype("datetime64[ns]"), unit="ns"))
+    return (iso.str[:4] + ":" + iso.str[5:7] + ":" + iso.str[8:10] + " " + iso.str[11:]).to_numpy()
+
+
+class TimeInterpolator:
+    """
+        Interpolate columns of a source timeline at target times. The binary search and the weights are computed once for all columns.
+        Outside of the source timeline, first and last values are kept as np.interp does.
+    """
+
+    def __init__(self, x, xp) -> None:
+        x, xp = np.asarray(x), np.asarray(xp)
+        if len(xp) == 0:
+            raise ValueError("Cannot interpolate on an empty timeline")
+
+        self.j = np.searchsorted(xp, x, side="right") - 1
+        np.clip(self.j, 0, len(xp) - 1, out=self.j)
+        self.j_next = np.minimum(self.j + 1, len(xp) - 1)
+
+        # Offsets are computed before the float conversion to keep ns precision of int64 times.
+        x0 = xp.take(self.j)
+        span = (xp.take(self.j_next) - x0).astype(np.float64)
+        offset = (x - x0).astype(np.float64)
+        self.weight = np.divide(offset, span, out=np.zeros(len(x)), where=span != 0)
+        np.clip(self.weight, 0, 1, out=self.weight)
+
+    def linear(self, fp) -> np.ndarray:
+        fp = np.asarray(fp, dtype=np.float64)
+        f0 = fp.take(self.j)
+        values = fp.take(self.j_next)
+        values -= f0
+        values *= self.weight
+        values += f0
+        return values
+
+    def nearest(self, fp) -> np.ndarray:
+        fp = np.asarray(fp)
+        return np.where(self.weight >= 0.5, fp.take(self.j_next), fp.take(self.j))
+
+    def circular(self, fp, period: float = 360.0) -> np.ndarray:
+        """ Linear interpolation along the shortest arc, result in [0, period[. """
+        fp = np.mod(np.asarray(fp, dtype=np.float64), period)
+        f0 = fp.take(self.j)
+        delta = np.mod(fp.take(self.j_next) - f0 + period / 2, period) - period / 2
+        return np.mod(f0 + delta * self.weight, period)
+
+    def interp_columns(self, df: pd.DataFrame, policies: dict[str, str]) -> dict[str, np.ndarray]:
+        """ Interpolate a block of columns, each with its policy: linear, nearest or circular (angles in degrees). """
+        methods = {"linear": self.linear, "nearest": self.nearest, "circular": self.circular}
+        return {column: methods[policy](df[column].to_numpy()) for column, policy in policies.items()}
@@ -1,11 +1,12 @@
-import os
 import pytz
 import pycountry
-import subprocess
 import pandas as pd
 import datetime as dt
 from pathlib import Path
 
+from .lib_dataflash import parse_dataflash_bin, GPS_LEAP_SECONDS
+from .lib_timebase import gps_week_ms_to_ns, datetime_to_ns, NS_PER_SECOND
+
 def print_plancha_header():
     print("""
 ██████╗ ██╗      █████╗ ███╗   ██╗ ██████╗██╗  ██╗ █████╗ 
@@ -16,11 +17,6 @@ def print_plancha_header():
 ╚═╝     ╚══════╝╚═╝  ╚═╝╚═╝  ╚═══╝ ╚═════╝╚═╝  ╚═╝╚═╝  ╚═╝
     """)
 
-def convert_GMS_GWk_to_UTC_time(gpsweek: int, gpsmilliseconds: float, leapseconds: int = 0) -> dt.datetime:
-    epoch = dt.datetime(1980, 1, 6)
-    elapsed = dt.timedelta(weeks=int(gpsweek), seconds=float(gpsmilliseconds/1000.0) + leapseconds)
-    return epoch + elapsed
-
 def replace_comma_by_dot(file_path):
     with open(file_path, 'r+') as f:
         # Get all lines
@@ -60,6 +56,12 @@ def llh_to_txt(llh_path: Path) -> Path:
     
     return txt_path
 
+def read_llh_txt(txt_path: Path) -> pd.DataFrame:
+    """ Read a navigation file written by llh_to_txt and add its time as unix ns in datetime_unix column. """
+    csv_llh = pd.read_csv(txt_path)
+    csv_llh['datetime_unix'] = datetime_to_ns(csv_llh['GPSDateStamp'] + " " + csv_llh['GPSTimeStamp'])
+    return csv_llh
+
 def pos_to_llh(pos_path: Path) -> Path:
     # Inputs :
     # 1.pos_path = path of the pos file 
@@ -124,7 +126,7 @@ def gpx_to_llh(gpx_path: Path) -> Path:
     return llh_path
 
 
-def get_hours_from_bin_sensors(session_name: str, sensors_path: Path) -> tuple[int, int]:
+def get_hours_from_bin_sensors(session_name: str, sensors_path: Path, leapseconds: int = GPS_LEAP_SECONDS) -> tuple[int, int]:
     print("Get hours from bin sensors: ")
     if not sensors_path.exists(): return 0, 0
 
@@ -133,21 +135,17 @@ def get_hours_from_bin_sensors(session_name: str, sensors_path: Path) -> tuple[i
     alpha2code = pycountry.countries.get(alpha_3 = alpha3code).alpha_2
     utcoffset = dt.datetime.now(pytz.timezone(dict(pytz.country_timezones)[alpha2code][0])).utcoffset().seconds//3600
 
-    filebuf = './tmp.csv'
     for file in sensors_path.iterdir():
         if file.suffix.lower() != ".bin": continue
 
-        # Parse bin.
-        tmp_cmd = "python src/lib/mavlogdump.py --planner --format csv --type GPS "+str(file)+" > "+filebuf
-        subprocess.call(tmp_cmd, shell=True)
-
-        # Read csv and remove file buffer.
-        df = pd.read_csv(filebuf, sep=";")
-        os.remove(filebuf)
+        df = parse_dataflash_bin(file, ["GPS"])["GPS"]
+        df = df[df.GWk > 0] # No GPS time before first fix.
+        if len(df) == 0: continue
 
         # Parse timestamp.
-        first_hour = dt.datetime.fromtimestamp(df.timestamp[0]).hour - utcoffset
-        last_hour = dt.datetime.fromtimestamp(df.timestamp[len(df)-1]).hour + 1 - utcoffset
+        first_ns, last_ns = gps_week_ms_to_ns(df.GWk.iloc[[0, -1]], df.GMS.iloc[[0, -1]], leapseconds)
+        first_hour = dt.datetime.fromtimestamp(first_ns / NS_PER_SECOND).hour - utcoffset
+        last_hour = dt.datetime.fromtimestamp(last_ns / NS_PER_SECOND).hour + 1 - utcoffset
         print("Hours found: ", first_hour, last_hour)
         return first_hour, last_hour
     return 0, 0
@@ -183,18 +181,15 @@ def generate_theoric_waypoints_file(sensors_path: Path, df_cmd: pd.DataFrame) ->
 
 
 def write_real_mission_interval(session_info_path: Path, df_gps: pd.DataFrame, df_msg: pd.DataFrame) -> None:
-    wp_datetime = []
-    for _, row in df_msg.iterrows():
-        if "Reached waypoint" not in row.Message: continue
-
-        a = df_gps[df_gps["timestamp"] <= row["timestamp"]].iloc[-1] # Get the nearest gps position
-        wp_datetime.append(convert_GMS_GWk_to_UTC_time(a.GWk,a.GMS))
+    df_wp = df_msg[df_msg.Message.str.contains("Reached waypoint", regex=False, na=False)]
 
-    if len(wp_datetime) == 0:
+    if len(df_wp) == 0:
         print("func: Mission interval not found")
         return
     
-    start_wp, end_wp = wp_datetime[0], wp_datetime[-1]
+    # Get the nearest gps position of first and last waypoints
+    gps = [df_gps[df_gps["timestamp"] <= t].iloc[-1] for t in df_wp["timestamp"].iloc[[0, -1]]]
+    start_wp, end_wp = pd.to_datetime(gps_week_ms_to_ns([a.GWk for a in gps], [a.GMS for a in gps]))
 
     # Write information in session_info
     session_info = pd.read_csv(session_info_path)
@@ -0,0 +1,29 @@
+import geopandas as gpd
+from pathlib import Path
+
+from .lib_perf import perf_record
+
+# Vector format of config: (driver, file extension). GeoParquet is written by pyarrow, not by a driver.
+VECTOR_FORMATS = {
+    "shp": ("ESRI Shapefile", ".shp"),
+    "fgb": ("FlatGeobuf", ".fgb"),
+    "parquet": (None, ".parquet")
+}
+
+
+@perf_record()
+def write_vector(gdf: gpd.GeoDataFrame, file_path: Path, vector_format: str = "shp") -> Path:
+    """ Write gdf in vector_format, extension of file_path is replaced by the one of the format. Return written file path. """
+
+    if vector_format not in VECTOR_FORMATS:
+        raise NameError(f"Unknown vector format {vector_format}, can be {list(VECTOR_FORMATS)}")
+
+    driver, suffix = VECTOR_FORMATS[vector_format]
+    file_path = Path(file_path).with_suffix(suffix)
+
+    if driver == None:
+        gdf.to_parquet(file_path, index=False)
+    else:
+        gdf.to_file(file_path, driver=driver)
+
+    return file_path
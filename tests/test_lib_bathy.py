@@ -0,0 +1,142 @@
+import pytest
+import numpy as np
+import pandas as pd
+import transforms3d as t3d
+from pathlib import Path
+from argparse import Namespace
+from scipy.spatial import KDTree
+from scipy.interpolate import griddata
+from scipy.ndimage import distance_transform_edt
+
+from src.lib import lib_bathy
+from src.ConfigManager import ConfigManager
+from src.lib.lib_bathy import euler2mat_sxyz, calc_ign_depth_at_gps_coord, depth_med, depth_med_window, grid_depth_tiled
+
+ROOT_PATH = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture
+def config_manager() -> ConfigManager:
+    """ Default plancha config in UTM zone 40 south, options of a workflow run without arguments. """
+    opt = Namespace(
+        plancha_config_path=str(Path(ROOT_PATH, "plancha_config", "plancha_config.json")), csv=None, root_path=None, remove_frames=None, no_clean="",
+        force_use_rgp=False, only_split=False, no_split=False, no_bathy=False, no_tags=False, force_stages=False
+    )
+    cm = ConfigManager(opt)
+    cm.cfg_prog["gps"]["utm_zone"], cm.cfg_prog["gps"]["utm_south"], cm.cfg_prog["gps"]["utm_ellips"] = "40", True, "WGS84"
+    return cm
+
+
+@pytest.fixture
+def df_bathy() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    nb_points = 500
+    return pd.DataFrame({
+        "Depth": rng.uniform(0.2, 20, nb_points),
+        "Roll": rng.uniform(-20, 20, nb_points),
+        "Pitch": rng.uniform(-20, 20, nb_points),
+        "Yaw": rng.uniform(0, 360, nb_points),
+        "Alt": rng.normal(0, 0.5, nb_points),
+        "X_utm": 326000 + rng.uniform(0, 100, nb_points),
+        "Y_utm": 7658000 + rng.uniform(0, 100, nb_points),
+    })
+
+
+def test_euler2mat_sxyz_matches_transforms3d():
+    angles = np.random.default_rng(0).uniform(-np.pi, np.pi, (200, 3))
+    expected = np.array([t3d.euler.euler2mat(ai, aj, ak, axes="sxyz") for ai, aj, ak in angles])
+    np.testing.assert_allclose(euler2mat_sxyz(angles[:, 0], angles[:, 1], angles[:, 2]), expected, rtol=0, atol=1e-15)
+
+
+def test_lever_arm_matches_point_by_point(config_manager, df_bathy):
+    config_manager.cfg_prog["bathy"]["use_geoid"] = False
+    cm = config_manager
+
+    df_corr = calc_ign_depth_at_gps_coord(df_bathy.copy(), cm)
+
+    # Reference: one rotation matrix per point, as before the vectorization.
+    for i, row in df_bathy.iterrows():
+        vect_gps2pt = [cm.get_off_ant_beam_x(), cm.get_off_ant_beam_y(), cm.get_off_ant_beam_z() + cm.get_dpth_coeff() * row.Depth]
+        rot_vect_gps2pt = np.dot(t3d.euler.euler2mat(-np.deg2rad(row.Roll), -np.deg2rad(row.Pitch), -np.deg2rad(row.Yaw), axes="sxyz"), vect_gps2pt)
+        np.testing.assert_allclose(
+            df_corr.loc[i, ["X_utm_corr", "Y_utm_corr", "Depth_corr"]].to_numpy(np.float64),
+            [row.X_utm - rot_vect_gps2pt[1], row.Y_utm + rot_vect_gps2pt[0], row.Alt + rot_vect_gps2pt[2]],
+            rtol=0, atol=1e-9
+        )
+
+    assert (df_corr.Geoid_alt == 0).all()
+    assert df_corr.Lat_corr.between(-22, -20).all() and df_corr.Lng_corr.between(55, 56).all()
+
+
+def test_depth_med_window_matches_kdtree():
+    rng = np.random.default_rng(0)
+
+    # 10Hz depths in TimeUS with a gap, duplicated times and outliers, as float32 like the workflow.
+    dpth_time = np.sort(np.concatenate((np.arange(0, 60e6, 1e5), np.arange(90e6, 120e6, 1e5), np.full(5, 100e6))))
+    dpth_value = rng.uniform(1, 10, len(dpth_time))
+    dpth_value[rng.choice(len(dpth_value), 200, replace=False)] = rng.choice([0, 0.1, 80], 200)
+    dpth_value[(dpth_time > 30e6) & (dpth_time < 35e6)] = 0 # Window without enough valid depths.
+    arr_dpth = np.column_stack((dpth_time, dpth_value)).astype(np.float32)
+
+    times = np.sort(rng.uniform(-5e6, 125e6, 2000))
+    radius, valid_prop, depth_range = 1e6, 0.5, [0.2, 50.0]
+
+    time_tree = KDTree(arr_dpth[:, 0, None])
+    expected = np.array([depth_med(arr_dpth, time_tree, t, radius, valid_prop, depth_range) for t in times])
+    values = depth_med_window(arr_dpth, times, radius, valid_prop, depth_range)
+
+    np.testing.assert_array_equal(values, expected)
+    assert (values == -1).any() and (values > 0).any()
+
+
+@pytest.fixture
+def track_points() -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Depths along three transects with a turn, large empty areas are left between them. """
+    rng = np.random.default_rng(0)
+    t = np.linspace(0, 1, 1500)
+    x = np.concatenate((t * 200, t * 200, 200 + 20 * np.sin(t * np.pi))) + rng.normal(0, 0.3, 3 * len(t))
+    y = np.concatenate((np.full(len(t), 10.0), np.full(len(t), 90.0), 10 + 80 * t)) + rng.normal(0, 0.3, 3 * len(t))
+    z = -5 - 0.02 * x - 0.01 * y + rng.normal(0, 0.05, len(x))
+    return x, y, z
+
+
+def get_grid_axes(x: np.ndarray, y: np.ndarray, spacing_m: float) -> tuple[np.ndarray, np.ndarray]:
+    return np.arange(x.min(), x.max() + spacing_m, spacing_m), np.arange(y.min(), y.max() + spacing_m, spacing_m)
+
+
+@pytest.mark.parametrize("method", ["linear", "nearest"])
+def test_grid_depth_tiled_without_buffer_matches_griddata(monkeypatch, track_points, method):
+    monkeypatch.setattr(lib_bathy, "GRID_TILE_SIZE", 32) # Many tiles on a small grid.
+    x, y, z = track_points
+    xi, yi = get_grid_axes(x, y, 1.0)
+
+    grid_x, grid_y = np.meshgrid(xi, yi)
+    grid_z = griddata(np.column_stack((x, y)), z, (grid_x, grid_y), method=method).ravel()
+    valid = np.logical_not(np.isnan(grid_z))
+
+    gx, gy, gz = grid_depth_tiled(x, y, z, xi, yi, 1.0, method, 0, max_workers=4)
+    np.testing.assert_array_equal(gx, grid_x.ravel()[valid])
+    np.testing.assert_array_equal(gy, grid_y.ravel()[valid])
+    np.testing.assert_allclose(gz, grid_z[valid], rtol=0, atol=1e-12)
+
+
+@pytest.mark.parametrize("buffer_m", [3, 40, 150])
+def test_grid_depth_tiled_keeps_cells_near_the_track(monkeypatch, track_points, buffer_m):
+    monkeypatch.setattr(lib_bathy, "GRID_TILE_SIZE", 32)
+    x, y, z = track_points
+    spacing_m = 1.0
+    xi, yi = get_grid_axes(x, y, spacing_m)
+
+    # Reference on the whole grid: cells closer than buffer_m to a cell holding a point.
+    empty = np.ones((len(yi), len(xi)), dtype=bool)
+    empty[np.rint((y - yi[0]) / spacing_m).astype(np.int64), np.rint((x - xi[0]) / spacing_m).astype(np.int64)] = False
+    near = (distance_transform_edt(empty, sampling=spacing_m) <= buffer_m).ravel()
+
+    grid_x, grid_y = np.meshgrid(xi, yi)
+    grid_z = griddata(np.column_stack((x, y)), z, (grid_x, grid_y), method="linear").ravel()
+    keep = near & np.logical_not(np.isnan(grid_z))
+
+    gx, gy, gz = grid_depth_tiled(x, y, z, xi, yi, spacing_m, "linear", buffer_m, max_workers=4)
+    np.testing.assert_array_equal(gx, grid_x.ravel()[keep])
+    np.testing.assert_array_equal(gy, grid_y.ravel()[keep])
+    np.testing.assert_allclose(gz, grid_z[keep], rtol=0, atol=1e-12)
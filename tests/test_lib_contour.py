@@ -0,0 +1,17 @@
+import pytest
+import numpy as np
+
+from src.lib.lib_contour import get_contour_levels, CONTOUR_DEFAULT_NB_LINES, CONTOUR_MAX_NB_LINES
+
+
+def test_contour_levels_are_multiples_of_interval():
+    np.testing.assert_allclose(get_contour_levels(-12.3, -0.4, 2), [-12, -10, -8, -6, -4, -2])
+    np.testing.assert_allclose(get_contour_levels(-12.0, -10.0, 1), [-12, -11, -10])
+    assert len(get_contour_levels(-20, 0, 0)) == CONTOUR_DEFAULT_NB_LINES + 1
+    assert len(get_contour_levels(-5, -5, 0)) == 0
+
+
+def test_too_many_contour_levels_are_rejected():
+    assert len(get_contour_levels(-0.5 * (CONTOUR_MAX_NB_LINES - 1), 0, 0.5)) == CONTOUR_MAX_NB_LINES
+    with pytest.raises(NameError, match="Use a larger interval"):
+        get_contour_levels(-100, 0, 0.01)
@@ -0,0 +1,144 @@
+import io
+import sys
+import shutil
+import pytest
+import subprocess
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from benchmark.generate_session import generate_session, get_df_dtype, DF_MESSAGES
+from src.lib.lib_bathy import parse_raw_log
+from src.lib.lib_dataflash import parse_dataflash_bin, parse_dataflash_bin_mmap
+
+ROOT_PATH = Path(__file__).resolve().parents[1]
+SESSION_NAME = "20250425_REU-ST-LEU_ASV-1_01"
+DURATION_S = 60
+IMU_RATE = 10
+TYPES = ["GPS", "ATT", "RFND", "IMU", "MSG", "CMD", "MODE", "ARM"]
+CFG_PARSE = {"gpskey": "GPS", "attkey": "ATT", "dpthkey": "RFND", "optkey": "IMU"}
+
+
+def build_sensors_file(root: Path, log_format: str) -> Path:
+    # Generator reads the plancha config of the repository.
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(ROOT_PATH)
+        generate_session(root, SESSION_NAME, DURATION_S, None, False, log_format, IMU_RATE)
+    return Path(root, SESSION_NAME, "SENSORS", f"00000001.{log_format.upper()}")
+
+
+@pytest.fixture(scope="module")
+def bin_path(tmp_path_factory) -> Path:
+    return build_sensors_file(tmp_path_factory.mktemp("bin"), "bin")
+
+
+@pytest.fixture(scope="module")
+def log_path(tmp_path_factory) -> Path:
+    return build_sensors_file(tmp_path_factory.mktemp("log"), "log")
+
+
+def get_message_offsets(data: bytes) -> list[int]:
+    """ Offset of each message of a generated BIN, FMT messages come first. """
+    lengths = {type_id: get_df_dtype(name).itemsize for name, (type_id, _, _) in DF_MESSAGES.items()}
+    offsets, offset = [], 0
+    while offset < len(data):
+        offsets.append(offset)
+        offset += lengths[data[offset + 2]]
+    assert offset == len(data)
+    return offsets
+
+
+def insert_bytes(data: bytes, inserts: dict[int, bytes]) -> bytes:
+    chunks, previous = [], 0
+    for offset in sorted(inserts):
+        chunks += [data[previous:offset], inserts[offset]]
+        previous = offset
+    return b"".join(chunks) + data[previous:]
+
+
+def assert_same_dfdict(dfdict: dict[str, pd.DataFrame], expected: dict[str, pd.DataFrame]) -> None:
+    assert list(dfdict) == list(expected)
+    for name in expected:
+        pd.testing.assert_frame_equal(dfdict[name], expected[name], check_exact=True, obj=name)
+
+
+def test_bin_engines_match(bin_path):
+    dfdict = parse_dataflash_bin(bin_path, TYPES)
+    assert_same_dfdict(parse_dataflash_bin_mmap(bin_path, TYPES), dfdict)
+
+    assert len(dfdict["GPS"]) == DURATION_S * 5
+    assert dfdict["MSG"].Message.str.startswith("Reached waypoint").all()
+
+
+@pytest.mark.parametrize("name", TYPES)
+def test_bin_matches_mavlogdump(bin_path, name):
+    """ Same dataframe as the mavlogdump csv the workflow parsed before the in process decoder. """
+    dump = subprocess.run(
+        [sys.executable, str(Path(ROOT_PATH, "src", "lib", "mavlogdump.py")), "--planner", "--format", "csv", "--type", name, str(bin_path)],
+        capture_output=True, text=True, check=True
+    ).stdout
+    expected = pd.read_csv(io.StringIO(dump), sep=";")
+
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(parse_dataflash_bin(bin_path, [name])[name], expected)
+    pd.testing.assert_frame_equal(parse_dataflash_bin_mmap(bin_path, [name])[name], expected)
+
+
+def test_bin_engines_skip_garbage_between_messages(bin_path, tmp_path):
+    data = bin_path.read_bytes()
+    offsets = get_message_offsets(data)
+
+    # Junk without header byte after FMT messages, between messages and at the end of the file.
+    rng = np.random.default_rng(0)
+    junk_values = np.setdiff1d(np.arange(256, dtype=np.uint8), [0xA3])
+    positions = rng.choice(offsets[len(DF_MESSAGES):], 50, replace=False).tolist() + [len(data)]
+    inserts = {int(p): rng.choice(junk_values, rng.integers(1, 200)).astype(np.uint8).tobytes() for p in positions}
+
+    corrupted_path = Path(tmp_path, bin_path.name)
+    corrupted_path.write_bytes(insert_bytes(data, inserts))
+
+    expected = parse_dataflash_bin(bin_path, TYPES)
+    assert_same_dfdict(parse_dataflash_bin(corrupted_path, TYPES), expected)
+    assert_same_dfdict(parse_dataflash_bin_mmap(corrupted_path, TYPES), expected)
+
+
+def test_bin_engines_match_with_fake_headers(bin_path, tmp_path):
+    data = bin_path.read_bytes()
+    offsets = get_message_offsets(data)
+
+    # Truncated messages swallow the beginning of the next ones, both engines must drop the same messages.
+    rng = np.random.default_rng(1)
+    type_ids = [type_id for name, (type_id, _, _) in DF_MESSAGES.items() if name != "FMT"]
+    positions = rng.choice(offsets[len(DF_MESSAGES):], 20, replace=False)
+    inserts = {int(p): b"\xa3\x95" + bytes([type_ids[i % len(type_ids)]]) + bytes(i % 7) for i, p in enumerate(positions)}
+
+    corrupted_path = Path(tmp_path, bin_path.name)
+    corrupted_path.write_bytes(insert_bytes(data, inserts)[:-5])
+
+    dfdict = parse_dataflash_bin(corrupted_path, TYPES)
+    assert_same_dfdict(parse_dataflash_bin_mmap(corrupted_path, TYPES), dfdict)
+    assert sum(len(df) for df in dfdict.values()) < len(offsets) - len(DF_MESSAGES)
+
+
+def test_log_engines_match(log_path, tmp_path):
+    # Each engine gets its own copy, parse_raw_log caches parsed logs next to them.
+    dfdicts = {}
+    for engine in ["split", "csv"]:
+        engine_log_path = Path(tmp_path, engine, log_path.name)
+        engine_log_path.parent.mkdir()
+        shutil.copy(log_path, engine_log_path)
+        dfdicts[engine] = parse_raw_log(engine_log_path, CFG_PARSE, engine)
+
+    assert_same_dfdict(dfdicts["split"], dfdicts["csv"])
+    assert len(dfdicts["split"]["GPS"]) == DURATION_S * 5
+
+
+def test_log_matches_bin(log_path, bin_path):
+    """ Text log has the same values as the BIN, scaled values are rounded by the text format. """
+    dfdict_log = parse_raw_log(log_path, CFG_PARSE, "split")
+    dfdict_bin = parse_dataflash_bin_mmap(bin_path, ["GPS", "RFND"])
+
+    for name in ["GPS", "RFND"]:
+        df_log, df_bin = dfdict_log[name], dfdict_bin[name]
+        for column in df_log:
+            np.testing.assert_allclose(df_log[column].to_numpy(), df_bin[column].to_numpy(np.float64), rtol=1e-6, err_msg=f"{name}.{column}")
@@ -0,0 +1,74 @@
+import pyproj
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from scipy.interpolate import LinearNDInterpolator
+from concurrent.futures import ThreadPoolExecutor
+
+from src.lib.lib_geoid import get_geoid_interpolator, get_geoid_grid_path, load_geoid_interpolator
+
+UTM_ZONE, UTM_SOUTH, UTM_ELLIPS = "40", True, "WGS84"
+
+
+@pytest.fixture
+def wgs2utm() -> pyproj.Proj:
+    return pyproj.Proj(proj="utm", zone=UTM_ZONE, ellps=UTM_ELLIPS, south=UTM_SOUTH)
+
+
+@pytest.fixture(autouse=True)
+def clear_geoid_cache():
+    load_geoid_interpolator.cache_clear()
+    yield
+    load_geoid_interpolator.cache_clear()
+
+
+def write_geoid(geoid_path: Path, dropped_nodes: list[int]) -> pd.DataFrame:
+    """ Regular lat/lng grid around Saint-Leu, dropped nodes are missing from the file. """
+    lat, lng = np.meshgrid(np.arange(-21.30, -21.00, 0.01), np.arange(55.20, 55.50, 0.01), indexing="ij")
+    dfgeoid = pd.DataFrame({"lat": lat.ravel(), "lng": lng.ravel()})
+    dfgeoid["alt"] = 30 + 2 * (dfgeoid.lat + 21) ** 2 - 5 * (dfgeoid.lng - 55.3)
+    dfgeoid = dfgeoid.drop(index=dropped_nodes)
+    dfgeoid.to_csv(geoid_path, index=False)
+    return dfgeoid
+
+
+def test_grid_is_exact_at_nodes(tmp_path, wgs2utm):
+    dfgeoid = write_geoid(Path(tmp_path, "geoid.txt"), [100, 101, 450])
+    geoid_itp = get_geoid_interpolator(Path(tmp_path, "geoid.txt"), UTM_ZONE, UTM_SOUTH, UTM_ELLIPS)
+
+    assert get_geoid_grid_path(Path(tmp_path, "geoid.txt")).exists()
+    x, y = wgs2utm(dfgeoid.lng.to_numpy(), dfgeoid.lat.to_numpy())
+    np.testing.assert_allclose(geoid_itp(np.column_stack((x, y))), dfgeoid.alt, rtol=0, atol=1e-9)
+
+
+def test_missing_nodes_use_triangulation(tmp_path, wgs2utm):
+    """ Cells around missing nodes give the triangulation of the remaining nodes, as the previous LinearNDInterpolator. """
+    dfgeoid = write_geoid(Path(tmp_path, "geoid.txt"), [100, 101, 450])
+    geoid_itp = get_geoid_interpolator(Path(tmp_path, "geoid.txt"), UTM_ZONE, UTM_SOUTH, UTM_ELLIPS)
+
+    x, y = wgs2utm(dfgeoid.lng.to_numpy(), dfgeoid.lat.to_numpy())
+    triangulation = LinearNDInterpolator(np.column_stack((x, y)), dfgeoid.alt.to_numpy())
+
+    # Points around the missing nodes, and one outside of the geoid.
+    lng = np.r_[np.linspace(55.291, 55.319, 20), 56.0]
+    lat = np.r_[np.full(20, -21.265), -21.2]
+    xy = np.column_stack(wgs2utm(lng, lat))
+
+    values = geoid_itp(xy)
+    np.testing.assert_allclose(values[:-1], triangulation(xy[:-1]), rtol=0, atol=1e-9)
+    assert np.isnan(values[-1])
+
+
+def test_interpolator_is_shared_by_threads(tmp_path, wgs2utm):
+    write_geoid(Path(tmp_path, "geoid.txt"), [100, 101, 450])
+    geoid_itp = get_geoid_interpolator(Path(tmp_path, "geoid.txt"), UTM_ZONE, UTM_SOUTH, UTM_ELLIPS)
+    assert get_geoid_interpolator(Path(tmp_path, "geoid.txt"), UTM_ZONE, UTM_SOUTH, UTM_ELLIPS) is geoid_itp
+
+    xy = np.column_stack(wgs2utm(np.linspace(55.21, 55.48, 500), np.linspace(-21.29, -21.01, 500)))
+    expected = geoid_itp(xy)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(geoid_itp, [xy] * 32))
+
+    for values in results:
+        np.testing.assert_array_equal(values, expected)
@@ -0,0 +1,97 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from src.lib.lib_timebase import gps_week_ms_to_ns, datetime_to_ns, ns_to_exif_datetime, TimeInterpolator, NS_PER_SECOND
+
+
+def test_gps_week_ms_to_ns_matches_datetime():
+    rng = np.random.default_rng(0)
+    gpsweek = rng.integers(1000, 2500, 100)
+    gpsmilliseconds = rng.integers(0, 7 * 86400 * 1000, 100) + rng.choice([0, 0.25, 0.5], 100)
+
+    expected = pd.Timestamp("1980-01-06") + pd.to_timedelta(gpsweek * 7, unit="D") + pd.to_timedelta(np.rint(gpsmilliseconds * 1e6).astype(np.int64), unit="ns")
+    np.testing.assert_array_equal(gps_week_ms_to_ns(gpsweek, gpsmilliseconds), expected.to_numpy(dtype="datetime64[ns]").astype(np.int64))
+
+
+def test_gps_week_ms_to_ns_removes_leap_seconds():
+    # 2025-04-25 06:00:18 in GPS time.
+    ns = gps_week_ms_to_ns(2363, 5 * 86400 * 1000 + 6 * 3600 * 1000 + 18000, 18)
+    assert ns == pd.Timestamp("2025-04-25 06:00:00").value
+
+    np.testing.assert_array_equal(gps_week_ms_to_ns([2363], [0.0]) - gps_week_ms_to_ns([2363], [0.0], 18), [18 * NS_PER_SECOND])
+
+
+def test_datetime_to_ns_keeps_nanoseconds():
+    ns = datetime_to_ns(["2025/04/25 06:00:00.123456789", "2025-04-25T06:00:01"])
+    assert ns.dtype == np.int64
+    np.testing.assert_array_equal(ns, [pd.Timestamp("2025-04-25 06:00:00.123456789").value, pd.Timestamp("2025-04-25 06:00:01").value])
+
+    assert datetime_to_ns([pd.Timestamp("2025-04-25 06:00:00")])[0] == pd.Timestamp("2025-04-25 06:00:00").value
+
+
+def test_ns_to_exif_datetime():
+    ns = datetime_to_ns(["2025-04-25 06:00:00.123456789", "1999-12-31 23:59:59"])
+    np.testing.assert_array_equal(ns_to_exif_datetime(ns), ["2025:04:25 06:00:00.123456789", "1999:12:31 23:59:59.000000000"])
+
+
+@pytest.fixture
+def timelines() -> tuple[np.ndarray, np.ndarray]:
+    """ Irregular source times in ns with a duplicated time, target times inside and outside of them. """
+    rng = np.random.default_rng(0)
+    t0 = pd.Timestamp("2025-04-25 06:00:00").value
+    xp = t0 + np.cumsum(rng.integers(1, 200_000_000, 500))
+    xp[100] = xp[99]
+    x = np.sort(rng.integers(xp[0] - NS_PER_SECOND, xp[-1] + NS_PER_SECOND, 2000))
+    return x, xp
+
+
+def test_linear_matches_np_interp(timelines):
+    x, xp = timelines
+    fp = np.random.default_rng(1).normal(size=len(xp))
+
+    # Offsets to the first time keep np.interp exact on float64.
+    expected = np.interp((x - xp[0]).astype(np.float64), (xp - xp[0]).astype(np.float64), fp)
+    values = TimeInterpolator(x, xp).linear(fp)
+
+    np.testing.assert_allclose(values, expected, rtol=0, atol=1e-12)
+    assert values[0] == fp[0] and values[-1] == fp[-1]
+
+
+def test_nearest(timelines):
+    x, xp = timelines
+    fp = np.arange(len(xp))
+
+    values = TimeInterpolator(x, xp).nearest(fp)
+    distances = np.abs(xp[values] - x)
+    inside = (x >= xp[0]) & (x <= xp[-1])
+    assert values.dtype == fp.dtype
+    assert (distances[inside] <= np.abs(xp[np.clip(values + 1, 0, len(xp) - 1)] - x)[inside]).all()
+    assert (distances[inside] <= np.abs(xp[np.clip(values - 1, 0, len(xp) - 1)] - x)[inside]).all()
+    assert (values[x < xp[0]] == 0).all() and (values[x > xp[-1]] == len(xp) - 1).all()
+
+
+def test_circular_takes_shortest_arc():
+    itp = TimeInterpolator([0, 5, 10, 15, 20], [0, 10, 20])
+    np.testing.assert_allclose(itp.circular([350, 10, 30]), [350, 0, 10, 20, 30])
+    np.testing.assert_allclose(itp.circular([-10, 370, 390]), [350, 0, 10, 20, 30])
+    np.testing.assert_allclose(TimeInterpolator([5], [0, 10]).circular([0.5, 6.0], period=2 * np.pi), [(0.5 + 6.0 - 2 * np.pi) / 2])
+
+
+def test_interp_columns(timelines):
+    x, xp = timelines
+    rng = np.random.default_rng(2)
+    df = pd.DataFrame({"alt": rng.normal(size=len(xp)), "fix": rng.integers(1, 7, len(xp)), "yaw": rng.uniform(0, 360, len(xp))})
+
+    itp = TimeInterpolator(x, xp)
+    values = itp.interp_columns(df, {"alt": "linear", "fix": "nearest", "yaw": "circular"})
+
+    assert list(values) == ["alt", "fix", "yaw"]
+    np.testing.assert_array_equal(values["alt"], itp.linear(df.alt))
+    np.testing.assert_array_equal(values["fix"], itp.nearest(df.fix))
+    np.testing.assert_array_equal(values["yaw"], itp.circular(df.yaw))
+
+
+def test_empty_timeline():
+    with pytest.raises(ValueError):
+        TimeInterpolator([0, 1], [])
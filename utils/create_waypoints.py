@@ -6,11 +6,13 @@
     <INDEX> <CURRENT WP> <COORD FRAME> <COMMAND> <PARAM1> <PARAM2> <PARAM3> <PARAM4> <PARAM5/X/LATITUDE> <PARAM6/Y/LONGITUDE> <PARAM7/Z/ALTITUDE> <AUTOCONTINUE>
 """
 
-from pathlib import Path
-import pandas as pd
-import os
-import subprocess
+import sys
 import traceback
+import pandas as pd
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from src.lib.lib_log_cache import load_dataflash_bin
 
 def update_session(session):
     
@@ -23,16 +25,11 @@ def update_session(session):
         raise NameError("SENSORS folder not found")
 
 
-    filebuf = './tmp.csv'
     for file in sensor_folder.iterdir():
         if file.suffix.upper() != ".BIN": continue
 
-        tmp_cmd = "python ../src/lib/mavlogdump.py --planner --format csv --type CMD "+str(file)+" > "+filebuf
-        subprocess.call(tmp_cmd, shell=True)
-        df_cmd = pd.read_csv(filebuf, sep=";")
-
-        # Read csv and remove file buffer.
-        os.remove(filebuf)
+        # Parse bin or load it from cache.
+        df_cmd = load_dataflash_bin(file, ["CMD"])["CMD"]
 
         file_to_create = Path(sensor_folder, f"{session.name}_{file.stem}.waypoints")
         data = []
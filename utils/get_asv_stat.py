@@ -1,9 +1,10 @@
-import os
+import sys
 import argparse
-import subprocess
-import pandas as pd
 from pathlib import Path
 
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from src.lib.lib_log_cache import load_dataflash_bin
+
 '''
     From a folder with bin files, display first date in GPS status for each file.
 '''
@@ -26,18 +27,11 @@ def main(opt):
         print("File not found.")
         return
 
-    # File buffer for csv.
-    filebuf = './tmp.csv'
     for file in sorted(list(path_dir.iterdir())):
         if file.suffix.upper() != ".BIN": continue
 
-        # Parse bin.
-        tmp_cmd = "python ../src/lib/mavlogdump.py --planner --format csv --types PARM "+str(file)+" > "+filebuf
-        subprocess.call(tmp_cmd, shell=True)
-
-        # Read csv and remove file buffer.
-        df = pd.read_csv(filebuf, sep=";")
-        os.remove(filebuf)
+        # Parse bin or load it from cache.
+        df = load_dataflash_bin(file, ["PARM"])["PARM"]
 
         boot = df[df["Name"] == "STAT_BOOTCNT"].iloc[0]["Value"]
         flight = df[df["Name"] == "STAT_FLTTIME"].iloc[0]["Value"]
@@ -1,8 +1,11 @@
 import os
+import sys
 import datetime
-import subprocess
-import pandas as pd
 import argparse
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from src.lib.lib_log_cache import load_dataflash_bin
 
 '''
     From a folder with bin files, display first date in GPS status for each file.
@@ -20,19 +23,12 @@ def main(opt):
         print("Folder not found.")
         return
 
-    # File buffer for csv.
-    filebuf = './tmp.csv'
     for file in sorted(list(os.listdir(path_directory))):
         if file.endswith(".BIN"):
             file_path = os.path.join(path_directory, file)
 
-            # Parse bin.
-            tmp_cmd = "python ../src/lib/mavlogdump.py --planner --format csv --type GPS "+file_path+" > "+filebuf
-            subprocess.call(tmp_cmd, shell=True)
-
-            # Read csv and remove file buffer.
-            df = pd.read_csv(filebuf, sep=";")
-            os.remove(filebuf)
+            # Parse bin or load it from cache.
+            df = load_dataflash_bin(Path(file_path), ["GPS"])["GPS"]
 
             # Parse timestamp.
             value = datetime.datetime.fromtimestamp(df.timestamp[0])
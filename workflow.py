@@ -1,10 +1,16 @@
+import os
+import sys
 import traceback
+import multiprocessing
 from pathlib import Path
+from datetime import datetime
 from argparse import ArgumentParser, Namespace
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from src.SessionBase import SessionBase
 from src.ConfigManager import ConfigManager
 from src.lib.lib_tools import print_plancha_header
+from src.lib.lib_perf import reset_perf_records, write_perf_rollup
 
 
 def parse_option() -> Namespace:
@@ -20,66 +26,138 @@ def parse_option() -> Namespace:
     parser.add_argument("-rp", "--root_path", default=None, help="Root path for the session")
     parser.add_argument("-rf", "--remove_frames", default=None, help="Remove frames until meet the number")
     parser.add_argument("-pcn", "--plancha_config_path", default=None, help="Path to the plancha config file to use")
+    parser.add_argument("-fs", "--force_stages", action="store_true", help="Process all stages even if their inputs and config didn't change since last run")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="Number of sessions processed in parallel. Each session output goes to its own log file")
+    parser.add_argument("-lp", "--log_path", default="./logs", help="Folder to store session log files when workers > 1")
+    parser.add_argument("-pp", "--perf_path", default=None, help="Folder to store the performance report of the run. Not written if not set")
 
 
     return parser.parse_args()
 
 
-def main(opt: Namespace) -> None:
-    print_plancha_header()
+def process_session(config_manager: ConfigManager, session_name: str, filt_exclude_specific_datetimeUTC: str) -> tuple[bool, dict | None]:
+    """ Run the whole pipeline on one session. Return False if the session failed and the performance report of the session. """
 
-    session_fails = []
+    session_path = Path(config_manager.get_root_path(), session_name)
 
-    config_manager = ConfigManager(opt)
+    if not session_path.exists():
+        print(f"[WARNING] Path {session_path} not found")
+        return True, None
 
-    for session_name, filt_exclude_specific_datetimeUTC in config_manager.iterate_over_session():
+    session_base = SessionBase(session_path)
+    reset_perf_records()
+    is_success = True
 
-        session_path = Path(config_manager.get_root_path(), session_name)
+    try:
+        print("\n\n-- Launching " + session_base.session.name)
 
-        if not session_path.exists(): 
-            print(f"[WARNING] Path {session_path} not found")
-            continue
+        # Clean folder. Folders of stages with a valid manifest are kept, these stages will be skipped.
+        folder_to_clean = config_manager.get_folder_to_clean()
+        session_base.prepare_folder(folder_to_clean, session_base.get_folder_to_keep(config_manager, folder_to_clean))
 
-        session_base = SessionBase(session_path)
+        session_base.image_manager.setup(config_manager)
+        session_base.write_session_info(config_manager)
 
-        try:
-            print("\n\n-- Launching " + session_base.session.name)
+        ### Image, GPS and Bathy part. Videos are split while GPS and bathy are computed.
+        session_base.run_split_gps_bathy(config_manager)
 
-            # Clean folder.
-            session_base.prepare_folder(config_manager.get_folder_to_clean())    
-            
-            session_base.image_manager.setup(config_manager)
-            session_base.write_session_info(config_manager)
+        session_base.update_filt_exclude_interval(config_manager, filt_exclude_specific_datetimeUTC)
 
-            ### Image part.
-            session_base.split_videos(config_manager)
+        ### Tags part
+        if not config_manager.is_only_split():
+            session_base.tags_frames(config_manager)
 
-            if not config_manager.is_only_split():
-                session_base.remove_first_frames(config_manager)
+    except Exception:
+        # Print error
+        print(traceback.format_exc(), end="\n\n")
+        is_success = False
+    finally:
+        print("\n-- Finally, save plancha_config.json\n")
+        config_manager.save_cfg_prog(session_base.prog_config_path)
 
-            ### GPS part.
-            session_base.compute_gps(config_manager)
+    return is_success, session_base.write_perf_report()
 
-            ### Bathy part.
-            session_base.compute_bathy(config_manager)
-            
-            session_base.update_filt_exclude_interval(config_manager, filt_exclude_specific_datetimeUTC)
 
-            ### Tags part
-            if not config_manager.is_only_split():
-                session_base.tags_frames(config_manager)
-            
+def process_session_in_worker(opt: Namespace, session_args: list) -> tuple[str, bool, dict | None]:
+    """ Worker entrypoint: build an own ConfigManager and redirect all output of the session to a log file. """
+
+    session_name = session_args[0]
+    log_file = Path(opt.log_path, f"{session_name}.log")
+
+    # Redirect at file descriptor level to also catch output of subprocesses (ffmpeg, rnx2rtkp...).
+    sys.stdout.flush()
+    sys.stderr.flush()
+    stdout_fd, stderr_fd = os.dup(1), os.dup(2)
+    with open(log_file, "w") as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            config_manager = ConfigManager(opt)
+            config_manager.update_cfg_prog_for_session(session_args)
+            is_success, perf_report = process_session(config_manager, session_name, session_args[6])
         except Exception:
-            # Print error
             print(traceback.format_exc(), end="\n\n")
-                
-            # Store sessions name
-            session_fails.append(session_base.session.name)
+            is_success, perf_report = False, None
         finally:
-            print("\n-- Finally, save plancha_config.json\n")
-            config_manager.save_cfg_prog(session_base.prog_config_path)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(stdout_fd, 1)
+            os.dup2(stderr_fd, 2)
+            os.close(stdout_fd)
+            os.close(stderr_fd)
+
+    return session_name, is_success, perf_report
+
+
+def main(opt: Namespace) -> None:
+    print_plancha_header()
+
+    session_fails, perf_reports = [], []
+
+    config_manager = ConfigManager(opt)
 
+    try:
+        if opt.workers > 1:
+            Path(opt.log_path).mkdir(exist_ok=True, parents=True)
+            print(f"-- Processing {len(config_manager.list_sessions)} sessions with {opt.workers} workers. Logs are stored in {opt.log_path}")
+
+            # Spawn to get clean interpreters, open3d and exiftool don't like to be forked.
+            with ProcessPoolExecutor(max_workers=opt.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+                futures = {executor.submit(process_session_in_worker, opt, session_args): session_args[0] for session_args in config_manager.list_sessions}
+                for future in as_completed(futures):
+                    try:
+                        session_name, is_success, perf_report = future.result()
+                    except Exception:
+                        # Worker died (BrokenProcessPool...) or its result can't be sent back, session log may be incomplete.
+                        session_name, is_success, perf_report = futures[future], False, None
+                        print(f"\t* {session_name} worker error:\n{traceback.format_exc()}")
+
+                    print(f"\t* {session_name} {'done' if is_success else 'failed'}")
+                    if not is_success:
+                        session_fails.append(session_name)
+                    if perf_report != None:
+                        perf_reports.append(perf_report)
+        else:
+            for session_name, filt_exclude_specific_datetimeUTC in config_manager.iterate_over_session():
+                is_success, perf_report = process_session(config_manager, session_name, filt_exclude_specific_datetimeUTC)
+                if not is_success:
+                    # Store sessions name
+                    session_fails.append(session_name)
+                if perf_report != None:
+                    perf_reports.append(perf_report)
+    finally:
+        # Reports of processed sessions are kept even if the run is interrupted.
+        if opt.perf_path:
+            write_perf_rollup(Path(opt.perf_path, f"perf_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"), perf_reports)
+
+        print("\n-- End of the workflow\n")
+        if len(session_fails) == 0:
+            print("All sessions were processed")
+        else:
+            print(f"{len(session_fails)} sessions failed:")
+            for session_name in session_fails:
+                print(f"\t* {session_name}")
 
 if __name__ == "__main__":
     opt = parse_option()
-    main(opt)
\ No newline at end of file
+    main(opt)